@@ -11,6 +11,7 @@ APP_NAME_CAP = "Aw-Shell"
 APP_NAME = APP_NAME_CAP.lower()
 
 CACHE_DIR = str(GLib.get_user_cache_dir()) + f"/{APP_NAME}"
+STATE_DIR = str(GLib.get_user_state_dir()) + f"/{APP_NAME}"
 
 USERNAME = os.getlogin()
 HOSTNAME = os.uname().nodename
@@ -104,3 +105,14 @@ BAR_METRICS_DISKS = _get_config_var("bar_metrics_disks")
 METRICS_VISIBLE = _get_config_var("metrics_visible")
 METRICS_SMALL_VISIBLE = _get_config_var("metrics_small_visible")
 SELECTED_MONITORS = _get_config_var("selected_monitors")
+CURRENCY_RATES_TTL = _get_config_var("currency_rates_ttl")
+LAUNCHER_FILE_ROOTS = _get_config_var("launcher_file_roots")
+NOTIFICATION_HISTORY_LIMIT = _get_config_var("notification_history_limit")
+NOTIFICATION_APP_RATE = _get_config_var("notification_app_rate")
+NOTIFICATION_APP_BURST = _get_config_var("notification_app_burst")
+NOTIFICATION_QUEUE_LIMIT = _get_config_var("notification_queue_limit")
+OVERVIEW_WINDOW_PREVIEWS = _get_config_var("overview_window_previews")
+OVERVIEW_PREVIEW_FPS = _get_config_var("overview_preview_fps")
+CAVALCADE_FPS = _get_config_var("cavalcade_fps")
+SHADER_FPS = _get_config_var("shader_fps")
+SHADER_PAUSE_ON_BATTERY = _get_config_var("shader_pause_on_battery")
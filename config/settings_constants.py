@@ -99,5 +99,16 @@ DEFAULTS = {
     },
     "limited_apps_history": ["Spotify"],
     "history_ignored_apps": ["Hyprshot"],
+    "notification_history_limit": 20000,
+    "notification_app_rate": 2.0,
+    "notification_app_burst": 4,
+    "notification_queue_limit": 64,
+    "overview_window_previews": False,
+    "overview_preview_fps": 2,
+    "cavalcade_fps": 60,
+    "shader_fps": 30,
+    "shader_pause_on_battery": True,
     "selected_monitors": [],
+    "currency_rates_ttl": 21600,
+    "launcher_file_roots": ["~"],
 }
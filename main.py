@@ -1,24 +1,26 @@
 import os
 
-import gi
+# Worker processes (utils/thumbnails.py) import this file again under another
+# name; everything else happens only when it runs as the shell.
+if __name__ == "__main__":
+    import gi
 
-gi.require_version("GLib", "2.0")
-import setproctitle
-from fabric import Application
-from fabric.utils import exec_shell_command_async, get_relative_path
-from gi.repository import GLib
+    gi.require_version("GLib", "2.0")
+    import setproctitle
+    from fabric import Application
+    from fabric.utils import exec_shell_command_async, get_relative_path
+    from gi.repository import GLib
 
-from config.data import APP_NAME, APP_NAME_CAP, CACHE_DIR, CONFIG_FILE, HOME_DIR
-from modules.bar import Bar
-from modules.corners import Corners
-from modules.dock import Dock
-from modules.notch import Notch
-from modules.notifications import NotificationPopup
-from modules.updater import run_updater
+    from config.data import APP_NAME, APP_NAME_CAP, CACHE_DIR, CONFIG_FILE, HOME_DIR
+    from modules.bar import Bar
+    from modules.corners import Corners
+    from modules.dock import Dock
+    from modules.notch import Notch
+    from modules.notifications import NotificationPopup
+    from modules.updater import run_updater
 
-fonts_updated_file = f"{CACHE_DIR}/fonts_updated"
+    fonts_updated_file = f"{CACHE_DIR}/fonts_updated"
 
-if __name__ == "__main__":
     setproctitle.setproctitle(APP_NAME)
 
     if not os.path.isfile(CONFIG_FILE):
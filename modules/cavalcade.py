@@ -3,15 +3,19 @@ import ctypes
 import os
 import re
 import signal
-import struct
 import subprocess
-from math import pi
+import time
 
+import numpy as np
 from fabric.utils.helpers import get_relative_path
 from fabric.widgets.overlay import Overlay
-from gi.repository import Gdk, GLib, Gtk
+from gi.repository import Gdk, Gio, GLib, Gtk
 from loguru import logger
 
+import config.data as data
+from services.mpris import MprisPlayerManager, Playerctl
+from utils.spectrum import BarLevels, bar_centres, stroke_bars
+
 
 def get_bars(file_path):
     config = configparser.ConfigParser()
@@ -19,22 +23,33 @@ def get_bars(file_path):
     return int(config['general']['bars'])
 
 CAVA_CONFIG = get_relative_path("../config/cavalcade/cava.ini")
+COLORS_CSS = get_relative_path("../styles/colors.css")
 
 bars = get_bars(CAVA_CONFIG)
+SILENCE_PAUSE = 5  # seconds of silence, with nothing playing, before cava is paused
+READ_FRAMES = 64  # frames drained from the FIFO per read
+FRAME_SLACK_US = 2000  # a tick this early still counts, so 60 fps on 60 Hz does not drop to 30
 
 def set_death_signal():
     """
-    Set the death signal of the child process to SIGTERM so that if the parent
-    process is killed, the child (cava) is automatically terminated.
+    Set the death signal of the child process to SIGKILL so that if the parent
+    process is killed, the child (cava) is automatically terminated. SIGTERM
+    would stay pending while cava is paused with SIGSTOP.
     """
     libc = ctypes.CDLL("libc.so.6")
     PR_SET_PDEATHSIG = 1
-    libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+    libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
 
 class Cava:
     """
     CAVA wrapper.
     Launch cava process with certain settings and read output.
+
+    Each read drains the FIFO and keeps only the newest complete frame, and
+    at most one dispatch to the handlers is queued on the main loop, so a
+    busy main loop skips frames instead of falling behind the audio. cava is
+    paused with SIGSTOP while no spectrum view is on screen, or after a
+    stretch of silence while the player says nothing is playing.
     """
     NONE = 0
     RUNNING = 1
@@ -64,7 +79,16 @@ class Cava:
         self.env["LC_ALL"] = "en_US.UTF-8"  # not sure if it's necessary
 
         is_16bit = True
-        self.byte_type, self.byte_size, self.byte_norm = ("H", 2, 65535) if is_16bit else ("B", 1, 255)
+        self.byte_type, self.byte_size, self.byte_norm = ("<u2", 2, 65535) if is_16bit else ("u1", 1, 255)
+        self.frame_size = self.byte_size * self.bars
+        self._buffer = bytearray()
+        self._latest = None  # newest decoded frame, waiting for _dispatch
+        self._pending = False
+
+        self._views = {}  # view -> visible
+        self._playing = None  # whether any MPRIS player plays; None when there is none
+        self._silent_since = None
+        self._paused = False
 
         if not os.path.exists(self.path):
             os.mkfifo(self.path)
@@ -73,7 +97,16 @@ class Cava:
         self.fifo_dummy_fd = None
         self.io_watch_id = None
 
+        # cava is shared, so it follows every player rather than the one a widget shows
+        self._mpris = MprisPlayerManager()
+        self._mpris.connect("player-appeared", lambda _, player: self._watch_player(player))
+        self._mpris.connect("player-vanished", lambda *_: GLib.idle_add(self._update_playing))
+        for player in self._mpris.players:
+            self._watch_player(player)
+        self._update_playing()
+
     def _run_process(self):
+        self._paused = False
         try:
             self.process = subprocess.Popen(
                 self.command,
@@ -94,40 +127,100 @@ class Cava:
         self.io_watch_id = GLib.io_add_watch(self.fifo_fd, GLib.IO_IN, self._io_callback)
 
     def _io_callback(self, source, condition):
-        chunk = self.byte_size * self.bars  # number of bytes for given format
-        try:
-            if self.fifo_fd is None:
-                return False
-                
-            data = os.read(self.fifo_fd, chunk)
-        except OSError as e:
-            if e.errno == 11:  # EAGAIN - would block, normal for non-blocking
-                return True
-            elif e.errno == 9:  # EBADF - bad file descriptor
-                GLib.idle_add(self.restart)
-                return False
-            else:
-                return False
-        except Exception:
+        if self.fifo_fd is None:
             return False
-
-        # When no data is read, do not remove the IO watch immediately.
-        if len(data) < chunk:
-            if len(data) == 0:
-                # No data available, continue watching
-                return True
-            else:
-                return True
-
-        try:
-            fmt = self.byte_type * self.bars  # format string for struct.unpack
-            sample = [i / self.byte_norm for i in struct.unpack(fmt, data)]
-            GLib.idle_add(self.data_handler, sample)
-        except (struct.error, Exception):
+        # Drain everything queued up; only the newest frame is worth drawing
+        while True:
+            try:
+                data = os.read(self.fifo_fd, self.frame_size * READ_FRAMES)
+            except OSError as e:
+                if e.errno == 11:  # EAGAIN - would block, normal for non-blocking
+                    break
+                elif e.errno == 9:  # EBADF - bad file descriptor
+                    GLib.idle_add(self.restart)
+                return False
+            if not data:
+                break
+            self._buffer += data
+            if len(data) < self.frame_size * READ_FRAMES:
+                break
+
+        complete = len(self._buffer) // self.frame_size
+        if not complete:
             return True
-            
+        end = complete * self.frame_size
+        frame = np.frombuffer(bytes(self._buffer[end - self.frame_size:end]), dtype=self.byte_type)
+        sample = frame.astype(np.float32) / self.byte_norm
+        # A partial frame stays for the next read
+        del self._buffer[:end]
+
+        self._track_silence(sample)
+        self._latest = sample
+        if not self._pending:
+            self._pending = True
+            GLib.idle_add(self._dispatch)
         return True
 
+    def _dispatch(self):
+        self._pending = False
+        sample, self._latest = self._latest, None
+        if sample is not None:
+            self.data_handler(sample)
+        return False
+
+    def _track_silence(self, sample):
+        if sample.any():
+            self._silent_since = None
+        elif self._silent_since is None:
+            self._silent_since = time.monotonic()
+        elif self._playing is False and time.monotonic() - self._silent_since > SILENCE_PAUSE:
+            self._update_paused()
+
+    def set_view_visible(self, view, visible: bool):
+        """Spectrum views report whether they are on screen; cava runs while one is."""
+        self._views[view] = visible
+        self._update_paused()
+
+    def _watch_player(self, player):
+        player.connect("playback-status", lambda *_: self._update_playing())
+        self._update_playing()
+
+    def _update_playing(self):
+        players = self._mpris.players
+        self._set_playing(
+            any(player.get_property("playback-status") == Playerctl.PlaybackStatus.PLAYING for player in players)
+            if players
+            else None
+        )
+        return False
+
+    def _set_playing(self, playing):
+        """Whether anything plays (None when there is no player), so that a silent cava can be paused."""
+        if playing != self._playing:
+            self._playing = playing
+            if playing:
+                self._silent_since = None
+            self._update_paused()
+
+    def _update_paused(self):
+        silent = (
+            self._playing is False
+            and self._silent_since is not None
+            and time.monotonic() - self._silent_since > SILENCE_PAUSE
+        )
+        paused = silent or not any(self._views.values())
+        if paused == self._paused or not self.process or self.process.poll() is not None:
+            return
+        try:
+            self.process.send_signal(signal.SIGSTOP if paused else signal.SIGCONT)
+        except OSError:
+            return
+        self._paused = paused
+        if not paused:
+            # Whatever is left in the FIFO predates the pause
+            self._silent_since = None
+            self._buffer.clear()
+
     def _on_stop(self):
         if self.state == self.RESTARTING:
             self.start()
@@ -141,6 +234,7 @@ class Cava:
         self._start_io_reader()
         self._run_process()
         self._started = True
+        self._update_paused()
 
     def restart(self):
         """Restart cava process"""
@@ -203,13 +297,18 @@ class AttributeDict(dict):
         self[attr] = value
 
 class Spectrum:
-    """Spectrum drawing"""
-    def __init__(self):
+    """
+    Spectrum drawing.
+
+    Frames from cava only set the target levels. A tick callback, running
+    while the bars are still moving and at most `fps` times a second, eases
+    the bars towards them and redraws. The colour is reloaded when
+    colors.css changes on disk, not checked per frame.
+    """
+    def __init__(self, fps=None):
         self.silence_value = 0
-        self.audio_sample = []
         self.color = None
-        self._cached_color = None
-        self._color_file_mtime = 0
+        self.fps = max(1, fps or data.CAVALCADE_FPS)
 
         self.area = Gtk.DrawingArea()
         self.area.connect("draw", self.redraw)
@@ -222,9 +321,23 @@ class Spectrum:
         self.silence = 10
         self.max_height = 12
 
+        self.levels = BarLevels(bars)
+        self._centres = []
+        self._bar_width = 1
+        self._tick_id = 0
+        self._last_frame = 0
+
         self.area.connect("configure-event", self.size_update)
+        self.area.connect("unmap", lambda *_: self._stop_ticking())
         self.color_update()
 
+        self._color_monitor = None
+        try:
+            self._color_monitor = Gio.File.new_for_path(COLORS_CSS).monitor_file(Gio.FileMonitorFlags.NONE, None)
+            self._color_monitor.connect("changed", self._on_colors_changed)
+        except GLib.Error as e:
+            logger.warning(f"[Cavalcade] Cannot watch {COLORS_CSS}: {e}")
+
     def is_silence(self, value):
         """Check if volume level critically low during last iterations"""
         self.silence_value = 0 if value > 0 else self.silence_value + 1
@@ -232,37 +345,39 @@ class Spectrum:
 
     def update(self, data):
         """Audio data processing"""
-        self.color_update_cached()
-        self.audio_sample = data
-        if not self.is_silence(self.audio_sample[0]):
-            self.area.queue_draw()
+        if not self.is_silence(data[0]):
+            self.levels.set_target(data)
         elif self.silence_value == (self.silence + 1):
-            self.audio_sample = [0] * self.sizes.number
-            self.area.queue_draw()
+            self.levels.target.fill(0)
+        else:
+            return
+        if not self._tick_id and self.area.get_mapped():
+            self._tick_id = self.area.add_tick_callback(self._on_tick)
+
+    def _on_tick(self, widget, frame_clock):
+        now = frame_clock.get_frame_time()
+        if now - self._last_frame < 1_000_000 / self.fps - FRAME_SLACK_US:
+            return True
+        self._last_frame = now
+        moving = self.levels.step()
+        widget.queue_draw()
+        if not moving:
+            self._tick_id = 0
+        return moving
+
+    def _stop_ticking(self):
+        if self._tick_id:
+            self.area.remove_tick_callback(self._tick_id)
+            self._tick_id = 0
 
     def redraw(self, widget, cr):
         """Draw spectrum graph"""
+        if not self._centres:
+            return
         cr.set_source_rgba(*self.color)
-        dx = 3
-
         center_y = self.sizes.area.height / 2  # center vertical of the drawing area
-        for i, value in enumerate(self.audio_sample):
-            width = self.sizes.area.width / self.sizes.number - self.sizes.padding
-            radius = width / 2
-            height = max(self.sizes.bar.height * min(value, 1), self.sizes.zero) / 2
-            if height == self.sizes.zero / 2 + 1:
-                height *= 0.5
-
-            height = min(height, self.max_height)
-
-            # Draw rectangle and arcs for rounded ends
-            cr.rectangle(dx, center_y - height, width, height * 2)
-            cr.arc(dx + radius, center_y - height, radius, 0, 2 * pi)
-            cr.arc(dx + radius, center_y + height, radius, 0, 2 * pi)
-
-            cr.close_path()
-            dx += width + self.sizes.padding
-        cr.fill()
+        heights = self.levels.half_heights(self.sizes.bar.height, self.max_height)
+        stroke_bars(cr, self._centres, heights, center_y, self._bar_width)
 
     def size_update(self, *args):
         """Update drawing geometry"""
@@ -277,39 +392,19 @@ class Spectrum:
         self.sizes.bar.width = max(int(tw / self.sizes.number), 1)
         self.sizes.bar.height = self.sizes.area.height
 
-    def color_update_cached(self):
-        """Set drawing color with caching to avoid file reads on every frame"""
-        color_file = get_relative_path("../styles/colors.css")
-        try:
-            # Check if file has been modified
-            current_mtime = os.path.getmtime(color_file)
-            if current_mtime != self._color_file_mtime or self._cached_color is None:
-                self._color_file_mtime = current_mtime
-                
-                color = "#a5c8ff"  # default value
-                with open(color_file, "r") as f:
-                    content = f.read()
-                    m = re.search(r"--primary:\s*(#[0-9a-fA-F]{6})", content)
-                    if m:
-                        color = m.group(1)
-                
-                red = int(color[1:3], 16) / 255
-                green = int(color[3:5], 16) / 255
-                blue = int(color[5:7], 16) / 255
-                self._cached_color = Gdk.RGBA(red=red, green=green, blue=blue, alpha=1.0)
-                
-            self.color = self._cached_color
-        except Exception:
-            if self._cached_color is None:
-                # Fallback to default color
-                self._cached_color = Gdk.RGBA(red=0.647, green=0.784, blue=1.0, alpha=1.0)
-                self.color = self._cached_color
+        self._bar_width = self.sizes.area.width / self.sizes.number - self.sizes.padding
+        self._centres = bar_centres(self.sizes.number, self.sizes.area.width, self.sizes.padding)
+
+    def _on_colors_changed(self, monitor, file, other_file, event_type):
+        if event_type in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED):
+            self.color_update()
+            self.area.queue_draw()
 
     def color_update(self):
         """Set drawing color according to current settings by reading primary color from CSS"""
         color = "#a5c8ff"  # default value
         try:
-            with open(get_relative_path("../styles/colors.css"), "r") as f:
+            with open(COLORS_CSS, "r") as f:
                 content = f.read()
                 m = re.search(r"--primary:\s*(#[0-9a-fA-F]{6})", content)
                 if m:
@@ -339,6 +434,9 @@ class SpectrumRender:
         self.draw = Spectrum()
         self.cava = getCava()
         self.cava.register_handler(self.draw.update)
+        self.cava.set_view_visible(self, False)
+        self.draw.area.connect("map", lambda *_: self.cava.set_view_visible(self, True))
+        self.draw.area.connect("unmap", lambda *_: self.cava.set_view_visible(self, False))
 
         self.cava.start()
 
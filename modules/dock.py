@@ -1,3 +1,4 @@
+import bisect
 import json
 import logging
 
@@ -15,9 +16,15 @@ from gi.repository import Gdk, GLib, Gtk
 
 import config.data as data
 from modules.corners import MyCorner
+from utils.app_identity import AppIdentityResolver
 from utils.icon_resolver import IconResolver
 from widgets.wayland import WaylandWindow as Window
 
+UPDATE_DELAY_MS = 30  # window events arrive in bursts; they are applied together
+ANIMATION_MS = 300  # matches the keyframes of #dock-app-button.entering/.moved
+MAX_DOTS = 4
+APP_MAP_TTL = 60  # s before an unknown window class may trigger a rescan of desktop entries
+
 
 def read_config():
     """Read and return the full configuration from the JSON file, handling missing file."""
@@ -149,8 +156,12 @@ class Dock(Window):
         self.config_path = get_relative_path("../config/dock.json")
         self.app_map = {}
         self._all_apps = get_desktop_applications()
-        self.app_identifiers = self._build_app_identifiers_map()
+        self.identity = AppIdentityResolver(self._all_apps)
         
+        self._apps_loaded_at = GLib.get_monotonic_time()
+        self._update_handler = 0
+        self._separator = None
+
         self.hide_id = None
         self._arranger_handler = None
         self._drag_in_progress = False
@@ -293,39 +304,14 @@ class Dock(Window):
             if not self.integrated_mode: self.conn.connect("event::ready", lambda *args: GLib.timeout_add(250, self.check_occlusion_state))
 
         # Listen to window events to update dock when apps open/close
-        self.conn.connect("event::openwindow", self.update_dock)
-        self.conn.connect("event::closewindow", self.update_dock)
+        self.conn.connect("event::openwindow", self.queue_update)
+        self.conn.connect("event::closewindow", self.queue_update)
         
         if not self.integrated_mode:
             self.conn.connect("event::workspace", self.check_hide)
         
         GLib.timeout_add_seconds(2, self.check_config_change)
             
-    def _build_app_identifiers_map(self):
-        identifiers = {}
-        for app in self._all_apps:
-            if app.name: identifiers[app.name.lower()] = app
-            if app.display_name: identifiers[app.display_name.lower()] = app
-            if app.window_class: identifiers[app.window_class.lower()] = app
-            if app.executable: identifiers[app.executable.split('/')[-1].lower()] = app
-            if app.command_line: identifiers[app.command_line.split()[0].split('/')[-1].lower()] = app
-        return identifiers
-
-    def _normalize_window_class(self, class_name):
-        if not class_name: return ""
-        normalized = class_name.lower()
-        suffixes = [".bin", ".exe", ".so", "-bin", "-gtk"]
-        for suffix in suffixes:
-            if normalized.endswith(suffix):
-                normalized = normalized[:-len(suffix)]
-        return normalized
-        
-    def _classes_match(self, class1, class2):
-        if not class1 or not class2: return False
-        norm1 = self._normalize_window_class(class1)
-        norm2 = self._normalize_window_class(class2)
-        return norm1 == norm2
-
     def on_drag_begin(self, widget, drag_context):
         self._drag_in_progress = True
         Gtk.drag_set_icon_surface(drag_context, createSurfaceFromWidget(widget))
@@ -375,42 +361,25 @@ class Dock(Window):
             self.dock_full.add_style_class("occluded")
         return True
 
-    def find_app(self, app_identifier):
-        if not app_identifier: return None
-        if isinstance(app_identifier, dict):
-            for key in ["window_class", "executable", "command_line", "name", "display_name"]:
-                if key in app_identifier and app_identifier[key]:
-                    app = self.find_app_by_key(app_identifier[key])
-                    if app: return app
-            return None
-        return self.find_app_by_key(app_identifier)
-    
-    def find_app_by_key(self, key_value):
-        if not key_value: return None
-        normalized_id = str(key_value).lower()
-        if normalized_id in self.app_identifiers:
-            return self.app_identifiers[normalized_id]
-        for app in self._all_apps:
-            if app.name and normalized_id in app.name.lower(): return app
-            if app.display_name and normalized_id in app.display_name.lower(): return app
-            if app.window_class and normalized_id in app.window_class.lower(): return app
-            if app.executable and normalized_id in app.executable.lower(): return app
-            if app.command_line and normalized_id in app.command_line.lower(): return app
-        return None
-
     def update_app_map(self):
         self._all_apps = get_desktop_applications()
         self.app_map = {app.name: app for app in self._all_apps if app.name}
-        self.app_identifiers = self._build_app_identifiers_map()
+        self.identity = AppIdentityResolver(self._all_apps)
+        self._apps_loaded_at = GLib.get_monotonic_time()
+
+    def _refresh_app_map_if_stale(self):
+        """A window no desktop entry matches may belong to an app installed since the last scan."""
+        if GLib.get_monotonic_time() - self._apps_loaded_at > APP_MAP_TTL * 1_000_000:
+            self.update_app_map()
+            return True
+        return False
 
-    def create_button(self, app_identifier, instances):
-        desktop_app = self.find_app(app_identifier)
+    def create_button(self, app_identifier, instances, desktop_app=None):
+        desktop_app = desktop_app or self.identity.resolve_pinned(app_identifier)[1]
         icon_img = None
-        display_name = None
         
         if desktop_app:
             icon_img = desktop_app.get_icon_pixbuf(size=self.icon_size) 
-            display_name = desktop_app.display_name or desktop_app.name
         
         id_value = app_identifier["name"] if isinstance(app_identifier, dict) else app_identifier
         
@@ -422,20 +391,17 @@ class Dock(Window):
             if not icon_img:
                 icon_img = self.icon_resolver.get_icon_pixbuf("image-missing", self.icon_size) 
                 
-        items = [Image(pixbuf=icon_img)]
-        tooltip = display_name or (id_value if isinstance(id_value, str) else "Unknown")
-        if not display_name and instances and instances[0].get("title"):
-            tooltip = instances[0]["title"]
+        dots = Box(name="dock-dots", h_align="center", spacing=2)
+        items = [Image(pixbuf=icon_img), dots]
 
         button = Button(
             child= Box(name="dock-icon", orientation="v", h_align="center", children=items), 
-            on_clicked=lambda *a: self.handle_app(app_identifier, instances, desktop_app),
-            tooltip_text=tooltip, name="dock-app-button",
+            on_clicked=lambda b, *a: self.handle_app(b.app_identifier, b.instances, b.desktop_app),
+            name="dock-app-button",
         )
-        button.app_identifier = app_identifier
-        button.desktop_app = desktop_app
-        button.instances = instances
-        if instances: button.add_style_class("instance")
+        button.dots = dots
+        button.instances = []
+        self.update_button(button, app_identifier, instances, desktop_app)
 
         button.drag_source_set(
             Gdk.ModifierType.BUTTON1_MASK,
@@ -454,9 +420,36 @@ class Dock(Window):
         button.connect("enter-notify-event", self._on_child_enter)
         return button
 
+    def update_button(self, button, app_identifier, instances, desktop_app):
+        """Point an existing button at its app's current windows; the icon stays."""
+        button.app_identifier = app_identifier
+        button.desktop_app = desktop_app
+        count_changed = len(instances) != len(button.instances)
+        button.instances = instances
+
+        id_value = app_identifier["name"] if isinstance(app_identifier, dict) else app_identifier
+        display_name = (desktop_app.display_name or desktop_app.name) if desktop_app else None
+        tooltip = display_name or (id_value if isinstance(id_value, str) else "Unknown")
+        if not display_name and instances and instances[0].get("title"):
+            tooltip = instances[0]["title"]
+        if len(instances) > 1:
+            tooltip = f"{tooltip} ({len(instances)} windows)"
+        if button.get_tooltip_text() != tooltip:
+            button.set_tooltip_text(tooltip)
+
+        if count_changed:
+            if instances: button.add_style_class("instance")
+            else: button.remove_style_class("instance")
+            for dot in button.dots.get_children():
+                button.dots.remove(dot)
+                dot.destroy()
+            for _ in range(min(len(instances), MAX_DOTS)):
+                button.dots.add(Box(name="dock-dot"))
+            button.dots.show_all()
+
     def handle_app(self, app_identifier, instances, desktop_app=None):
         if not instances:
-            if not desktop_app: desktop_app = self.find_app(app_identifier)
+            if not desktop_app: desktop_app = self.identity.resolve_pinned(app_identifier)[1]
             if desktop_app:
                 launch_success = desktop_app.launch()
                 if not launch_success:
@@ -518,107 +511,164 @@ class Dock(Window):
                 self.dock_revealer.set_reveal_child(False)
             self.dock_full.add_style_class("occluded")
 
+    def queue_update(self, *args):
+        if not self._update_handler:
+            self._update_handler = GLib.timeout_add(UPDATE_DELAY_MS, self._run_queued_update)
+
+    def _run_queued_update(self):
+        self._update_handler = 0
+        self.update_dock()
+        return False
+
+    def _collect_entries(self, clients):
+        """
+        (key, app_identifier, instances, desktop_app) for the pinned apps and the
+        other open windows. Windows and pins are resolved to the same canonical
+        app key, so matching them is one grouping pass over the windows.
+        """
+        groups = self._group_windows(clients)
+        if any(app is None for _, app in groups.values()) and self._refresh_app_map_if_stale():
+            groups = self._group_windows(clients)
+
+        pinned_entries = []
+        for app_data_item in self.pinned:
+            key, app = self.identity.resolve_pinned(app_data_item)
+            instances, _ = groups.pop(key, ([], None))
+            if not instances:
+                # Another pin of the same app already took them
+                instances = next((entry[2] for entry in pinned_entries if entry[0] == key), [])
+            pinned_entries.append((key, app_data_item, instances, app))
+
+        open_entries = []
+        for key, (instances, app) in groups.items():
+            if app:
+                identifier = {
+                    "name": app.name, "display_name": app.display_name,
+                    "window_class": app.window_class, "executable": app.executable,
+                    "command_line": app.command_line
+                }
+            else:
+                identifier = (instances[0].get("initialClass") or instances[0].get("class") or key.split(":", 1)[1]).lower()
+            open_entries.append((key, identifier, instances, app))
+        return pinned_entries, open_entries
+
+    def _group_windows(self, clients):
+        """Open windows by canonical app key, in the order their apps first appear."""
+        groups = {}
+        for c in clients:
+            key, app = self.identity.resolve_window(c)
+            groups.setdefault(key, ([], app))[0].append(c)
+        self.identity.forget_windows_except(c.get("address") for c in clients)
+        return groups
+
     def update_dock(self, *args):
-        self.update_app_map()
+        """
+        Reconcile the buttons with the pinned apps and open windows. Buttons are
+        kept by app: only new apps get a button built and only closed ones are
+        destroyed, the rest have their windows updated in place and are moved.
+        """
         arranger_handler = getattr(self, "_arranger_handler", None)
         if arranger_handler: remove_handler(arranger_handler)
-        clients = self.get_clients()
-        
-        running_windows = {}
-        for c in clients:
-            window_id = None
-            if class_name := c.get("initialClass", "").lower(): window_id = class_name
-            elif class_name := c.get("class", "").lower(): window_id = class_name
-            elif title := c.get("title", "").lower():
-                possible_name = title.split(" - ")[0].strip()
-                if possible_name and len(possible_name) > 1: window_id = possible_name
-                else: window_id = title
-            if not window_id: window_id = "unknown-app"
-            running_windows.setdefault(window_id, []).append(c)
-            normalized_id = self._normalize_window_class(window_id)
-            if normalized_id != window_id:
-                running_windows.setdefault(normalized_id, []).extend(running_windows[window_id])
-        
-        pinned_buttons = []
-        used_window_classes = set()
-        
-        for app_data_item in self.pinned:
-            app = self.find_app(app_data_item)
-            instances = []
-            matched_class = None
-            possible_identifiers = []
-            
-            if isinstance(app_data_item, dict):
-                for key in ["window_class", "executable", "command_line", "name", "display_name"]:
-                    if key in app_data_item and app_data_item[key]: possible_identifiers.append(app_data_item[key].lower())
-            elif isinstance(app_data_item, str): possible_identifiers.append(app_data_item.lower())
-            
-            if app:
-                if app.window_class: possible_identifiers.append(app.window_class.lower())
-                if app.executable: possible_identifiers.append(app.executable.split('/')[-1].lower())
-                if app.command_line:
-                    cmd_parts = app.command_line.split()
-                    if cmd_parts: possible_identifiers.append(cmd_parts[0].split('/')[-1].lower())
-                if app.name: possible_identifiers.append(app.name.lower())
-                if app.display_name: possible_identifiers.append(app.display_name.lower())
-            
-            possible_identifiers = list(set(possible_identifiers)) 
-            
-            for identifier in possible_identifiers:
-                if identifier in running_windows:
-                    instances = running_windows[identifier]; matched_class = identifier; break
-                normalized = self._normalize_window_class(identifier)
-                if normalized in running_windows:
-                    instances = running_windows[normalized]; matched_class = normalized; break
-                for window_class_key in running_windows: 
-                    if len(identifier) >= 3 and identifier in window_class_key:
-                        instances = running_windows[window_class_key]; matched_class = window_class_key
-                        break
-                if matched_class: break
-            
-            if matched_class:
-                used_window_classes.add(matched_class)
-                used_window_classes.add(self._normalize_window_class(matched_class))
-            
-            pinned_buttons.append(self.create_button(app_data_item, instances))
-        
-        open_buttons = []
-        for class_name, instances in running_windows.items():
-            if class_name not in used_window_classes:
-                app = None
-                app = self.app_identifiers.get(class_name)
-                if not app:
-                    norm_class = self._normalize_window_class(class_name)
-                    app = self.app_identifiers.get(norm_class)
-                if not app: app = self.find_app_by_key(class_name)
-                if not app and instances and instances[0].get("title"):
-                    title = instances[0].get("title", "")
-                    potential_name = title.split(" - ")[0].strip()
-                    if len(potential_name) > 2: app = self.find_app_by_key(potential_name)
-                
-                if app:
-                    app_data_obj = {
-                        "name": app.name, "display_name": app.display_name,
-                        "window_class": app.window_class, "executable": app.executable,
-                        "command_line": app.command_line
-                    }
-                    identifier = app_data_obj
-                else: identifier = class_name
-                open_buttons.append(self.create_button(identifier, instances))
-
-        children = pinned_buttons
-        separator_orientation = Gtk.Orientation.VERTICAL if self.view.get_orientation() == Gtk.Orientation.HORIZONTAL else Gtk.Orientation.HORIZONTAL
-        if pinned_buttons and open_buttons:
-            children += [Box(orientation=separator_orientation, v_expand=False, h_expand=False, h_align="center", v_align="center", name="dock-separator")]
-        children += open_buttons
-        
-        self.view.children = children
+        pinned_entries, open_entries = self._collect_entries(self.get_clients())
+
+        existing = {}
+        old_order = []
+        for child in self.view.get_children():
+            if hasattr(child, "dock_key"):
+                existing[child.dock_key] = child
+                old_order.append(child.dock_key)
+
+        if self._separator is None:
+            separator_orientation = Gtk.Orientation.VERTICAL if self.view.get_orientation() == Gtk.Orientation.HORIZONTAL else Gtk.Orientation.HORIZONTAL
+            self._separator = Box(orientation=separator_orientation, v_expand=False, h_expand=False, h_align="center", v_align="center", name="dock-separator")
+            self._separator.dock_key = "separator"
+            self._separator.set_no_show_all(True)
+
+        children = []
+        seen = set()
+        entries = pinned_entries + ([(None, None, None, None)] if pinned_entries and open_entries else []) + open_entries
+        for key, app_identifier, instances, desktop_app in entries:
+            if key is None:
+                existing.pop("separator", None)
+                children.append(self._separator)
+                continue
+            # The same app pinned twice still gets two buttons
+            while key in seen: key += "+"
+            seen.add(key)
+            button = existing.pop(key, None)
+            if button is not None and getattr(button.desktop_app, "name", None) != getattr(desktop_app, "name", None):
+                # Resolved to another desktop entry: the icon may differ
+                existing[key] = button
+                button = None
+            if button is None:
+                button = self.create_button(app_identifier, instances, desktop_app)
+                button.dock_key = key
+                self._animate(button, "entering")
+            else:
+                self.update_button(button, app_identifier, instances, desktop_app)
+            children.append(button)
+
+        for key, widget in existing.items():
+            if widget.get_parent() is self.view:
+                self.view.remove(widget)
+            if widget is not self._separator:
+                widget.destroy()
+
+        current = self.view.get_children()
+        for child in children:
+            if child.get_parent() is not self.view:
+                self.view.add(child)
+                current.append(child)
+        for index, child in enumerate(children):
+            if current[index] is not child:
+                self.view.reorder_child(child, index)
+                current.remove(child)
+                current.insert(index, child)
+        self._separator.set_visible(bool(pinned_entries and open_entries))
+        for button in children:
+            if button is not self._separator: button.show_all()
+
+        by_key = {child.dock_key: child for child in children}
+        for key in self._moved_keys(old_order, list(by_key)):
+            self._animate(by_key[key], "moved")
+
         if not self.integrated_mode:
             idle_add(self._update_size)
         self._drag_in_progress = False
         if not self.integrated_mode:
             self.check_occlusion_state()
 
+    @staticmethod
+    def _moved_keys(old_order, new_order):
+        """Buttons that changed place, beyond the shift caused by others appearing or leaving."""
+        old_positions = {key: i for i, key in enumerate(old_order)}
+        kept = [key for key in new_order if key in old_positions]
+        # The longest run of kept buttons still in their old relative order stays put
+        tails, tail_keys, parents = [], [], {}
+        for key in kept:
+            position = old_positions[key]
+            i = bisect.bisect_left(tails, position)
+            parents[key] = tail_keys[i - 1] if i else None
+            if i == len(tails):
+                tails.append(position); tail_keys.append(key)
+            else:
+                tails[i] = position; tail_keys[i] = key
+        stayed = set()
+        key = tail_keys[-1] if tail_keys else None
+        while key is not None:
+            stayed.add(key)
+            key = parents[key]
+        return [key for key in kept if key not in stayed and key != "separator"]
+
+    def _animate(self, button, style_class):
+        button.add_style_class(style_class)
+
+        def finish():
+            button.remove_style_class(style_class)
+            return False
+
+        GLib.timeout_add(ANIMATION_MS, finish)
+
     def _update_size(self):
         if self.integrated_mode: return False 
         width, _ = self.view.get_preferred_width()
@@ -133,6 +133,8 @@ paperclip: str = "&#xeb02;"
 # Clipboard Manager
 clipboard: str = "&#xea6f;"
 clip_text: str = "&#xf089;"
+clip_link: str = "&#xeade;"
+clip_code: str = "&#xea77;"
 
 # Confirm
 accept: str = "&#xea5e;"
@@ -175,6 +177,9 @@ terminal: str = "&#xebef;"
 timer_off: str = "&#xf146;"
 timer_on: str = "&#xf756;"
 spy: str = "&#xf227;"
+file: str = "&#xeaa4;"
+calculator: str = "&#xeb80;"
+exchange: str = "&#xf1f4;"
 
 # Dice
 dice_1: str = "&#xf08b;"
@@ -1,12 +1,9 @@
+import bisect
 import json
-import math
-import operator
 import os
-import re
 import subprocess
-from collections.abc import Iterator
+from collections import deque
 
-import numpy as np
 from fabric.utils import (DesktopApp, exec_shell_command_async,
                           get_desktop_applications, idle_add, remove_handler)
 from fabric.utils.helpers import get_relative_path
@@ -21,8 +18,15 @@ from gi.repository import Gdk, GLib
 import config.data as data
 import modules.icons as icons
 from modules.dock import Dock
+from modules.launcher_providers import (AppsProvider, CalculatorProvider,
+                                        ConversionProvider, FilesProvider,
+                                        LauncherResult, LauncherSearch,
+                                        PathCommandsProvider,
+                                        RecentFilesProvider, TmuxProvider,
+                                        WindowsProvider, evaluate_math)
 from modules.updater import run_updater
-from utils.conversion import Conversion
+from utils.conversion import Conversion, CurrencyRates, RatesUnavailableError
+from utils.file_index import FileIndex
 
 tooltip_settings = f"<b>Open {data.APP_NAME_CAP} Settings</b>"
 tooltip_close = "<b>Close</b>"
@@ -41,9 +45,18 @@ class AppLauncher(Box):
 
         self._arranger_handler: int = 0
         self._all_apps = get_desktop_applications()
+        self._pending_results: deque[LauncherResult] = deque()
+        self._row_keys: list = []
+        self._auto_select = True
+        self._query = ""
 
 
-        self.converter = Conversion()
+        self.converter = Conversion(
+            rates=CurrencyRates(
+                cache_path=f"{data.CACHE_DIR}/currency_rates.json",
+                ttl=data.CURRENCY_RATES_TTL,
+            )
+        )
         self.calc_history_path = f"{data.CACHE_DIR}/calc.json"
         if os.path.exists(self.calc_history_path):
             with open(self.calc_history_path, "r") as f:
@@ -58,6 +71,20 @@ class AppLauncher(Box):
         else:
             self.conversion_history = []
 
+        self.file_index = FileIndex.shared(data.LAUNCHER_FILE_ROOTS, f"{data.CACHE_DIR}/files.idx")
+        self.file_index.start()
+
+        self.search = LauncherSearch([
+            AppsProvider(lambda: self._all_apps),
+            CalculatorProvider(),
+            ConversionProvider(self.converter),
+            WindowsProvider(),
+            TmuxProvider(),
+            RecentFilesProvider(),
+            FilesProvider(self.file_index),
+            PathCommandsProvider(),
+        ])
+
         self.viewport = Box(name="viewport", spacing=4, orientation="v")
         self.search_entry = Entry(
             name="search-entry",
@@ -120,6 +147,10 @@ class AppLauncher(Box):
         self.show_all()
 
     def close_launcher(self):
+        self.search.cancel()
+        remove_handler(self._arranger_handler) if self._arranger_handler else None
+        self._arranger_handler = 0
+        self._pending_results.clear()
         self.viewport.children = []
         self.selected_index = -1
         self.notch.close_notch()
@@ -158,105 +189,41 @@ class AppLauncher(Box):
             self.update_conversion_viewport()
             return
         remove_handler(self._arranger_handler) if self._arranger_handler else None
+        self._arranger_handler = 0
+        self._pending_results.clear()
+        self._row_keys = []
+        self._auto_select = True
+        self._query = query
         self.viewport.children = []
         self.selected_index = -1
 
-        def extract_command_name(command_line):
-            """Extract base command name from command line, removing paths and arguments"""
-            if not command_line:
-                return ""
-            if command_line.startswith("/bin/sh -c"):
-                return ""
-            cmd = command_line.split()[0] if command_line.split() else ""
-            if "/" in cmd:
-                cmd = cmd.split("/")[-1]
-            return cmd
-
-        def calculate_score(app, q):
-            """Calculate relevance score. Higher = better match."""
-            q = q.casefold()
-            name = (app.display_name or "").casefold()
-            app_name = (app.name or "").casefold()
-            generic = (app.generic_name or "").casefold()
-            exe = (app.executable or "").casefold()
-            cmd = extract_command_name(app.command_line).casefold()
-            
-            # Exact match on display name - highest priority
-            if name == q:
-                return 10000
-            
-            # Exact match on app name or executable
-            if app_name == q or exe == q or cmd == q:
-                return 9000
-            
-            # Display name starts with query
-            if name.startswith(q):
-                return 8000 - len(name)  # Shorter names rank higher
-            
-            # App name or executable starts with query
-            if app_name.startswith(q) or exe.startswith(q) or cmd.startswith(q):
-                return 7000 - len(name)
-            
-            # Word in display name starts with query
-            words = name.split()
-            for i, word in enumerate(words):
-                if word.startswith(q):
-                    return 6000 - (i * 100) - len(name)
-            
-            # Word in app_name starts with query
-            for word in app_name.replace('-', ' ').replace('.', ' ').split():
-                if word.startswith(q):
-                    return 5000 - len(name)
-            
-            # Substring match in display name
-            if q in name:
-                pos = name.find(q)
-                return 4000 - pos - len(name)
-            
-            # Substring match in other fields
-            searchable = f"{app_name} {generic} {exe} {cmd}"
-            if q in searchable:
-                return 3000 - len(name)
-            
-            # Fuzzy match - all chars appear in order
-            if fuzzy_match(q, name):
-                return 1000
-            
-            return 0  # No match
-
-        def fuzzy_match(query, text):
-            """Check if all characters in query appear in text in order."""
-            it = iter(text)
-            return all(c in it for c in query)
-
-        # Score and filter apps
-        scored_apps = []
-        for app in self._all_apps:
-            score = calculate_score(app, query) if query else 1
-            if score > 0:
-                scored_apps.append((score, app))
-        
-        # Sort by score descending, then by name ascending for ties
-        scored_apps.sort(key=lambda x: (-x[0], (x[1].display_name or "").casefold()))
-        
-        filtered_apps_iter = iter([app for _, app in scored_apps])
-        should_resize = len(scored_apps) == len(self._all_apps)
-
-        self._arranger_handler = idle_add(
-            lambda apps_iter: self.add_next_application(apps_iter) or self.handle_arrange_complete(should_resize, query),
-            filtered_apps_iter,
-            pin=True,
-        )
+        # Apps answer inline; every other provider streams in later and is
+        # dropped by LauncherSearch if the query has changed meanwhile.
+        self.search.search(query, self.on_provider_results)
 
-    def handle_arrange_complete(self, should_resize, query):
-        if query.strip() != "" and self.viewport.get_children():
-            self.update_selection(0)
-        return False
+    def on_provider_results(self, provider, results):
+        self._pending_results.extend(results)
+        if not self._arranger_handler:
+            self._arranger_handler = idle_add(self.add_next_result, pin=True)
 
-    def add_next_application(self, apps_iter: Iterator[DesktopApp]):
-        if not (app := next(apps_iter, None)):
+    def add_next_result(self):
+        if not self._pending_results:
+            self._arranger_handler = 0
             return False
-        self.viewport.add(self.bake_application_slot(app))
+        result = self._pending_results.popleft()
+
+        # Keep the viewport ranked as results from different providers arrive.
+        key = (-result.score, result.title.casefold())
+        position = bisect.bisect(self._row_keys, key)
+        self._row_keys.insert(position, key)
+        button = self.bake_result_slot(result)
+        self.viewport.add(button)
+        self.viewport.reorder_child(button, position)
+
+        if self.selected_index != -1 and position <= self.selected_index:
+            self.selected_index += 1
+        if self._query.strip() and self._auto_select:
+            self.update_selection(0)
         return True
 
     def resize_viewport(self):
@@ -296,6 +263,41 @@ class AppLauncher(Box):
         )
         return button
 
+    def bake_result_slot(self, result: LauncherResult) -> Button:
+        if result.app is not None:
+            button = self.bake_application_slot(result.app)
+        else:
+            button = Button(
+                name="slot-button",
+                child=Box(
+                    name="slot-box",
+                    orientation="h",
+                    spacing=10,
+                    children=[
+                        Label(name="result-icon", markup=result.icon_markup or icons.apps, h_align="start"),
+                        Label(
+                            name="app-label",
+                            label=result.title,
+                            ellipsization="end",
+                            v_align="center",
+                            h_align="center",
+                        ),
+                        Label(
+                            name="app-desc",
+                            label=result.subtitle,
+                            ellipsization="end",
+                            v_align="center",
+                            h_align="start",
+                            h_expand=True,
+                        ),
+                    ],
+                ),
+                tooltip_text=result.subtitle or result.title,
+                on_clicked=lambda *_: (result.activate(), self.close_launcher()),
+            )
+        button.launcher_result = result
+        return button
+
     def update_selection(self, new_index: int):
 
         if self.selected_index != -1 and self.selected_index < len(self.viewport.get_children()):
@@ -471,9 +473,8 @@ class AppLauncher(Box):
         if not children or self.selected_index == -1 or self.selected_index >= len(children):
             return
 
-        selected_button = children[self.selected_index]
-
-        selected_app = next((app for app in self._all_apps if app.display_name == selected_button.get_child().get_children()[1].props.label), None)
+        selected_result = getattr(children[self.selected_index], "launcher_result", None)
+        selected_app = selected_result.app if selected_result else None
         if not selected_app:
             return
 
@@ -521,6 +522,7 @@ class AppLauncher(Box):
         children = self.viewport.get_children()
         if not children:
             return
+        self._auto_select = False
 
         if self.selected_index == -1 and delta == 1:
             new_index = 0
@@ -547,65 +549,7 @@ class AppLauncher(Box):
             return
             
 
-        replacements = {
-            "^": "**",
-            "×": "*",
-            "÷": "/",
-            "π": "np.pi",
-            "pi": "np.pi",
-            "e": "np.e",
-            "sin(": "np.sin(",
-            "cos(": "np.cos(",
-            "tan(": "np.tan(",
-            "log(": "np.log10(",
-            "ln(": "np.log(",
-            "sqrt(": "np.sqrt(",
-            "abs(": "np.abs(",
-            "exp(": "np.exp("
-        }
-        
-
-        for old, new in replacements.items():
-            expr = expr.replace(old, new)
-            
-
-        expr = re.sub(r'(\d+)!', r'np.factorial(\1)', expr)
-        
-
-        for old, new in [("[", "("), ("]", ")"), ("{", "("), ("}", ")")]:
-            expr = expr.replace(old, new)
-            
-
-        safe_dict = {
-            'np': np,
-            'math': math,
-            'arange': np.arange,
-            'linspace': np.linspace,
-            'array': np.array
-        }
-        
-        try:
-
-            result = eval(expr, {"__builtins__": None}, safe_dict)
-            
-
-            if isinstance(result, np.ndarray):
-                if result.size > 10:
-                    result_str = f"Array of shape {result.shape}"
-                else:
-                    result_str = str(result)
-            elif isinstance(result, (int, float, np.number)):
-
-                if isinstance(result, (int, np.integer)) or result.is_integer():
-                    result_str = str(int(result))
-                else:
-                    result_str = f"{float(result):.10g}"
-            else:
-                result_str = str(result)
-                
-        except Exception as e:
-            result_str = f"Error: {str(e)}"
-            
+        result_str = evaluate_math(expr)
 
         self.calc_history.insert(0, f"{text} => {result_str}")
         self.save_calc_history()
@@ -617,20 +561,29 @@ class AppLauncher(Box):
         if not expr:
             return
 
+        # Units and cached currency rates are answered in place; only a rate
+        # refresh has to leave the main thread.
+        try:
+            result_str = self._format_conversion(*self.converter.parse_input_and_convert(expr, fetch=False))
+        except RatesUnavailableError:
+            pass
+        except Exception:
+            self._update_conversion_result(text, "Error: Invalid conversion expression")
+            return
+        else:
+            self._update_conversion_result(text, result_str)
+            return
+
         # Add loading entry
         loading_entry = f"{text} => Loading..."
         self.conversion_history.insert(0, loading_entry)
         self.update_conversion_viewport()
 
         # Perform conversion in thread
-        def do_conversion():
+        def do_conversion(_):
             try:
-                result_value, result_type = self.converter.parse_input_and_convert(expr)
-                if result_type is None:
-                    result_str = f"{result_value:.2f}"
-                else:
-                    result_str = f"{result_value:.2f} {result_type}"
-            except:
+                result_str = self._format_conversion(*self.converter.parse_input_and_convert(expr))
+            except Exception:
                 result_str = "Error: Invalid conversion expression"
 
             # Update the history entry
@@ -638,6 +591,12 @@ class AppLauncher(Box):
 
         GLib.Thread.new("conversion", do_conversion, None)
 
+    @staticmethod
+    def _format_conversion(result_value, result_type) -> str:
+        if result_type is None:
+            return f"{result_value:.2f}"
+        return f"{result_value:.2f} {result_type}"
+
     def _update_conversion_result(self, text, result_str):
         # Replace the loading entry with the result
         if self.conversion_history and self.conversion_history[0].startswith(f"{text} => Loading"):
@@ -0,0 +1,636 @@
+"""
+Search providers for the app launcher.
+
+Every provider turns a query into a list of `LauncherResult`s. `LauncherSearch`
+runs them for each query generation: cheap providers (apps) answer inline,
+the rest run on a shared worker pool with a per-provider deadline and a
+cancellation token, and their results are handed back on the main loop only
+if the query they were computed for is still the current one.
+"""
+
+import ast
+import json
+import math
+import os
+import re
+import shlex
+import subprocess
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+import numpy as np
+from fabric.utils import exec_shell_command_async
+from gi.repository import GLib
+
+import config.data as data
+import modules.icons as icons
+from modules.pins import open_file
+from utils.conversion import Conversion
+from utils.file_index import FileIndex
+from utils.fuzzy import fuzzy_score
+
+RECENT_FILES_XBEL = os.path.join(GLib.get_user_data_dir(), "recently-used.xbel")
+
+
+class CancellationToken:
+    """Tied to one query generation; expires on its own after `timeout` seconds."""
+
+    __slots__ = ("generation", "deadline", "_cancelled")
+
+    def __init__(self, generation: int, timeout: float):
+        self.generation = generation
+        self.deadline = time.monotonic() + timeout
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() > self.deadline
+
+    @property
+    def stopped(self) -> bool:
+        """Providers poll this in their loops and bail out early."""
+        return self._cancelled or self.expired
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+
+@dataclass(slots=True)
+class LauncherResult:
+    title: str
+    activate: Callable[[], Any]
+    score: float = 0
+    subtitle: str = ""
+    icon_markup: Optional[str] = None
+    app: Any = None
+    provider: str = ""
+    key: str = field(default="", compare=False)
+
+
+def copy_to_clipboard(text: str) -> None:
+    try:
+        subprocess.run(["wl-copy"], input=text.encode(), check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Clipboard copy failed: {e}")
+
+
+def terminal_command(cmd: str) -> str:
+    return f"{data.TERMINAL_COMMAND} {cmd}"
+
+
+class Provider:
+    """Base class. `threaded` providers run off the main loop and must poll `token`."""
+
+    name: str = "provider"
+    threaded: bool = True
+    timeout: float = 0.5
+    limit: int = 5
+
+    def accepts(self, query: str) -> bool:
+        return bool(query.strip())
+
+    def search(self, query: str, token: CancellationToken) -> Iterable[LauncherResult]:
+        raise NotImplementedError
+
+
+def _extract_command_name(command_line):
+    """Extract base command name from command line, removing paths and arguments"""
+    if not command_line:
+        return ""
+    if command_line.startswith("/bin/sh -c"):
+        return ""
+    cmd = command_line.split()[0] if command_line.split() else ""
+    if "/" in cmd:
+        cmd = cmd.split("/")[-1]
+    return cmd
+
+
+def score_app(app, q: str) -> int:
+    """Calculate relevance score. Higher = better match."""
+    q = q.casefold()
+    name = (app.display_name or "").casefold()
+    app_name = (app.name or "").casefold()
+    generic = (app.generic_name or "").casefold()
+    exe = (app.executable or "").casefold()
+    cmd = _extract_command_name(app.command_line).casefold()
+
+    # Exact match on display name - highest priority
+    if name == q:
+        return 10000
+
+    # Exact match on app name or executable
+    if app_name == q or exe == q or cmd == q:
+        return 9000
+
+    # Display name starts with query
+    if name.startswith(q):
+        return 8000 - len(name)  # Shorter names rank higher
+
+    # App name or executable starts with query
+    if app_name.startswith(q) or exe.startswith(q) or cmd.startswith(q):
+        return 7000 - len(name)
+
+    # Word in display name starts with query
+    for i, word in enumerate(name.split()):
+        if word.startswith(q):
+            return 6000 - (i * 100) - len(name)
+
+    # Word in app_name starts with query
+    for word in app_name.replace('-', ' ').replace('.', ' ').split():
+        if word.startswith(q):
+            return 5000 - len(name)
+
+    # Substring match in display name
+    if q in name:
+        pos = name.find(q)
+        return 4000 - pos - len(name)
+
+    # Substring match in other fields
+    if q in f"{app_name} {generic} {exe} {cmd}":
+        return 3000 - len(name)
+
+    # Fuzzy match - all chars appear in order
+    it = iter(name)
+    if all(c in it for c in q):
+        return 1000
+
+    return 0  # No match
+
+
+class AppsProvider(Provider):
+    """Desktop applications. Runs inline so app results never wait on anything."""
+
+    name = "apps"
+    threaded = False
+    limit = 0
+
+    def __init__(self, get_apps: Callable[[], list]):
+        self.get_apps = get_apps
+
+    def accepts(self, query: str) -> bool:
+        return True
+
+    def search(self, query, token):
+        results = []
+        for app in self.get_apps():
+            score = score_app(app, query) if query else 1
+            if score > 0:
+                results.append(LauncherResult(
+                    title=app.display_name or "Unknown",
+                    subtitle=app.description or "",
+                    score=score,
+                    app=app,
+                    activate=app.launch,
+                ))
+        return results
+
+
+MAX_RESULT_MAGNITUDE = 10_000  # log10 bound; larger integers cannot be shown anyway
+MAX_ARRAY_MAGNITUDE = 6  # arrays of up to about a million values
+MAX_EXPONENT_MAGNITUDE = 15  # exponents and factorial arguments beyond 10**15 are never small
+MAX_SHIFT_MAGNITUDE = 5  # shifts of up to 100000 bits
+ARRAY_BUILDERS = frozenset({"arange", "linspace", "zeros", "ones", "empty", "full", "eye", "identity"})
+
+
+def _is_sequence(node: ast.AST) -> bool:
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Mult)):
+        return _is_sequence(node.left) or _is_sequence(node.right)
+    return isinstance(node, (ast.Tuple, ast.List)) or (
+        isinstance(node, ast.Constant) and isinstance(node.value, (str, bytes))
+    )
+
+
+def _magnitude(node: ast.AST) -> float:
+    """
+    An upper bound on log10 of the value `node` evaluates to.
+
+    Python integers never overflow, so `9**9**9` would hold the GIL for
+    minutes; bounding the expression first rejects it without computing it.
+    Exponents, shift counts and factorial arguments are bounded by their
+    value, 10 ** their magnitude, since that is what the result grows with.
+    """
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and abs(value) > 1:
+            return math.log10(abs(value))
+        return 0.0
+    if isinstance(node, ast.UnaryOp):
+        return _magnitude(node.operand)
+    if isinstance(node, ast.BinOp):
+        left, right = _magnitude(node.left), _magnitude(node.right)
+        if isinstance(node.op, ast.Pow):
+            if right > MAX_EXPONENT_MAGNITUDE:
+                return math.inf
+            return left * 10 ** right
+        if isinstance(node.op, ast.LShift):
+            if right > MAX_SHIFT_MAGNITUDE:
+                return math.inf
+            return left + 10 ** right * math.log10(2)
+        if isinstance(node.op, ast.Mult):
+            # sequence repetition allocates the whole result, whatever its magnitude
+            if _is_sequence(node.left) or _is_sequence(node.right):
+                return math.inf
+            return left + right
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            return max(left, right) + 1
+        if isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod, ast.RShift)):
+            return left
+        return max(left, right)
+    if isinstance(node, ast.Call):
+        args = [_magnitude(arg) for arg in node.args]
+        name = node.func.id if isinstance(node.func, ast.Name) else getattr(node.func, "attr", "")
+        if name in ARRAY_BUILDERS and max(args, default=0.0) > MAX_ARRAY_MAGNITUDE:
+            return math.inf
+        if name == "factorial" and args:
+            # log10(n!) <= n * log10(n)
+            if args[0] > MAX_EXPONENT_MAGNITUDE:
+                return math.inf
+            return 10 ** args[0] * args[0]
+        return max(args, default=0.0)
+    if isinstance(node, (ast.Tuple, ast.List)):
+        return max((_magnitude(elt) for elt in node.elts), default=0.0)
+    return 0.0
+
+
+def evaluate_math(expr: str) -> str:
+    """Evaluate a calculator expression and return the formatted result or error."""
+    replacements = {
+        "^": "**",
+        "×": "*",
+        "÷": "/",
+        "π": "np.pi",
+        "pi": "np.pi",
+        "e": "np.e",
+        "sin(": "np.sin(",
+        "cos(": "np.cos(",
+        "tan(": "np.tan(",
+        "log(": "np.log10(",
+        "ln(": "np.log(",
+        "sqrt(": "np.sqrt(",
+        "abs(": "np.abs(",
+        "exp(": "np.exp("
+    }
+
+    for old, new in replacements.items():
+        expr = expr.replace(old, new)
+
+    expr = re.sub(r'(\d+)!', r'np.factorial(\1)', expr)
+
+    for old, new in [("[", "("), ("]", ")"), ("{", "("), ("}", ")")]:
+        expr = expr.replace(old, new)
+
+    safe_dict = {
+        'np': np,
+        'math': math,
+        'arange': np.arange,
+        'linspace': np.linspace,
+        'array': np.array
+    }
+
+    try:
+        tree = ast.parse(expr, mode="eval")
+        if _magnitude(tree.body) > MAX_RESULT_MAGNITUDE:
+            return "Error: result too large"
+        result = eval(compile(tree, "<calculator>", "eval"), {"__builtins__": None}, safe_dict)
+
+        if isinstance(result, np.ndarray):
+            if result.size > 10:
+                return f"Array of shape {result.shape}"
+            return str(result)
+        if isinstance(result, (int, float, np.number)):
+            if isinstance(result, (int, np.integer)) or result.is_integer():
+                return str(int(result))
+            return f"{float(result):.10g}"
+        return str(result)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+class CalculatorProvider(Provider):
+    """Plain arithmetic typed straight into the search entry, e.g. `2^10 / 3`."""
+
+    name = "calculator"
+    timeout = 0.2
+    limit = 1
+
+    _EXPRESSION = re.compile(r"[\d\s.+\-*/^()!%×÷π]+")
+
+    def accepts(self, query):
+        query = query.strip()
+        return (
+            bool(self._EXPRESSION.fullmatch(query))
+            and any(c.isdigit() for c in query)
+            and any(c in "+-*/^!×÷(" for c in query)
+        )
+
+    def search(self, query, token):
+        result = evaluate_math(query.strip())
+        if result.startswith("Error"):
+            return []
+        return [LauncherResult(
+            title=f"{query.strip()} = {result}",
+            subtitle="Copy result",
+            score=11000,
+            icon_markup=icons.calculator,
+            activate=lambda: copy_to_clipboard(result),
+        )]
+
+
+class ConversionProvider(Provider):
+    """Unit and currency conversions such as `10 km to mi` or `20 usd _ eur`."""
+
+    name = "conversion"
+    timeout = 6
+    limit = 1
+
+    _EXPRESSION = re.compile(r"-?[\d.]+\s+\S+(\s+and\s+-?[\d.]+\s+\S+)?\s+(_|to|in)\s+\S+", re.IGNORECASE)
+
+    def __init__(self, converter: Conversion):
+        self.converter = converter
+
+    def accepts(self, query):
+        return bool(self._EXPRESSION.fullmatch(query.strip()))
+
+    def search(self, query, token):
+        try:
+            value, unit = self.converter.parse_input_and_convert(query.strip())
+        except Exception:
+            return []
+        result = f"{value:.2f} {unit}"
+        return [LauncherResult(
+            title=f"{query.strip()} = {result}",
+            subtitle="Copy result",
+            score=11000,
+            icon_markup=icons.exchange,
+            activate=lambda: copy_to_clipboard(result),
+        )]
+
+
+class WindowsProvider(Provider):
+    """Open Hyprland windows; activating one focuses it."""
+
+    name = "windows"
+
+    def search(self, query, token):
+        try:
+            clients = json.loads(subprocess.run(
+                ["hyprctl", "-j", "clients"],
+                capture_output=True, text=True, timeout=token.remaining,
+            ).stdout)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            return []
+        q = query.casefold()
+        results = []
+        for client in clients:
+            if token.stopped:
+                break
+            if not client.get("mapped", True):
+                continue
+            title, window_class = client.get("title", ""), client.get("class", "")
+            score = max(fuzzy_score(q, title), fuzzy_score(q, window_class))
+            if score:
+                address = client.get("address")
+                results.append(LauncherResult(
+                    title=title or window_class,
+                    subtitle=f"{window_class} · workspace {client.get('workspace', {}).get('name', '?')}",
+                    score=score - 500,
+                    icon_markup=icons.windows,
+                    activate=lambda a=address: exec_shell_command_async(f"hyprctl dispatch focuswindow address:{a}"),
+                ))
+        return results
+
+
+class TmuxProvider(Provider):
+    """Running tmux sessions; activating one attaches to it in a terminal."""
+
+    name = "tmux"
+
+    def search(self, query, token):
+        try:
+            result = subprocess.run(
+                ["tmux", "list-sessions", "-F", "#{session_name}"],
+                capture_output=True, text=True, timeout=token.remaining,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return []
+        if result.returncode != 0:
+            return []
+        q = query.casefold()
+        results = []
+        for session in filter(None, (s.strip() for s in result.stdout.splitlines())):
+            score = fuzzy_score(q, session)
+            if score:
+                results.append(LauncherResult(
+                    title=session,
+                    subtitle="Attach tmux session",
+                    score=score - 1000,
+                    icon_markup=icons.terminal,
+                    activate=lambda s=session: exec_shell_command_async(
+                        terminal_command(f"tmux attach-session -t {shlex.quote(s)}")
+                    ),
+                ))
+        return results
+
+
+class RecentFilesProvider(Provider):
+    """Files from the shared GTK recently-used list, reparsed only when it changes."""
+
+    name = "recent"
+
+    def __init__(self, path: str = RECENT_FILES_XBEL):
+        self.path = path
+        self._mtime = None
+        self._entries: List[tuple[str, str]] = []
+
+    def _load(self) -> List[tuple[str, str]]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return []
+        if mtime != self._mtime:
+            entries = []
+            try:
+                for bookmark in ET.parse(self.path).getroot().iter("bookmark"):
+                    href = bookmark.get("href", "")
+                    if href.startswith("file://"):
+                        path = urllib.parse.unquote(href[len("file://"):])
+                        entries.append((os.path.basename(path), path))
+            except (OSError, ET.ParseError) as e:
+                print(f"Error reading recent files: {e}")
+            # Most recently added bookmarks come last in the file.
+            self._entries = entries[::-1]
+            self._mtime = mtime
+        return self._entries
+
+    def search(self, query, token):
+        q = query.casefold()
+        results = []
+        for name, path in self._load():
+            if token.stopped or len(results) >= self.limit:
+                break
+            score = fuzzy_score(q, name)
+            if score and os.path.exists(path):
+                results.append(LauncherResult(
+                    title=name,
+                    subtitle=path,
+                    score=score - 1500,
+                    icon_markup=icons.file,
+                    activate=lambda p=path: open_file(p),
+                ))
+        return results
+
+
+class FilesProvider(Provider):
+    """Files under the configured roots, looked up in the persistent `FileIndex`."""
+
+    name = "files"
+    timeout = 0.3
+    limit = 8
+
+    def __init__(self, index: FileIndex):
+        self.index = index
+
+    def accepts(self, query):
+        return len(query.strip()) >= 2
+
+    def search(self, query, token):
+        q = query.strip().casefold()
+        results = []
+        for path in self.index.search(q, limit=50, stopped=lambda: token.stopped):
+            name = os.path.basename(path)
+            results.append(LauncherResult(
+                title=name,
+                subtitle=path,
+                score=fuzzy_score(q, name) - 1200,
+                icon_markup=icons.file,
+                activate=lambda p=path: open_file(p),
+            ))
+        return results
+
+
+class PathCommandsProvider(Provider):
+    """Executables on `$PATH`; the query is run as a command line in a terminal."""
+
+    name = "commands"
+    limit = 3
+
+    def __init__(self):
+        self._signature = None
+        self._commands: List[str] = []
+
+    def _load(self) -> List[str]:
+        dirs = [d for d in os.environ.get("PATH", "").split(os.pathsep) if d]
+        signature = []
+        for d in dirs:
+            try:
+                signature.append((d, os.stat(d).st_mtime))
+            except OSError:
+                continue
+        if signature != self._signature:
+            commands = set()
+            for d, _ in signature:
+                try:
+                    with os.scandir(d) as it:
+                        for entry in it:
+                            if entry.is_file() and os.access(entry.path, os.X_OK):
+                                commands.add(entry.name)
+                except OSError:
+                    continue
+            self._commands = sorted(commands)
+            self._signature = signature
+        return self._commands
+
+    def search(self, query, token):
+        command_line = query.strip()
+        word = command_line.split()[0]
+        results = []
+        for command in self._load():
+            if token.stopped or len(results) >= self.limit:
+                break
+            if command.startswith(word):
+                line = command_line if command == word else command
+                results.append(LauncherResult(
+                    title=line,
+                    subtitle="Run in terminal",
+                    score=(7000 if command == word else 5000 - len(command)) - 2500,
+                    icon_markup=icons.terminal,
+                    activate=lambda c=line: exec_shell_command_async(terminal_command(c)),
+                ))
+        return results
+
+
+class LauncherSearch:
+    """
+    Fans a query out to every provider and streams their results back.
+
+    `on_results(provider, results)` is always called on the main loop and only
+    for the latest query: results computed for an older generation, or after
+    a provider's deadline, are dropped.
+    """
+
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    def __init__(self, providers: List[Provider], max_workers: int = 4):
+        self.providers = providers
+        self._generation = 0
+        self._tokens: List[CancellationToken] = []
+        if LauncherSearch._executor is None:
+            LauncherSearch._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="launcher-provider"
+            )
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def cancel(self) -> None:
+        for token in self._tokens:
+            token.cancel()
+        self._tokens = []
+
+    def search(self, query: str, on_results: Callable[[Provider, List[LauncherResult]], None]) -> int:
+        self.cancel()
+        self._generation += 1
+        for provider in self.providers:
+            if not provider.accepts(query):
+                continue
+            token = CancellationToken(self._generation, provider.timeout)
+            self._tokens.append(token)
+            if provider.threaded:
+                self._executor.submit(self._run, provider, query, token, on_results)
+            else:
+                self._deliver(provider, self._collect(provider, query, token), token, on_results)
+        return self._generation
+
+    def _collect(self, provider: Provider, query: str, token: CancellationToken) -> List[LauncherResult]:
+        try:
+            results = list(provider.search(query, token))
+        except Exception as e:
+            print(f"Launcher provider '{provider.name}' failed: {e}")
+            return []
+        results.sort(key=lambda r: -r.score)
+        for result in results:
+            result.provider = provider.name
+        return results[:provider.limit] if provider.limit else results
+
+    def _run(self, provider, query, token, on_results):
+        results = self._collect(provider, query, token)
+        if results and not token.stopped:
+            GLib.idle_add(self._deliver, provider, results, token, on_results)
+
+    def _deliver(self, provider, results, token, on_results):
+        if not token.cancelled and token.generation == self._generation and results:
+            on_results(provider, results)
+        return False
@@ -1,6 +1,7 @@
-import json
+import bisect
 import locale
 import os
+import time
 import uuid
 from datetime import datetime, timedelta
 
@@ -8,6 +9,7 @@ from fabric.notifications.service import Notification, NotificationAction, Notif
 from fabric.widgets.box import Box
 from fabric.widgets.button import Button
 from fabric.widgets.centerbox import CenterBox
+from fabric.widgets.entry import Entry
 from fabric.widgets.image import Image
 from fabric.widgets.label import Label
 from fabric.widgets.revealer import Revealer
@@ -17,57 +19,66 @@ from loguru import logger
 
 import config.data as data
 import modules.icons as icons
+from services.notification_history import HistoryRecord, NotificationHistoryStore
+from services.notification_images import NotificationImageCache
+from utils.notification_flood import Arrival, NotificationFloodGate, coalesce_key
+from utils.notification_index import NotificationQuery, highlight
+from utils.pixbuf_cache import PixbufLRU
 from widgets.image import CustomImage
 from widgets.wayland import WaylandWindow as Window
 
-PERSISTENT_DIR = f"/tmp/{data.APP_NAME}/notifications"
-PERSISTENT_HISTORY_FILE = os.path.join(PERSISTENT_DIR, "notification_history.json")
+ROW_HEIGHT = 68  # 48 px image plus the padding and border of #notification-box-hist
+SEPARATOR_HEIGHT = 26
+ROW_SPACING = 4
+OVERSCAN = 2  # entries bound above and below the visible page
+LOAD_AHEAD = 20  # entries left below the page before the next journal page is read
+SEARCH_LIMIT = 500
+MIN_DRAIN_INTERVAL_MS = 50
+CONFIG_TTL = 2  # s the app lists below are reused for; they are read for every notification
+
+_history_pixbufs = PixbufLRU(4 * 1024 * 1024)
+_config_cache = {"loaded": None, "config": {}}
+
+
+def _load_config():
+    now = time.monotonic()
+    if _config_cache["loaded"] is None or now - _config_cache["loaded"] > CONFIG_TTL:
+        _config_cache["config"] = data.load_config()
+        _config_cache["loaded"] = now
+    return _config_cache["config"]
 
 
 # Get configurable app lists from settings
 def get_limited_apps_history():
-    config = data.load_config()
+    config = _load_config()
     return config.get("limited_apps_history", ["Spotify"])
 
 
 def get_history_ignored_apps():
-    config = data.load_config()
+    config = _load_config()
     return config.get("history_ignored_apps", ["Hyprshot"])
 
 
 def cache_notification_pixbuf(notification_box):
     """
-    Saves a scaled pixbuf (48x48) in the cache directory and returns the cache file path.
+    Hands the notification's image to the image cache and returns the path it
+    is saved at; the box holds a reference on it until it is destroyed.
     """
     notification = notification_box.notification
-    if notification.image_pixbuf:
-        os.makedirs(PERSISTENT_DIR, exist_ok=True)
-        cache_file = os.path.join(
-            PERSISTENT_DIR, f"notification_{notification_box.uuid}.png"
-        )
-        logger.debug(
-            f"Caching image for notification {notification.id} to: {cache_file}"
-        )
-        try:
-            scaled = notification.image_pixbuf.scale_simple(
-                48, 48, GdkPixbuf.InterpType.BILINEAR
-            )
-            scaled.savev(cache_file, "png", [], [])
-            logger.info(
-                f"Successfully cached image for notification {notification.id} to: {cache_file}"
-            )
-            return cache_file
-        except Exception as e:
-            logger.error(f"Error caching image for notification {notification.id}: {e}")
-            return None
-    else:
+    if not notification.image_pixbuf:
         logger.debug(f"Notification {notification.id} has no image_pixbuf to cache.")
         return None
+    try:
+        return NotificationImageCache.get_initial().store(notification.image_pixbuf)
+    except Exception as e:
+        logger.error(f"Error caching image for notification {notification.id}: {e}")
+        return None
 
 
 def load_scaled_pixbuf(notification_box, width, height):
     """
-    Loads and scales a pixbuf for a notification_box, prioritizing cached images.
+    Loads and scales a pixbuf for a notification_box, preferring the image it
+    arrived with over the copy being written to the cache.
     """
     notification = notification_box.notification
     if not hasattr(notification_box, "notification") or notification is None:
@@ -76,41 +87,20 @@ def load_scaled_pixbuf(notification_box, width, height):
         )
         return None
 
-    pixbuf = None
-    if (
-        hasattr(notification_box, "cached_image_path")
-        and notification_box.cached_image_path
-        and os.path.exists(notification_box.cached_image_path)
-    ):
+    if notification.image_pixbuf:
+        return notification.image_pixbuf.scale_simple(
+            width, height, GdkPixbuf.InterpType.BILINEAR
+        )
+
+    if notification_box.cached_image_path and os.path.exists(notification_box.cached_image_path):
         try:
-            logger.debug(
-                f"Attempting to load cached image from: {notification_box.cached_image_path} for notification {notification.id}"
+            return GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                notification_box.cached_image_path, width, height, False
             )
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(notification_box.cached_image_path)
-            if pixbuf:
-                pixbuf = pixbuf.scale_simple(
-                    width, height, GdkPixbuf.InterpType.BILINEAR
-                )
-                logger.info(
-                    f"Successfully loaded cached image from: {notification_box.cached_image_path} for notification {notification.id}"
-                )
-            return pixbuf
         except Exception as e:
             logger.error(
                 f"Error loading cached image from {notification_box.cached_image_path} for notification {notification.id}: {e}"
             )
-            logger.warning(
-                f"Falling back to notification.image_pixbuf for notification {notification.id}"
-            )
-
-    if notification.image_pixbuf:
-        logger.debug(
-            f"Loading image directly from notification.image_pixbuf for notification {notification.id}"
-        )
-        pixbuf = notification.image_pixbuf.scale_simple(
-            width, height, GdkPixbuf.InterpType.BILINEAR
-        )
-        return pixbuf
 
     logger.debug(
         f"No image_pixbuf or cached image found, trying app icon for notification {notification.id}"
@@ -137,6 +127,35 @@ def get_app_icon_pixbuf(icon_path, width, height):
         return None
 
 
+def load_record_pixbuf(record, size):
+    """
+    Image for a history record, decoded when a row is bound to it and kept in
+    a small LRU; falls back to the app icon.
+    """
+    key = (record.cached_image_path or record.app_icon, size)
+    pixbuf = _history_pixbufs.get(key)
+    if pixbuf is not None:
+        return pixbuf
+    pending = NotificationImageCache.get_initial().pixbuf(record.cached_image_path)
+    if pending is not None:
+        # Still being written; not cached here, the file is read next time
+        return pending.scale_simple(size, size, GdkPixbuf.InterpType.BILINEAR)
+    if record.cached_image_path and os.path.exists(record.cached_image_path):
+        try:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                record.cached_image_path, size, size, False
+            )
+        except Exception as e:
+            logger.error(
+                f"Error loading cached image from {record.cached_image_path}: {e}"
+            )
+    if pixbuf is None:
+        pixbuf = get_app_icon_pixbuf(record.app_icon, size, size)
+    if pixbuf is not None:
+        _history_pixbufs.put(key, pixbuf)
+    return pixbuf
+
+
 class ActionButton(Button):
     def __init__(
         self, action: NotificationAction, index: int, total: int, notification_box
@@ -177,7 +196,7 @@ class ActionButton(Button):
 
 
 class NotificationBox(Box):
-    def __init__(self, notification: Notification, timeout_ms=5000, **kwargs):
+    def __init__(self, notification: Notification, timeout_ms=5000, count=1, **kwargs):
         super().__init__(
             name="notification-box",
             orientation="v",
@@ -186,6 +205,7 @@ class NotificationBox(Box):
             children=[],
         )
         self.notification = notification
+        self.count = count  # notifications coalesced into this one
         self.uuid = str(uuid.uuid4())
 
         if timeout_ms == 0:
@@ -201,18 +221,7 @@ class NotificationBox(Box):
             self.start_timeout()
 
         if self.notification.image_pixbuf:
-            cache_path = cache_notification_pixbuf(self)
-            if cache_path:
-                self.cached_image_path = cache_path
-                logger.debug(
-                    f"NotificationBox {self.uuid}: Cached image path set to: {self.cached_image_path}"
-                )
-            else:
-                logger.warning(
-                    f"NotificationBox {self.uuid}: Caching failed, cached_image_path not set."
-                )
-        else:
-            logger.debug(f"NotificationBox {self.uuid}: No image to cache.")
+            self.cached_image_path = cache_notification_pixbuf(self)
 
         content = self.create_content()
         action_buttons = self.create_action_buttons()
@@ -232,6 +241,24 @@ class NotificationBox(Box):
     def set_is_history(self, is_history):
         self._is_history = is_history
 
+    def update(self, notification: Notification, count: int):
+        """Show `notification`, a replacement or repeat of the current one, in this box."""
+        self.notification = notification
+        self.count = count
+        cached_image_path = cache_notification_pixbuf(self)
+        NotificationImageCache.get_initial().release(self.cached_image_path)
+        self.cached_image_path = cached_image_path
+        for child in self.get_children():
+            self.remove(child)
+            child.destroy()
+        self.add(self.create_content())
+        action_buttons = self.create_action_buttons()
+        if action_buttons:
+            self.add(action_buttons)
+        self.show_all()
+        if self.timeout_ms > 0:
+            self.start_timeout()
+
     def set_container(self, container):
         self._container = container
 
@@ -294,6 +321,11 @@ class NotificationBox(Box):
             max_chars_width=16,
             ellipsization="end",
         )
+        self.notification_count_label = Label(
+            name="notification-count", label=f"×{self.count}", h_align="start"
+        )
+        self.notification_count_label.set_no_show_all(True)
+        self.notification_count_label.set_visible(self.count > 1)
         self.notification_body_label = (
             Label(
                 markup=notification.body,
@@ -319,6 +351,7 @@ class NotificationBox(Box):
                     orientation="h",
                     children=[
                         self.notification_summary_label,
+                        self.notification_count_label,
                         Box(
                             name="notif-sep",
                             h_expand=False,
@@ -412,19 +445,9 @@ class NotificationBox(Box):
         logger.debug(
             f"NotificationBox destroy called for notification: {self.notification.id}, from_history_delete: {from_history_delete}, is_history: {self._is_history}"
         )
-        if (
-            hasattr(self, "cached_image_path")
-            and self.cached_image_path
-            and os.path.exists(self.cached_image_path)
-            and (not self._is_history or from_history_delete)
-        ):
-            try:
-                os.remove(self.cached_image_path)
-                logger.info(f"Deleted cached image: {self.cached_image_path}")
-            except Exception as e:
-                logger.error(
-                    f"Error deleting cached image {self.cached_image_path}: {e}"
-                )
+        if not self._destroyed:
+            # A history record keeps its own reference on the image
+            NotificationImageCache.get_initial().release(self.cached_image_path)
         self._destroyed = True
         self.stop_timeout()
         super().destroy()
@@ -438,27 +461,137 @@ class NotificationBox(Box):
             self._container.resume_all_timeouts()
 
 
-class HistoricalNotification(object):
-    def __init__(
-        self, id, app_icon, summary, body, app_name, timestamp, cached_image_path=None
-    ):
-        self.id = id
-        self.app_icon = app_icon
-        self.summary = summary
-        self.body = body
-        self.app_name = app_name
-        self.timestamp = timestamp
-        self.cached_image_path = cached_image_path
-        self.image_pixbuf = None
-        self.actions = []
-        self.cached_scaled_pixbuf = None
+class HistorySlot(Box):
+    """A recycled history entry; `bind()` shows it as a day separator or a notification row."""
+
+    def __init__(self, on_delete, **kwargs):
+        super().__init__(name="notification-container", orientation="v", **kwargs)
+        self.entry = None
+        self.separator_label = Label(
+            name="notif-date-sep-label",
+            h_align="center",
+            h_expand=True,
+        )
+        self.separator = Box(name="notif-date-sep", children=[self.separator_label])
+        self.image = CustomImage()
+        self.summary_label = Label(
+            name="notification-summary",
+            h_align="start",
+            ellipsization="end",
+        )
+        self.count_label = Label(name="notification-count", h_align="start")
+        self.count_label.set_no_show_all(True)
+        self.app_name_label = Label(
+            name="notification-app-name",
+            h_align="start",
+            ellipsization="end",
+        )
+        self.time_label = Label(
+            name="notification-timestamp",
+            h_align="start",
+            ellipsization="end",
+        )
+        self.body_label = Label(
+            name="notification-body",
+            h_align="start",
+            ellipsization="end",
+            line_wrap="word-char",
+        )
+        self.body_label.set_single_line_mode(True)
+        self.row = Box(
+            name="notification-box-hist",
+            spacing=8,
+            children=[
+                Box(
+                    name="notification-image",
+                    orientation="v",
+                    children=[self.image, Box(v_expand=True)],
+                ),
+                Box(
+                    name="notification-text",
+                    orientation="v",
+                    v_align="center",
+                    h_expand=True,
+                    children=[
+                        Box(
+                            name="notification-summary-box",
+                            orientation="h",
+                            children=[
+                                self.summary_label,
+                                self.count_label,
+                                Box(
+                                    name="notif-sep",
+                                    h_expand=False,
+                                    v_expand=False,
+                                    h_align="center",
+                                    v_align="center",
+                                ),
+                                self.app_name_label,
+                                Box(
+                                    name="notif-sep",
+                                    h_expand=False,
+                                    v_expand=False,
+                                    h_align="center",
+                                    v_align="center",
+                                ),
+                                self.time_label,
+                            ],
+                        ),
+                        self.body_label,
+                    ],
+                ),
+                Box(
+                    orientation="v",
+                    children=[
+                        Button(
+                            name="notif-close-button",
+                            child=Label(name="notif-close-label", markup=icons.cancel),
+                            on_clicked=lambda *_: isinstance(self.entry, HistoryRecord)
+                            and on_delete(self.entry),
+                        ),
+                        Box(v_expand=True),
+                    ],
+                ),
+            ],
+        )
+        self.row.set_size_request(-1, ROW_HEIGHT)
+        self.add(self.separator)
+        self.add(self.row)
+        self.show_all()
+
+    def bind(self, entry, date_header=None, terms=()):
+        self.entry = entry
+        if isinstance(entry, HistoryRecord):
+            self.image.set_from_pixbuf(load_record_pixbuf(entry, 48))
+            self.summary_label.set_markup(highlight(entry.summary, terms))
+            self.count_label.set_label(f"×{entry.count}")
+            self.count_label.set_visible(entry.count > 1)
+            self.app_name_label.set_markup(highlight(entry.app_name, terms))
+            self.time_label.set_markup(entry.arrival.strftime("%H:%M"))
+            self.body_label.set_markup(highlight(entry.body, terms))
+            self.body_label.set_visible(bool(entry.body))
+            self.separator.hide()
+            self.row.show()
+        else:
+            self.separator_label.set_label(date_header)
+            self.row.hide()
+            self.separator.show()
 
 
 class NotificationHistory(Box):
+    """
+    Scrollable view of the shared `NotificationHistoryStore`.
+
+    Only enough slots to cover the visible page are built and they are
+    rebound as the list scrolls; the spacers stand in for everything else.
+    Entries are the store's records, or the search results while there is a
+    query, with a date inserted before each day, and `offsets[i]` is where
+    entry i starts.
+    """
+
     def __init__(self, **kwargs):
         super().__init__(name="notification-history", orientation="v", **kwargs)
 
-        self.containers = []
         self.header_label = Label(
             name="nhh",
             label="Notifications",
@@ -485,15 +618,24 @@ class NotificationHistory(Box):
             center_children=[self.header_label],
             end_children=[self.header_clean],
         )
+        self.search_entry = Entry(
+            name="search-entry",
+            placeholder="Search Notifications...",
+            tooltip_text="Filters: app:name since:2h until:yesterday urgency:critical\n"
+            "since/until take 30m, 2h, 3d, 1w, today, yesterday or a date",
+            h_expand=True,
+            h_align="fill",
+            notify_text=self.on_search_changed,
+        )
         self.notifications_list = Box(
             name="notifications-list",
             orientation="v",
-            spacing=4,
+            spacing=ROW_SPACING,
             h_expand=True,
-            v_expand=True,
             h_align="fill",
-            v_align="fill",
         )
+        self.top_spacer = Box()
+        self.bottom_spacer = Box()
         self.no_notifications_label = Label(
             name="no-notif",
             markup=icons.notifications_clear,
@@ -523,13 +665,41 @@ class NotificationHistory(Box):
         )
         self.scrolled_window_viewport_box = Box(
             orientation="v",
-            children=[self.notifications_list, self.no_notifications_box],
+            children=[
+                self.top_spacer,
+                self.notifications_list,
+                self.bottom_spacer,
+                self.no_notifications_box,
+            ],
         )
         self.scrolled_window.add_with_viewport(self.scrolled_window_viewport_box)
-        self.persistent_notifications = []
         self.add(self.history_header)
+        self.add(self.search_entry)
         self.add(self.scrolled_window)
-        GLib.idle_add(self._load_persistent_history().__next__)
+
+        self.slots = []
+        self.query = None
+        self.results = []
+        self.entries = []
+        self.offsets = [0]
+        self.row_stride = ROW_HEIGHT + ROW_SPACING
+        self.separator_stride = SEPARATOR_HEIGHT + ROW_SPACING
+        self._entries_dirty = True
+        self._render_handler = 0
+        self._load_handler = 0
+
+        vadjustment = self.scrolled_window.get_vadjustment()
+        vadjustment.connect("value-changed", self.queue_render)
+        vadjustment.connect("notify::page-size", self.queue_render)
+        self.connect("map", self.queue_render)
+
+        self.store = NotificationHistoryStore.get_initial()
+        self.store.connect("record-added", self.on_records_changed)
+        self.store.connect("record-removed", self.on_records_changed)
+        self.store.connect("cleared", self.on_records_changed)
+        self.store.connect("indexed", self.on_records_changed)
+        self.update_no_notifications_label_visibility()
+        self.schedule_midnight_update()
 
     def get_ordinal(self, n):
         if 11 <= (n % 100) <= 13:
@@ -572,52 +742,106 @@ class NotificationHistory(Box):
         GLib.timeout_add_seconds(int(delta_seconds), self.on_midnight)
 
     def on_midnight(self):
-        self.rebuild_with_separators()
+        # "Today" becomes "Yesterday" and so on: rebind the separators on screen
+        for slot in self.slots:
+            if not isinstance(slot.entry, HistoryRecord):
+                slot.entry = None
+        self.queue_render()
         self.schedule_midnight_update()
         return GLib.SOURCE_REMOVE
 
-    def create_date_separator(self, date_header):
-        return Box(
-            name="notif-date-sep",
-            children=[
-                Label(
-                    name="notif-date-sep-label",
-                    label=date_header,
-                    h_align="center",
-                    h_expand=True,
-                )
-            ],
-        )
-
-    def rebuild_with_separators(self):
-        GLib.idle_add(self._do_rebuild_with_separators)
-
-    def _do_rebuild_with_separators(self):
-        children = list(self.notifications_list.get_children())
-        for child in children:
-            self.notifications_list.remove(child)
-
-        current_date_header = None
-        last_date_header = None
-        for container in sorted(
-            self.containers, key=lambda x: x.arrival_time, reverse=True
-        ):
-            arrival_time = container.arrival_time
-            date_header = self.get_date_header(arrival_time)
-            if date_header != current_date_header:
-                sep = self.create_date_separator(date_header)
-                self.notifications_list.add(sep)
-                current_date_header = date_header
-                last_date_header = date_header
-            self.notifications_list.add(container)
-
-        if not self.containers and last_date_header:
-            for child in list(self.notifications_list.get_children()):
-                if child.get_name() == "notif-date-sep":
-                    self.notifications_list.remove(child)
-
-        self.notifications_list.show_all()
+    def on_records_changed(self, *_):
+        if self.query is not None:
+            self.results = self.store.search(self.query, SEARCH_LIMIT)
+        self._entries_dirty = True
         self.update_no_notifications_label_visibility()
+        self.queue_render()
+
+    def on_search_changed(self, entry, *_):
+        query = NotificationQuery.parse(entry.get_text())
+        self.query = None if query.is_empty else query
+        # Highlights depend on the query: rebind every slot
+        for slot in self.slots:
+            slot.entry = None
+        self.scrolled_window.get_vadjustment().set_value(0)
+        self.on_records_changed()
+
+    def queue_render(self, *_):
+        if not self._render_handler:
+            self._render_handler = GLib.idle_add(self._render)
+
+    def _render(self):
+        self._render_handler = 0
+        # Hidden views catch up when they are mapped again
+        if self.get_mapped():
+            self.render_rows()
+        return False
+
+    def _build_entries(self):
+        entries = []
+        offsets = [0]
+        day = None
+        for record in self.store.records if self.query is None else self.results:
+            if record.day != day:
+                day = record.day
+                entries.append(day)
+                offsets.append(offsets[-1] + self.separator_stride)
+            entries.append(record)
+            offsets.append(offsets[-1] + self.row_stride)
+        self.entries = entries
+        self.offsets = offsets
+        self._entries_dirty = False
+
+    def render_rows(self):
+        """Bind the slot pool to the entries around the visible page."""
+        if self._entries_dirty:
+            self._build_entries()
+        adj = self.scrolled_window.get_vadjustment()
+        top = adj.get_value()
+        total = len(self.entries)
+        first = max(0, bisect.bisect_right(self.offsets, top) - 1 - OVERSCAN)
+        last = min(total, bisect.bisect_left(self.offsets, top + adj.get_page_size()) + OVERSCAN)
+        count = max(0, last - first)
+
+        while len(self.slots) < count:
+            slot = HistorySlot(self.store.remove)
+            slot.row.connect("size-allocate", self._on_slot_allocated, "row_stride")
+            slot.separator.connect("size-allocate", self._on_slot_allocated, "separator_stride")
+            self.slots.append(slot)
+            self.notifications_list.add(slot)
+
+        for offset, slot in enumerate(self.slots):
+            if offset >= count:
+                slot.entry = None
+                slot.hide()
+                continue
+            entry = self.entries[first + offset]
+            if slot.entry is not entry:
+                if isinstance(entry, HistoryRecord):
+                    slot.bind(entry, terms=self.query.terms if self.query else ())
+                else:
+                    slot.bind(entry, self.get_date_header(datetime.combine(entry, datetime.min.time())))
+            slot.show()
+
+        self.top_spacer.set_size_request(-1, self.offsets[first])
+        self.bottom_spacer.set_size_request(-1, self.offsets[total] - self.offsets[first + count])
+
+        # Search results come from the index, which covers the whole journal
+        if self.query is None and self.store.has_more and total - last < LOAD_AHEAD and not self._load_handler:
+            self._load_handler = GLib.idle_add(self._load_more)
+
+    def _on_slot_allocated(self, widget, allocation, stride_name):
+        # Themes may make entries taller than assumed; strides only ever grow
+        stride = allocation.height + ROW_SPACING
+        if stride > getattr(self, stride_name):
+            setattr(self, stride_name, stride)
+            self._entries_dirty = True
+            self.queue_render()
+
+    def _load_more(self):
+        self._load_handler = 0
+        self.store.load_more()
+        return False
 
     def on_do_not_disturb_changed(self, switch, pspec):
         self.do_not_disturb_enabled = switch.get_active()
@@ -626,488 +850,63 @@ class NotificationHistory(Box):
         )
 
     def clear_history(self, *args):
-        for child in self.notifications_list.get_children()[:]:
-            container = child
-            notif_box = (
-                container.notification_box
-                if hasattr(container, "notification_box")
-                else None
-            )
-            if notif_box:
-                notif_box.destroy(from_history_delete=True)
-            self.notifications_list.remove(child)
-            child.destroy()
-
-        if os.path.exists(PERSISTENT_HISTORY_FILE):
-            try:
-                os.remove(PERSISTENT_HISTORY_FILE)
-                logger.info("Notification history cleared and persistent file deleted.")
-            except Exception as e:
-                logger.error(f"Error deleting persistent history file: {e}")
-        self.persistent_notifications = []
-        self.containers = []
-        self.rebuild_with_separators()
-
-    def _load_persistent_history(self):
-        if not os.path.exists(PERSISTENT_DIR):
-            os.makedirs(PERSISTENT_DIR, exist_ok=True)
-        if os.path.exists(PERSISTENT_HISTORY_FILE):
-            try:
-                with open(PERSISTENT_HISTORY_FILE, "r") as f:
-                    self.persistent_notifications = json.load(f)
-                for note in reversed(self.persistent_notifications):
-                    self._add_historical_notification(note)
-                    yield True
-            except Exception as e:
-                logger.error(f"Error loading persistent history: {e}")
-        GLib.idle_add(self.update_no_notifications_label_visibility)
-        self._cleanup_orphan_cached_images()
-        self.schedule_midnight_update()
-
-    def _save_persistent_history(self):
-        try:
-            with open(PERSISTENT_HISTORY_FILE, "w") as f:
-                json.dump(self.persistent_notifications, f)
-        except Exception as e:
-            logger.error(f"Error saving persistent history: {e}")
-
-    def delete_historical_notification(self, note_id, container):
-        if hasattr(container, "notification_box"):
-            notif_box = container.notification_box
-            notif_box.destroy(from_history_delete=True)
-
-        target_note_id_str = str(note_id)
-
-        new_persistent_notifications = []
-        removed_from_list = False
-        for note_in_list in self.persistent_notifications:
-            current_note_id_str = str(note_in_list.get("id"))
-            if current_note_id_str == target_note_id_str:
-                removed_from_list = True
-
-                continue
-            new_persistent_notifications.append(note_in_list)
-
-        if removed_from_list:
-            self.persistent_notifications = new_persistent_notifications
-            logger.info(
-                f"Notification with ID {target_note_id_str} was marked for removal from persistent_notifications list."
-            )
-        else:
-            logger.warning(
-                f"Notification with ID {target_note_id_str} was NOT found in persistent_notifications list. The list remains unchanged."
-            )
-
-        self._save_persistent_history()
-        container.destroy()
-        self.containers = [c for c in self.containers if c != container]
-        self.rebuild_with_separators()
-
-    def _add_historical_notification(self, note):
-        hist_notif = HistoricalNotification(
-            id=note.get("id"),
-            app_icon=note.get("app_icon"),
-            summary=note.get("summary"),
-            body=note.get("body"),
-            app_name=note.get("app_name"),
-            timestamp=note.get("timestamp"),
-            cached_image_path=note.get("cached_image_path"),
-        )
-
-        hist_box = NotificationBox(hist_notif, timeout_ms=0)
-        hist_box.uuid = hist_notif.id
-        hist_box.cached_image_path = hist_notif.cached_image_path
-        hist_box.set_is_history(True)
-        for child in hist_box.get_children():
-            if child.get_name() == "notification-action-buttons":
-                hist_box.remove(child)
-        container = Box(
-            name="notification-container",
-            orientation="v",
-            h_align="fill",
-            h_expand=True,
-        )
-        container.notification_box = hist_box
-        try:
-            arrival = datetime.fromisoformat(hist_notif.timestamp)
-        except Exception:
-            arrival = datetime.now()
-        container.arrival_time = arrival
+        self.store.clear()
 
-        def compute_time_label(arrival_time):
-            return arrival_time.strftime("%H:%M")
-
-        self.hist_time_label = Label(
-            name="notification-timestamp",
-            markup=compute_time_label(container.arrival_time),
-            h_align="start",
-            ellipsization="end",
-        )
-        self.hist_notif_image_box = Box(
-            name="notification-image",
-            orientation="v",
-            children=[
-                CustomImage(pixbuf=load_scaled_pixbuf(hist_box, 48, 48)),
-                Box(v_expand=True),
-            ],
-        )
-        self.hist_notif_summary_label = Label(
-            name="notification-summary",
-            markup=hist_notif.summary,
-            h_align="start",
-            ellipsization="end",
-        )
-
-        self.hist_notif_app_name_label = Label(
-            name="notification-app-name",
-            markup=f"{hist_notif.app_name}",
-            h_align="start",
-            ellipsization="end",
-        )
-
-        self.hist_notif_body_label = (
-            Label(
-                name="notification-body",
-                markup=hist_notif.body,
-                h_align="start",
-                ellipsization="end",
-                line_wrap="word-char",
-            )
-            if hist_notif.body
-            else Box()
-        )
-        self.hist_notif_body_label.set_single_line_mode(
-            True
-        ) if hist_notif.body else None
-
-        self.hist_notif_summary_box = Box(
-            name="notification-summary-box",
-            orientation="h",
-            children=[
-                self.hist_notif_summary_label,
-                Box(
-                    name="notif-sep",
-                    h_expand=False,
-                    v_expand=False,
-                    h_align="center",
-                    v_align="center",
-                ),
-                self.hist_notif_app_name_label,
-                Box(
-                    name="notif-sep",
-                    h_expand=False,
-                    v_expand=False,
-                    h_align="center",
-                    v_align="center",
-                ),
-                self.hist_time_label,
-            ],
-        )
-        self.hist_notif_text_box = Box(
-            name="notification-text",
-            orientation="v",
-            v_align="center",
-            h_expand=True,
-            children=[
-                self.hist_notif_summary_box,
-                self.hist_notif_body_label,
-            ],
-        )
-        self.hist_notif_close_button = Button(
-            name="notif-close-button",
-            child=Label(name="notif-close-label", markup=icons.cancel),
-            on_clicked=lambda *_: self.delete_historical_notification(
-                hist_notif.id, container
-            ),
-        )
-        self.hist_notif_close_button_box = Box(
-            orientation="v",
-            children=[
-                self.hist_notif_close_button,
-                Box(v_expand=True),
-            ],
-        )
-        content_box = Box(
-            name="notification-box-hist",
-            spacing=8,
-            children=[
-                self.hist_notif_image_box,
-                self.hist_notif_text_box,
-                self.hist_notif_close_button_box,
-            ],
-        )
-        container.add(content_box)
-        self.containers.insert(0, container)
-        self.rebuild_with_separators()
-        self.update_no_notifications_label_visibility()
-
-    def add_notification(self, notification_box):
-        app_name = notification_box.notification.app_name
+    def archive(self, notification, count=1, cached_image_path=None, record_id=None):
+        """Record a notification in the history; False if its app is ignored."""
+        app_name = notification.app_name
         if app_name in get_history_ignored_apps():
             logger.info(
                 f"Ignoring notification from {app_name} as it is in the ignored list."
             )
-            notification_box.destroy(from_history_delete=True)
-            return
+            return False
 
         if app_name in get_limited_apps_history():
             self.clear_history_for_app(app_name)
 
-        if len(self.containers) >= 50:
-            oldest_container = self.containers.pop()
-            if (
-                hasattr(oldest_container, "notification_box")
-                and hasattr(oldest_container.notification_box, "cached_image_path")
-                and oldest_container.notification_box.cached_image_path
-                and os.path.exists(oldest_container.notification_box.cached_image_path)
-            ):
-                try:
-                    os.remove(oldest_container.notification_box.cached_image_path)
-                    logger.info(
-                        f"Deleted cached image of oldest notification due to history limit: {oldest_container.notification_box.cached_image_path}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Error deleting cached image of oldest notification: {e}"
-                    )
-            oldest_container.destroy()
-
-        def on_container_destroy(container):
-            if (
-                hasattr(container, "_timestamp_timer_id")
-                and container._timestamp_timer_id
-            ):
-                GLib.source_remove(container._timestamp_timer_id)
-            if hasattr(container, "notification_box"):
-                notif_box = container.notification_box
-            container.destroy()
-            self.containers.remove(container)
-            self.rebuild_with_separators()
-            self.update_no_notifications_label_visibility()
-
-        container = Box(
-            name="notification-container",
-            orientation="v",
-            h_align="fill",
-            h_expand=True,
-        )
-        container.arrival_time = datetime.now()
-
-        def compute_time_label(arrival_time):
-            return arrival_time.strftime("%H:%M")
+        images = NotificationImageCache.get_initial()
+        held_image_path = None
+        if cached_image_path is None and notification.image_pixbuf:
+            held_image_path = cached_image_path = images.store(notification.image_pixbuf)
+        self.store.add(
+            {
+                "id": record_id or str(uuid.uuid4()),
+                "app_icon": notification.app_icon,
+                "summary": notification.summary,
+                "body": notification.body,
+                "app_name": app_name,
+                "timestamp": datetime.now().isoformat(),
+                "cached_image_path": cached_image_path,
+                "count": count,
+                "urgency": int(getattr(notification, "urgency", 1)),
+            }
+        )
+        images.release(held_image_path)
+        return True
 
-        self.current_time_label = Label(
-            name="notification-timestamp",
-            markup=compute_time_label(container.arrival_time),
-        )
-        self.current_notif_image_box = Box(
-            name="notification-image",
-            orientation="v",
-            children=[
-                CustomImage(pixbuf=load_scaled_pixbuf(notification_box, 48, 48)),
-                Box(v_expand=True, v_align="fill"),
-            ],
-        )
-        self.current_notif_summary_label = Label(
-            name="notification-summary",
-            markup=notification_box.notification.summary,
-            h_align="start",
-            ellipsization="end",
-        )
-        self.current_notif_app_name_label = Label(
-            name="notification-app-name",
-            markup=f"{notification_box.notification.app_name}",
-            h_align="start",
-            ellipsization="end",
-        )
-        self.current_notif_body_label = (
-            Label(
-                name="notification-body",
-                markup=notification_box.notification.body,
-                h_align="start",
-                ellipsization="end",
-                line_wrap="word-char",
-            )
-            if notification_box.notification.body
-            else Box()
-        )
-        self.current_notif_body_label.set_single_line_mode(
-            True
-        ) if notification_box.notification.body else None
-        self.current_notif_summary_box = Box(
-            name="notification-summary-box",
-            orientation="h",
-            children=[
-                self.current_notif_summary_label,
-                Box(
-                    name="notif-sep",
-                    h_expand=False,
-                    v_expand=False,
-                    h_align="center",
-                    v_align="center",
-                ),
-                self.current_notif_app_name_label,
-                Box(
-                    name="notif-sep",
-                    h_expand=False,
-                    v_expand=False,
-                    h_align="center",
-                    v_align="center",
-                ),
-                self.current_time_label,
-            ],
-        )
-        self.current_notif_text_box = Box(
-            name="notification-text",
-            orientation="v",
-            v_align="center",
-            h_expand=True,
-            children=[
-                self.current_notif_summary_box,
-                self.current_notif_body_label,
-            ],
-        )
-        self.current_notif_close_button = Button(
-            name="notif-close-button",
-            child=Label(name="notif-close-label", markup=icons.cancel),
-            on_clicked=lambda *_: on_container_destroy(container),
-        )
-        self.current_notif_close_button_box = Box(
-            orientation="v",
-            children=[
-                self.current_notif_close_button,
-                Box(v_expand=True),
-            ],
-        )
-        content_box = Box(
-            name="notification-content",
-            spacing=8,
-            children=[
-                self.current_notif_image_box,
-                self.current_notif_text_box,
-                self.current_notif_close_button_box,
-            ],
-        )
-        container.notification_box = notification_box
-        hist_box = Box(
-            name="notification-box-hist",
-            orientation="v",
-            h_align="fill",
-            h_expand=True,
-        )
-        hist_box.add(content_box)
-        content_box.get_children()[2].get_children()[0].connect(
-            "clicked", lambda *_: on_container_destroy(container)
-        )
-        container.add(hist_box)
-        self.containers.insert(0, container)
-        self.rebuild_with_separators()
-        self._append_persistent_notification(notification_box, container.arrival_time)
-        self.update_no_notifications_label_visibility()
-
-    def _append_persistent_notification(self, notification_box, arrival_time):
-        note = {
-            "id": notification_box.uuid,
-            "app_icon": notification_box.notification.app_icon,
-            "summary": notification_box.notification.summary,
-            "body": notification_box.notification.body,
-            "app_name": notification_box.notification.app_name,
-            "timestamp": arrival_time.isoformat(),
-            "cached_image_path": notification_box.cached_image_path,
-        }
-        self.persistent_notifications.insert(0, note)
-        self.persistent_notifications = self.persistent_notifications[:50]
-        self._save_persistent_history()
-
-    def _cleanup_orphan_cached_images(self):
-        logger.debug("Starting orphan cached image cleanup.")
-        if not os.path.exists(PERSISTENT_DIR):
-            logger.debug("Cache directory does not exist, skipping cleanup.")
-            return
-
-        cached_files = [
-            f
-            for f in os.listdir(PERSISTENT_DIR)
-            if f.startswith("notification_") and f.endswith(".png")
-        ]
-        if not cached_files:
-            logger.debug("No cached image files found, skipping cleanup.")
+    def add_notification(self, notification_box):
+        if not self.archive(
+            notification_box.notification,
+            notification_box.count,
+            notification_box.cached_image_path,
+            notification_box.uuid,
+        ):
+            notification_box.destroy(from_history_delete=True)
             return
-
-        history_uuids = {
-            note.get("id") for note in self.persistent_notifications if note.get("id")
-        }
-        deleted_count = 0
-        for cached_file in cached_files:
-            try:
-                uuid_from_filename = cached_file[len("notification_") : -len(".png")]
-                if uuid_from_filename not in history_uuids:
-                    cache_file_path = os.path.join(PERSISTENT_DIR, cached_file)
-                    os.remove(cache_file_path)
-                    logger.info(f"Deleted orphan cached image: {cache_file_path}")
-                    deleted_count += 1
-                else:
-                    logger.debug(
-                        f"Cached image {cached_file} found in history, keeping it."
-                    )
-            except Exception as e:
-                logger.error(
-                    f"Error processing cached file {cached_file} during cleanup: {e}"
-                )
-
-        if deleted_count > 0:
-            logger.info(
-                f"Orphan cached image cleanup finished. Deleted {deleted_count} images."
-            )
-        else:
-            logger.info("Orphan cached image cleanup finished. No orphan images found.")
+        # History rows are drawn from the record; the popup's box (the record
+        # holds its own reference on the image) goes once its caller has let go of it.
+        notification_box.set_is_history(True)
+        notification_box.stop_timeout()
+        GLib.idle_add(notification_box.destroy)
 
     def update_no_notifications_label_visibility(self):
-        has_notifications = bool(self.containers)
+        has_notifications = bool(self.store.records if self.query is None else self.results)
         self.no_notifications_box.set_visible(not has_notifications)
         self.notifications_list.set_visible(has_notifications)
 
     def clear_history_for_app(self, app_name):
         """Clears all notifications in history for a specific app."""
-        containers_to_remove = []
-        persistent_notes_to_remove_ids = set()
-        for container in list(self.containers):
-            if (
-                hasattr(container, "notification_box")
-                and container.notification_box.notification.app_name == app_name
-            ):
-                containers_to_remove.append(container)
-                persistent_notes_to_remove_ids.add(container.notification_box.uuid)
-
-        for container in containers_to_remove:
-            if (
-                hasattr(container, "notification_box")
-                and hasattr(container.notification_box, "cached_image_path")
-                and container.notification_box.cached_image_path
-                and os.path.exists(container.notification_box.cached_image_path)
-            ):
-                try:
-                    os.remove(container.notification_box.cached_image_path)
-                    logger.info(
-                        f"Deleted cached image of replaced history notification: {container.notification_box.cached_image_path}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Error deleting cached image of replaced history notification: {e}"
-                    )
-            self.containers.remove(container)
-            self.notifications_list.remove(container)
-            container.notification_box.destroy(from_history_delete=True)
-            container.destroy()
-
-        self.persistent_notifications = [
-            note
-            for note in self.persistent_notifications
-            if note.get("id") not in persistent_notes_to_remove_ids
-        ]
-        self._save_persistent_history()
-        self.rebuild_with_separators()
-        self.update_no_notifications_label_visibility()
+        self.store.clear_app(app_name)
 
 
 class NotificationContainer(Box):
@@ -1121,6 +920,13 @@ class NotificationContainer(Box):
 
         self._server = Notifications()
         self._server.connect("notification-added", self.on_new_notification)
+        self.gate = NotificationFloodGate(
+            self._on_overflow,
+            app_rate=data.NOTIFICATION_APP_RATE,
+            app_burst=data.NOTIFICATION_APP_BURST,
+            queue_limit=data.NOTIFICATION_QUEUE_LIMIT,
+        )
+        self._drain_id = None
         self._pending_removal = False
         self._is_destroying = False
 
@@ -1195,19 +1001,79 @@ class NotificationContainer(Box):
 
     def on_new_notification(self, fabric_notif, id):
         notification_history_instance = self.notification_history
+        notification = fabric_notif.get_notification_from_id(id)
         if notification_history_instance.do_not_disturb_enabled:
             logger.info(
                 "Do Not Disturb mode enabled: adding notification directly to history."
             )
-            notification = fabric_notif.get_notification_from_id(id)
-            new_box = NotificationBox(notification)
-            if notification.image_pixbuf:
-                cache_notification_pixbuf(new_box)
-            notification_history_instance.add_notification(new_box)
+            notification_history_instance.archive(notification)
             return
 
-        notification = fabric_notif.get_notification_from_id(id)
-        new_box = NotificationBox(notification)
+        # Replacements and repeats of a popup on screen update it in place;
+        # anything else goes through the flood gate.
+        if self._fold_into_shown(Arrival(notification)):
+            return
+        arrival = self.gate.offer(notification)
+        if arrival is not None:
+            self.show_arrival(arrival)
+        self._schedule_drain()
+
+    def _fold_into_shown(self, arrival):
+        notification = arrival.notification
+        key = coalesce_key(notification)
+        for box in self.notifications:
+            if box.notification.id == notification.id:
+                count = box.count + arrival.count - 1
+            elif coalesce_key(box.notification) == key:
+                count = box.count + arrival.count
+            else:
+                continue
+            previous = box.notification
+            box.update(notification, count)
+            notification.connect("closed", self.on_notification_closed)
+            if previous.id != notification.id:
+                arrival.superseded.append(previous)
+            self._close_superseded(arrival)
+            return True
+        return False
+
+    @staticmethod
+    def _close_superseded(arrival):
+        for notification in arrival.superseded:
+            if notification.id != arrival.notification.id:
+                notification.close("expired")
+        arrival.superseded.clear()
+
+    def _on_overflow(self, arrival):
+        """The gate's queue is full: its oldest entry skips the popup."""
+        logger.info(
+            f"Notification flood: sending {arrival.count} from {arrival.notification.app_name} to history"
+        )
+        self.notification_history.archive(arrival.notification, arrival.count)
+        for notification in [*arrival.superseded, arrival.notification]:
+            notification.close("expired")
+
+    def _schedule_drain(self):
+        wait = self.gate.next_drain()
+        if wait is None or self._drain_id is not None:
+            return
+        self._drain_id = GLib.timeout_add(max(MIN_DRAIN_INTERVAL_MS, int(wait * 1000)), self._drain)
+
+    def _drain(self):
+        self._drain_id = None
+        for arrival in self.gate.drain():
+            self.show_arrival(arrival)
+        self._schedule_drain()
+        return False
+
+    def show_arrival(self, arrival):
+        if self._fold_into_shown(arrival):
+            return
+        self._close_superseded(arrival)
+        notification = arrival.notification
+        id = notification.id
+        notification_history_instance = self.notification_history
+        new_box = NotificationBox(notification, count=arrival.count)
         new_box.set_container(self)
         notification.connect("closed", self.on_notification_closed)
 
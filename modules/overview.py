@@ -1,5 +1,6 @@
 # Thanks to https://github.com/muhchaudhary for the original code. You are a legend.
 import json
+import time
 
 import cairo
 import gi
@@ -17,9 +18,10 @@ import config.data as data
 import modules.icons as icons
 # WIP icon resolver (app_id to guessing the icon name)
 from utils.icon_resolver import IconResolver
+from utils.window_thumbnails import GrimFrameSource, WindowThumbnailer
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gdk, Gtk
+from gi.repository import Gdk, GLib, Gtk
 
 screen = Gdk.Screen.get_default()
 CURRENT_WIDTH = screen.get_width()
@@ -28,6 +30,8 @@ CURRENT_HEIGHT = screen.get_height()
 icon_resolver = IconResolver()
 connection = Hyprland()
 BASE_SCALE = 0.1  # Base scale factor for overview
+UPDATE_DELAY_MS = 30  # window events arriving together are applied in one pass
+APP_MAP_TTL = 60  # seconds before the desktop entries are rescanned on opening
 
 # Credit to Aylur for the drag and drop code
 TARGET = [Gtk.TargetEntry.new("text/plain", Gtk.TargetFlags.SAME_APP, 0)]
@@ -64,40 +68,18 @@ class HyprlandWindowButton(Button):
         self.app_id = app_id
         self.title = title
         self.window: Box = window
-
-        # Compute dynamic icon sizes based on the button size.
-        # Using the minimum dimension of the button for scaling.
-        icon_size_main = int(min(self.size) * 0.5)  # adjust factor as needed
+        self.workspace_id = None  # where the overview placed it, and at which position
+        self.position = None
+        self.preview: Image | None = None
+        self.preview_icon: Image | None = None
 
         # Enhanced icon resolution using desktop apps
-        desktop_app = window.find_app(app_id)
-        
-        # Get icon using improved method with fallbacks
-        icon_pixbuf = None
-        if desktop_app:
-            icon_pixbuf = desktop_app.get_icon_pixbuf(size=icon_size_main)
-        
-        if not icon_pixbuf:
-            # Fallback to IconResolver
-            icon_pixbuf = icon_resolver.get_icon_pixbuf(app_id, icon_size_main)
-        
-        if not icon_pixbuf:
-            # Additional fallbacks for common apps
-            icon_pixbuf = icon_resolver.get_icon_pixbuf("application-x-executable-symbolic", icon_size_main)
-            if not icon_pixbuf:
-                icon_pixbuf = icon_resolver.get_icon_pixbuf("image-missing", icon_size_main)
-                
-        # Ensure icon is scaled to the correct size
-        if icon_pixbuf and (icon_pixbuf.get_width() != icon_size_main or icon_pixbuf.get_height() != icon_size_main):
-            icon_pixbuf = icon_pixbuf.scale_simple(
-                icon_size_main, 
-                icon_size_main, 
-                gi.repository.GdkPixbuf.InterpType.BILINEAR
-            )
+        self.desktop_app = window.find_app(app_id)
 
         super().__init__(
             name="overview-client-box",
-            image=Image(pixbuf=icon_pixbuf),
+            # Icon sized from the minimum dimension of the button
+            image=Image(pixbuf=self._icon_pixbuf(int(min(self.size) * 0.5))),
             tooltip_text=title,
             size=size,
             on_clicked=self.on_button_click,
@@ -114,9 +96,6 @@ class HyprlandWindowButton(Button):
             ),
         )
 
-        # Store the desktop_app for later use
-        self.desktop_app = desktop_app
-
         self.drag_source_set(
             start_button_mask=Gdk.ModifierType.BUTTON1_MASK,
             targets=TARGET,
@@ -132,43 +111,73 @@ class HyprlandWindowButton(Button):
                 return True
         return False
 
-    def update_image(self, image):
-        # Compute overlay icon size dynamically.
-        icon_size_overlay = int(min(self.size) * 0.5)  # adjust factor as needed
-        
-        # Enhanced icon resolution for overlay
+    def _icon_pixbuf(self, icon_size: int):
+        # Get icon using improved method with fallbacks
         icon_pixbuf = None
-        if hasattr(self, 'desktop_app') and self.desktop_app:
-            icon_pixbuf = self.desktop_app.get_icon_pixbuf(size=icon_size_overlay)
-            
+        if self.desktop_app:
+            icon_pixbuf = self.desktop_app.get_icon_pixbuf(size=icon_size)
+
         if not icon_pixbuf:
-            icon_pixbuf = icon_resolver.get_icon_pixbuf(self.app_id, icon_size_overlay)
-            
+            # Fallback to IconResolver
+            icon_pixbuf = icon_resolver.get_icon_pixbuf(self.app_id, icon_size)
+
         if not icon_pixbuf:
-            icon_pixbuf = icon_resolver.get_icon_pixbuf("application-x-executable-symbolic", icon_size_overlay)
+            # Additional fallbacks for common apps
+            icon_pixbuf = icon_resolver.get_icon_pixbuf("application-x-executable-symbolic", icon_size)
             if not icon_pixbuf:
-                icon_pixbuf = icon_resolver.get_icon_pixbuf("image-missing", icon_size_overlay)
-        
+                icon_pixbuf = icon_resolver.get_icon_pixbuf("image-missing", icon_size)
+
         # Ensure icon is scaled to the correct size
-        if icon_pixbuf and (icon_pixbuf.get_width() != icon_size_overlay or icon_pixbuf.get_height() != icon_size_overlay):
+        if icon_pixbuf and (icon_pixbuf.get_width() != icon_size or icon_pixbuf.get_height() != icon_size):
             icon_pixbuf = icon_pixbuf.scale_simple(
-                icon_size_overlay, 
-                icon_size_overlay, 
+                icon_size,
+                icon_size,
                 gi.repository.GdkPixbuf.InterpType.BILINEAR
             )
-                
-        self.set_image(
-            Overlay(
-                child=image,
-                overlays=Image(
-                    name="overview-icon",
-                    pixbuf=icon_pixbuf,
-                    h_align="center",
-                    v_align="end",
-                    tooltip_text=self.title,
-                ),
-            )
+        return icon_pixbuf
+
+    def set_title(self, title: str):
+        if title != self.title:
+            self.title = title
+            self.set_tooltip_text(title)
+            if self.preview_icon is not None:
+                self.preview_icon.set_tooltip_text(title)
+
+    def resize(self, size):
+        """Follow a resized window; the icon is only reloaded when its size changes."""
+        new_size = size if self.transform in [0, 2] else (size[1], size[0])
+        if new_size == self.size:
+            return
+        old_icon_size = int(min(self.size) * 0.5)
+        self.size = new_size
+        self.set_size_request(int(size[0]), int(size[1]))
+        icon_size = int(min(self.size) * 0.5)
+        if icon_size == old_icon_size:
+            return
+        if self.preview is not None:
+            # The preview stays in its overlay; only the icon over it changes size
+            self.preview_icon.set_from_pixbuf(self._icon_pixbuf(icon_size))
+        else:
+            self.set_image(Image(pixbuf=self._icon_pixbuf(icon_size)))
+
+    def show_preview(self, pixbuf):
+        """Show a captured frame of the window, with the app icon over it."""
+        if self.preview is None:
+            self.preview = Image(name="overview-preview", pixbuf=pixbuf)
+            self.update_image(self.preview)
+        else:
+            self.preview.set_from_pixbuf(pixbuf)
+
+    def update_image(self, image):
+        self.preview_icon = Image(
+            name="overview-icon",
+            # Compute overlay icon size dynamically.
+            pixbuf=self._icon_pixbuf(int(min(self.size) * 0.5)),
+            h_align="center",
+            v_align="end",
+            tooltip_text=self.title,
         )
+        self.set_image(Overlay(child=image, overlays=self.preview_icon))
 
     def on_button_click(self, *_):
         connection.send_command(f"/dispatch focuswindow address:{self.address}")
@@ -177,6 +186,12 @@ class HyprlandWindowButton(Button):
 class WorkspaceEventBox(EventBox):
     def __init__(self, workspace_id: int, fixed: Gtk.Fixed | None = None, monitor_width: int = None, monitor_height: int = None, monitor_scale: float = 1.0):
         self.fixed = fixed
+        self.placeholder = Label(
+            name="overview-add-label",
+            h_expand=True,
+            v_expand=True,
+            markup=icons.circle_plus,
+        )
         
         # Use provided monitor dimensions or fallback to current screen
         width = monitor_width or CURRENT_WIDTH
@@ -191,14 +206,7 @@ class WorkspaceEventBox(EventBox):
             h_expand=True,
             v_expand=True,
             size=(int(width * container_scale), int(height * container_scale)),
-            child=fixed
-            if fixed
-            else Label(
-                name="overview-add-label",
-                h_expand=True,
-                v_expand=True,
-                markup=icons.circle_plus,
-            ),
+            child=fixed if fixed and fixed.get_children() else self.placeholder,
             on_drag_data_received=lambda _w, _c, _x, _y, data, *_: connection.send_command(
                 f"/dispatch movetoworkspacesilent {workspace_id},address:{data.get_data().decode()}"
             ),
@@ -211,6 +219,16 @@ class WorkspaceEventBox(EventBox):
         if fixed:
             fixed.show_all()
 
+    def set_empty(self, empty: bool):
+        """Show the add placeholder instead of the windows, or the other way round."""
+        child = self.placeholder if empty or not self.fixed else self.fixed
+        current = self.get_child()
+        if current is child:
+            return
+        if current is not None:
+            self.remove(current)
+        self.add(child)
+        child.show_all()
 
 
 class Overview(Box):
@@ -238,21 +256,38 @@ class Overview(Box):
             if monitor_info:
                 monitor_width = monitor_info['width']
                 monitor_height = monitor_info['height']
+        self.monitor_width = monitor_width
+        self.monitor_height = monitor_height
         # Initialize as a Box instead of a PopupWindow.
         super().__init__(name="overview", orientation="v", spacing=8, **kwargs)
-        self.workspace_boxes: dict[int, Box] = {}
+        self.workspace_boxes: dict[int, Gtk.Fixed] = {}
+        self.workspace_areas: dict[int, WorkspaceEventBox] = {}
         self.clients: dict[str, HyprlandWindowButton] = {}
+        self.monitors: dict[int, tuple] = {}
         
         # Initialize app registry for better icon resolution
         self._all_apps = get_desktop_applications()
         self.app_identifiers = self._build_app_identifiers_map()
+        self._apps_loaded_at = time.monotonic()
         
         # Remove the window_class_aliases dictionary completely
 
+        # Nothing is fetched while the overview is hidden; opening it catches up
+        self._dirty = True
+        self._update_handler = 0
+        self.build_grid()
+        self.connect("map", self.on_map)
+
+        # Live previews instead of bare icons, captured only while the overview is open
+        self.thumbnailer = None
+        if data.OVERVIEW_WINDOW_PREVIEWS and GrimFrameSource.available():
+            self.thumbnailer = WindowThumbnailer(GrimFrameSource(), self.on_thumbnail, fps=data.OVERVIEW_PREVIEW_FPS)
+            self.connect("unmap", lambda *_: self.thumbnailer.stop())
+
         connection.connect("event::openwindow", self.do_update)
         connection.connect("event::closewindow", self.do_update)
         connection.connect("event::movewindow", self.do_update)
-        self.update()
+        connection.connect("event::changefloatingmode", self.do_update)
         
     def _normalize_window_class(self, class_name):
         """Normalize window class by removing common suffixes and lowercase."""
@@ -350,16 +385,8 @@ class Overview(Box):
                 
         return None
 
-    def update(self, signal_update=False):
-        self._all_apps = get_desktop_applications()
-        self.app_identifiers = self._build_app_identifiers_map()
-        for client in self.clients.values():
-            client.destroy()
-        self.clients.clear()
-        for workspace in self.workspace_boxes.values():
-            workspace.destroy()
-        self.workspace_boxes.clear()
-
+    def build_grid(self):
+        """The workspace boxes, built once; windows come and go inside them."""
         if data.PANEL_THEME == "Panel" and data.BAR_POSITION in ["Left", "Right"]:
             rows = 5
             cols = 2
@@ -369,49 +396,6 @@ class Overview(Box):
 
         self.children = [Box(spacing=8) for _ in range(rows)]
 
-        # Get monitor dimensions and scale for scaling
-        monitor_width = CURRENT_WIDTH
-        monitor_height = CURRENT_HEIGHT
-        monitor_scale = 1.0
-        
-        if self.monitor_manager:
-            monitor_info = self.monitor_manager.get_monitor_by_id(self.monitor_id)
-            if monitor_info:
-                monitor_width = monitor_info['width']
-                monitor_height = monitor_info['height']
-                monitor_scale = monitor_info.get('scale', 1.0)
-        
-        # Calculate effective scale for this monitor
-        # Higher scale monitors need larger overview elements to appear the same physical size
-        effective_scale = BASE_SCALE * monitor_scale
-
-        monitors = {
-            monitor["id"]: (monitor["x"], monitor["y"], monitor["transform"])
-            for monitor in json.loads(connection.send_command("j/monitors").reply.decode())
-        }
-        
-        # Filter clients to only show those in this monitor's workspace range
-        for client in json.loads(connection.send_command("j/clients").reply.decode()):
-            workspace_id = client["workspace"]["id"]
-            if workspace_id > 0 and self.workspace_start <= workspace_id <= self.workspace_end:
-                btn = HyprlandWindowButton(
-                    window=self,
-                    title=client["title"],
-                    address=client["address"],
-                    app_id=client["initialClass"],
-                    size=(client["size"][0] * effective_scale, client["size"][1] * effective_scale),
-                    transform=monitors[client["monitor"]][2],
-                )
-                self.clients[client["address"]] = btn
-                w_id = workspace_id
-                if w_id not in self.workspace_boxes:
-                    self.workspace_boxes[w_id] = Gtk.Fixed.new()
-                self.workspace_boxes[w_id].put(
-                    btn,
-                    abs(client["at"][0] - monitors[client["monitor"]][0]) * effective_scale,
-                    abs(client["at"][1] - monitors[client["monitor"]][1]) * effective_scale,
-                )
-
         # Generate workspaces only for this monitor's range
         for w_id in range(self.workspace_start, self.workspace_end + 1):
             idx = w_id - self.workspace_start
@@ -419,6 +403,14 @@ class Overview(Box):
                 row = 0 if idx < cols else 1
             else:
                 row = idx // cols
+            self.workspace_boxes[w_id] = Gtk.Fixed.new()
+            self.workspace_areas[w_id] = WorkspaceEventBox(
+                w_id,
+                self.workspace_boxes[w_id],
+                monitor_width=self.monitor_width,
+                monitor_height=self.monitor_height,
+                monitor_scale=self.monitor_scale,
+            )
             overview_row = self.children[row]
             overview_row.add(
                 Box(
@@ -426,17 +418,131 @@ class Overview(Box):
                     orientation="vertical",
                     children=[
                         Label(name="overview-workspace-label", label=f"Workspace {w_id}"),
-                        WorkspaceEventBox(
-                            w_id,
-                            self.workspace_boxes.get(w_id),
-                            monitor_width=monitor_width,
-                            monitor_height=monitor_height,
-                            monitor_scale=monitor_scale
-                        ),
+                        self.workspace_areas[w_id],
                     ],
                 )
             )
 
+    @property
+    def monitor_scale(self) -> float:
+        if self.monitor_manager:
+            monitor_info = self.monitor_manager.get_monitor_by_id(self.monitor_id)
+            if monitor_info:
+                return monitor_info.get('scale', 1.0)
+        return 1.0
+
+    def fetch_monitors(self):
+        self.monitors = {
+            monitor["id"]: (monitor["x"], monitor["y"], monitor["transform"])
+            for monitor in json.loads(connection.send_command("j/monitors").reply.decode())
+        }
+
+    def update(self, signal_update=False):
+        """
+        Bring the windows up to date with Hyprland. Buttons are kept by address:
+        moved and resized windows are repositioned in place, only new windows
+        get a button built and only closed ones are destroyed.
+        """
+        self._dirty = False
+        if not signal_update:
+            # Opening: a new app may have been installed, and monitors rearranged
+            if time.monotonic() - self._apps_loaded_at > APP_MAP_TTL:
+                self._all_apps = get_desktop_applications()
+                self.app_identifiers = self._build_app_identifiers_map()
+                self._apps_loaded_at = time.monotonic()
+            self.fetch_monitors()
+
+        # Calculate effective scale for this monitor
+        # Higher scale monitors need larger overview elements to appear the same physical size
+        effective_scale = BASE_SCALE * self.monitor_scale
+
+        seen = set()
+        # Filter clients to only show those in this monitor's workspace range
+        for client in json.loads(connection.send_command("j/clients").reply.decode()):
+            workspace_id = client["workspace"]["id"]
+            if not (workspace_id > 0 and self.workspace_start <= workspace_id <= self.workspace_end):
+                continue
+            if client["monitor"] not in self.monitors:
+                self.fetch_monitors()
+                if client["monitor"] not in self.monitors:
+                    continue
+            monitor_x, monitor_y, transform = self.monitors[client["monitor"]]
+            address = client["address"]
+            seen.add(address)
+            size = (client["size"][0] * effective_scale, client["size"][1] * effective_scale)
+            position = (
+                abs(client["at"][0] - monitor_x) * effective_scale,
+                abs(client["at"][1] - monitor_y) * effective_scale,
+            )
+
+            btn = self.clients.get(address)
+            if btn is not None and (btn.app_id != client["initialClass"] or btn.transform != transform % 4):
+                self._remove_client(address)
+                btn = None
+            if btn is None:
+                btn = HyprlandWindowButton(
+                    window=self,
+                    title=client["title"],
+                    address=address,
+                    app_id=client["initialClass"],
+                    size=size,
+                    transform=transform,
+                )
+                self.clients[address] = btn
+                if self.thumbnailer and (frame := self.thumbnailer.get(address)) is not None:
+                    btn.show_preview(frame)
+            else:
+                btn.set_title(client["title"])
+                btn.resize(size)
+
+            if btn.workspace_id != workspace_id:
+                if btn.workspace_id is not None:
+                    self.workspace_boxes[btn.workspace_id].remove(btn)
+                self.workspace_boxes[workspace_id].put(btn, *position)
+                btn.show_all()
+            elif btn.position != position:
+                self.workspace_boxes[workspace_id].move(btn, *position)
+            btn.workspace_id = workspace_id
+            btn.position = position
+            if self.thumbnailer:
+                self.thumbnailer.track(address, client, size)
+
+        for address in [a for a in self.clients if a not in seen]:
+            self._remove_client(address)
+        for w_id, area in self.workspace_areas.items():
+            area.set_empty(not self.workspace_boxes[w_id].get_children())
+
+    def _remove_client(self, address):
+        btn = self.clients.pop(address)
+        if self.thumbnailer:
+            self.thumbnailer.forget(address)
+        if btn.workspace_id is not None:
+            self.workspace_boxes[btn.workspace_id].remove(btn)
+        btn.destroy()
+
+    def on_map(self, *_):
+        if self._dirty:
+            self.update()
+        if self.thumbnailer:
+            self.thumbnailer.start()
+
+    def on_thumbnail(self, address, pixbuf):
+        btn = self.clients.get(address)
+        if btn is not None:
+            btn.show_preview(pixbuf)
+
     def do_update(self, *_):
+        if not self.get_mapped():
+            self._dirty = True
+            return
         logger.info(f"[Overview] Updating for :{_[1].name}")
-        self.update(signal_update=True)
+        if not self._update_handler:
+            self._update_handler = GLib.timeout_add(UPDATE_DELAY_MS, self._run_queued_update)
+
+    def _run_queued_update(self):
+        self._update_handler = 0
+        if self.get_mapped():
+            self.update(signal_update=True)
+        else:
+            self._dirty = True
+        return False
@@ -1,10 +1,9 @@
 import colorsys
-import concurrent.futures
-import hashlib
+import heapq
 import os
 import random  # <--- AÑADIDO
+import shlex
 import shutil
-from concurrent.futures import ThreadPoolExecutor
 
 from fabric.utils.helpers import exec_shell_command_async
 from fabric.widgets.box import Box
@@ -13,21 +12,31 @@ from fabric.widgets.entry import Entry
 from fabric.widgets.label import Label
 from fabric.widgets.scrolledwindow import ScrolledWindow
 from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Gtk, Pango
-from PIL import Image
 
 import config.config
 import config.data as data
 import modules.icons as icons
+from utils.fuzzy import fuzzy_score
+from utils.matugen_cache import MatugenCache
+from utils.thumbnails import ThumbnailCache
+from utils.wallpaper_index import WallpaperIndex, WallpaperQuery
 
 
 class WallpaperSelector(Box):
-    CACHE_DIR = f"{data.CACHE_DIR}/thumbs"  # Changed from wallpapers to thumbs
+    CACHE_DIR = f"{data.CACHE_DIR}/wallpaper-thumbs"  # Content-addressed, see utils.thumbnails
+    THUMBNAIL_SIZE = 96
+    MAX_IN_FLIGHT = 6  # decode jobs handed to the process pool at once
+    LOADS_PER_IDLE = 20  # cached thumbnails read per main loop iteration
+    SEARCH_DEBOUNCE = 120  # ms
+    MATUGEN_MODE = "dark"
+    PREFETCH_DELAY = 600  # ms the selection has to rest before neighbours are themed
+    PREFETCH_RADIUS = 2  # wallpapers on each side of the selection
 
     def __init__(self, **kwargs):
-        # Delete the old cache directory if it exists
-        old_cache_dir = f"{data.CACHE_DIR}/wallpapers"
-        if os.path.exists(old_cache_dir):
-            shutil.rmtree(old_cache_dir)
+        # Delete the old cache directories if they exist
+        for old_cache_dir in (f"{data.CACHE_DIR}/wallpapers", f"{data.CACHE_DIR}/thumbs"):
+            if os.path.exists(old_cache_dir):
+                shutil.rmtree(old_cache_dir, ignore_errors=True)
 
         super().__init__(
             name="wallpapers",
@@ -37,20 +46,42 @@ class WallpaperSelector(Box):
             v_expand=False,
             **kwargs,
         )
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        self.thumbnail_cache = ThumbnailCache.shared(self.CACHE_DIR)
+        self.wallpaper_index = WallpaperIndex.shared(f"{data.CACHE_DIR}/wallpaper-index.json")
+        self.matugen_cache = MatugenCache.shared(f"{data.CACHE_DIR}/matugen")
 
         self.files = []
         GLib.idle_add(self._load_wallpapers_async().__next__)
-        self.thumbnails = []
-        self.thumbnail_queue = []
-        self.executor = ThreadPoolExecutor(max_workers=4)  # Shared executor
+        self.thumbnails = {}  # file name -> thumbnail pixbuf
+        self.placeholder = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE)
+        self.placeholder.fill(0x00000000)
+        self._rows = {}  # file name -> iter in self.store
+        self._query = WallpaperQuery()
+        self._sort_keys = {}  # file name -> sort key for the current query
+        self._search_handler = 0
+        self._pending = set()  # files still waiting for a thumbnail
+        self._in_flight = {}  # file name -> thumbnail future
+        self._queue = []  # heap of (distance from the visible range, file name)
+        self._pump_handler = 0
+        self._reprioritize_handler = 0
+        self._index_save_handler = 0
+        self._prefetch_handler = 0
+        self._theme_request = None  # latest matugen render the user is waiting for
 
         # Variable to control the selection (similar to AppLauncher)
         self.selected_index = -1
 
         # Initialize UI components
         self.viewport = Gtk.IconView(name="wallpaper-icons")
-        self.viewport.set_model(Gtk.ListStore(GdkPixbuf.Pixbuf, str))
+        # One row per file for the selector's lifetime; searching only
+        # refilters and re-sorts the views stacked on top of it.
+        self.store = Gtk.ListStore(GdkPixbuf.Pixbuf, str)
+        self.filtered_model = self.store.filter_new()
+        self.filtered_model.set_visible_func(self._is_row_visible)
+        self.sorted_model = Gtk.TreeModelSort(model=self.filtered_model)
+        self.sorted_model.set_sort_func(0, self._compare_rows)
+        self.sorted_model.set_sort_column_id(0, Gtk.SortType.ASCENDING)
+        self.viewport.set_model(self.sorted_model)
         self.viewport.set_pixbuf_column(0)
         # Hide text column so only the image is shown
         self.viewport.set_text_column(-1)
@@ -69,13 +100,15 @@ class WallpaperSelector(Box):
             propagate_width=False,
             propagate_height=False,
         )
+        self.scrolled_window.get_vadjustment().connect("value-changed", self.queue_reprioritize)
 
         self.search_entry = Entry(
             name="search-entry-walls",
             placeholder="Search Wallpapers...",
+            tooltip_text="Filter with is:landscape, res:4k, color:blue or sort:res / sort:color",
             h_expand=True,
             h_align="fill",
-            notify_text=lambda entry, *_: self.arrange_viewport(entry.get_text()),
+            notify_text=lambda entry, *_: self.queue_search(),
             on_key_press_event=self.on_search_entry_key_press,
         )
         self.search_entry.props.xalign = 0.5
@@ -198,7 +231,6 @@ class WallpaperSelector(Box):
 
         # Removed the old main_content_box and its add
 
-        self._start_thumbnail_thread()
         self.connect("map", self.on_map)
         self.setup_file_monitor()
         self.show_all()
@@ -209,26 +241,6 @@ class WallpaperSelector(Box):
     def _load_wallpapers_async(self):
         """Non-blocking wallpaper processing."""
 
-        # Process old wallpapers: use os.scandir for efficiency and only loop
-        # over image files that actually need renaming (they're not already lowercase
-        # and with hyphens instead of spaces)
-        with os.scandir(data.WALLPAPERS_DIR) as entries:
-            for entry in entries:
-                if entry.is_file() and self._is_image(entry.name):
-                    # Check if the file needs renaming: file should be lowercase and have hyphens instead of spaces
-                    if entry.name != entry.name.lower() or " " in entry.name:
-                        new_name = entry.name.lower().replace(" ", "-")
-                        full_path = os.path.join(data.WALLPAPERS_DIR, entry.name)
-                        new_full_path = os.path.join(data.WALLPAPERS_DIR, new_name)
-                        try:
-                            os.rename(full_path, new_full_path)
-                            print(
-                                f"Renamed old wallpaper '{full_path}' to '{new_full_path}'"
-                            )
-                        except Exception as e:
-                            print(f"Error renaming file {full_path}: {e}")
-                        yield
-
         # Process files in small batches to keep UI responsive
         file_list = os.listdir(data.WALLPAPERS_DIR)
         batch_size = 20
@@ -249,8 +261,11 @@ class WallpaperSelector(Box):
         # Final sort of the complete list
         self.files.sort()
 
-        # Start thumbnail loading after files are processed
-        self._start_thumbnail_thread()
+        # Lay out placeholders for every file, then load thumbnails visible-first
+        self.wallpaper_index.reconcile(self.files)
+        for file_name in self.files:
+            self._add_row(file_name)
+        self.arrange_viewport(self.search_entry.get_text())
 
         # Return False to stop the idle callback
         yield False
@@ -274,31 +289,16 @@ class WallpaperSelector(Box):
             print("No wallpapers available to set a random one.")
             return
 
-        file_name = random.choice(self.files)
+        file_name = self.wallpaper_index.random_pick(self.files)
+        self.wallpaper_index.save()
         full_path = os.path.join(data.WALLPAPERS_DIR, file_name)
-        selected_scheme = self.scheme_dropdown.get_active_id()
-        current_wall = os.path.expanduser(f"~/.current.wall")
-
-        if os.path.isfile(current_wall) or os.path.islink(
-            current_wall
-        ):  # Check for link too
-            os.remove(current_wall)
-        os.symlink(full_path, current_wall)
-
-        if self.matugen_switcher.get_active():
-            exec_shell_command_async(
-                f'matugen image "{full_path}" -t {selected_scheme}'
-            )
-        else:
-            exec_shell_command_async(
-                f'awww img "{full_path}" -t outer --transition-duration 1.5 --transition-step 255 --transition-fps 60 -f Nearest'
-            )
+        self.apply_wallpaper(full_path)
 
         print(f"Set random wallpaper: {file_name}")
 
         if external:
             exec_shell_command_async(
-                f"notify-send '🎲 Wallpaper' 'Setting a random wallpaper 🎨' -a '{data.APP_NAME_CAP}' -i '{full_path}' -e"
+                f"notify-send '🎲 Wallpaper' 'Setting a random wallpaper 🎨' -a '{data.APP_NAME_CAP}' -i {shlex.quote(full_path)} -e"
             )
 
         self.randomize_dice_icon()
@@ -313,82 +313,196 @@ class WallpaperSelector(Box):
         if event_type == Gio.FileMonitorEvent.DELETED:
             if file_name in self.files:
                 self.files.remove(file_name)
-                cache_path = self._get_cache_path(file_name)
-                if os.path.exists(cache_path):
-                    try:
-                        os.remove(cache_path)
-                    except Exception as e:
-                        print(f"Error deleting cache {cache_path}: {e}")
-                self.thumbnails = [(p, n) for p, n in self.thumbnails if n != file_name]
-                GLib.idle_add(self.arrange_viewport, self.search_entry.get_text())
+                self.thumbnails.pop(file_name, None)
+                self._pending.discard(file_name)
+                future = self._in_flight.pop(file_name, None)
+                if future:
+                    future.cancel()
+                self.wallpaper_index.remove(file_name)
+                self._sort_keys.pop(file_name, None)
+                row = self._rows.pop(file_name, None)
+                if row is not None:
+                    selected = self._selected_file()
+                    self.store.remove(row)
+                    self._restore_selection(selected)
         elif event_type == Gio.FileMonitorEvent.CREATED:
             if self._is_image(file_name):
-                # Convert filename to lowercase and replace spaces with "-"
-                new_name = file_name.lower().replace(" ", "-")
-                full_path = os.path.join(data.WALLPAPERS_DIR, file_name)
-                new_full_path = os.path.join(data.WALLPAPERS_DIR, new_name)
-                if new_name != file_name:
-                    try:
-                        os.rename(full_path, new_full_path)
-                        file_name = new_name
-                        print(f"Renamed file '{full_path}' to '{new_full_path}')")
-                    except Exception as e:
-                        print(f"Error renaming file {full_path}: {e}")
                 if file_name not in self.files:
                     self.files.append(file_name)
                     self.files.sort()
-                    self.executor.submit(self._process_file, file_name)
-        elif event_type == Gio.FileMonitorEvent.CHANGED:
+                    selected = self._selected_file()
+                    self._add_row(file_name)
+                    self._restore_selection(selected)
+                    self.queue_reprioritize()
+        elif event_type == Gio.FileMonitorEvent.CHANGES_DONE_HINT:
+            # A changed file gets a new signature, so this re-thumbnails it
             if self._is_image(file_name) and file_name in self.files:
-                cache_path = self._get_cache_path(file_name)
-                if os.path.exists(cache_path):
-                    try:
-                        os.remove(cache_path)
-                    except Exception as e:
-                        print(f"Error deleting cache for changed file {file_name}: {e}")
-                self.executor.submit(self._process_file, file_name)
+                self._pending.add(file_name)
+                self.queue_reprioritize()
+
+    def _add_row(self, file_name):
+        if file_name in self._rows:
+            return
+        self._sort_keys[file_name] = self._rank(file_name)
+        self._rows[file_name] = self.store.append([self.thumbnails.get(file_name, self.placeholder), file_name])
+        self._pending.add(file_name)
+
+    def _rank(self, file_name):
+        """Sort key of `file_name` under the current query, or None when it doesn't match."""
+        query = self._query
+        score = fuzzy_score(query.text, file_name) if query.text else 0
+        info = self.wallpaper_index.get(file_name)
+        if (query.text and score <= 0) or not query.matches(info):
+            return None
+        return query.sort_key(file_name, info, score)
+
+    def _is_row_visible(self, model, row, _data):
+        return self._sort_keys.get(model.get_value(row, 1)) is not None
+
+    def _compare_rows(self, model, a, b, _data):
+        key_a = self._sort_keys.get(model.get_value(a, 1)) or (float("inf"),)
+        key_b = self._sort_keys.get(model.get_value(b, 1)) or (float("inf"),)
+        return (key_a > key_b) - (key_a < key_b)
+
+    def queue_search(self):
+        """Debounce typing: search once the entry has been still for a moment."""
+        if self._search_handler:
+            GLib.source_remove(self._search_handler)
+        self._search_handler = GLib.timeout_add(self.SEARCH_DEBOUNCE, self._run_queued_search)
+
+    def _run_queued_search(self):
+        self._search_handler = 0
+        self.arrange_viewport(self.search_entry.get_text())
+        return False
+
+    def flush_search(self):
+        if self._search_handler:
+            GLib.source_remove(self._search_handler)
+            self._run_queued_search()
 
     def arrange_viewport(self, query: str = ""):
-        model = self.viewport.get_model()
-        model.clear()
-        filtered_thumbnails = [
-            (thumb, name)
-            for thumb, name in self.thumbnails
-            if query.casefold() in name.casefold()
-        ]
-        filtered_thumbnails.sort(key=lambda x: x[1].lower())
-        for pixbuf, file_name in filtered_thumbnails:
-            model.append([pixbuf, file_name])
-        # If the search entry is empty, no icon is selected; otherwise, select the first one.
-        if query.strip() == "":
+        selected = self._selected_file()
+        self._query = WallpaperQuery.parse(query)
+        self._sort_keys = {name: self._rank(name) for name in self._rows}
+        self.filtered_model.refilter()
+        # Setting the sort function again makes the sorted view re-sort with the new keys
+        self.sorted_model.set_sort_func(0, self._compare_rows)
+        self.queue_reprioritize()
+        # Keep the selected wallpaper if it still matches; otherwise select the best match while searching.
+        if self._restore_selection(selected):
+            return
+        if not query.strip():
             self.viewport.unselect_all()
             self.selected_index = -1
-        elif len(model) > 0:
+        elif len(self.sorted_model) > 0:
             self.update_selection(0)
+        else:
+            self.selected_index = -1
+
+    def _view_index(self, file_name):
+        """Position of `file_name` in the grid, or None when the search hides it."""
+        row = self._rows.get(file_name)
+        if row is None:
+            return None
+        path = self.filtered_model.convert_child_path_to_path(self.store.get_path(row))
+        if path is None:
+            return None
+        path = self.sorted_model.convert_child_path_to_path(path)
+        return path.get_indices()[0] if path is not None else None
+
+    def _selected_file(self):
+        if 0 <= self.selected_index < len(self.sorted_model):
+            return self.sorted_model[self.selected_index][1]
+        return None
+
+    def _restore_selection(self, file_name) -> bool:
+        index = self._view_index(file_name) if file_name else None
+        if index is None:
+            if self.selected_index >= len(self.sorted_model):
+                self.selected_index = -1
+            return False
+        if index != self.selected_index:
+            self.update_selection(index)
+        return True
 
     def on_wallpaper_selected(self, iconview, path):
         model = iconview.get_model()
         file_name = model[path][1]
-        full_path = os.path.join(data.WALLPAPERS_DIR, file_name)
-        selected_scheme = self.scheme_dropdown.get_active_id()
+        self.apply_wallpaper(os.path.join(data.WALLPAPERS_DIR, file_name))
+
+    def apply_wallpaper(self, full_path):
         current_wall = os.path.expanduser(f"~/.current.wall")
         if os.path.isfile(current_wall) or os.path.islink(current_wall):
             os.remove(current_wall)
         os.symlink(full_path, current_wall)
         if self.matugen_switcher.get_active():
-            # Matugen is enabled: run the normal command.
-            exec_shell_command_async(
-                f'matugen image "{full_path}" -t {selected_scheme}'
-            )
+            # Matugen is enabled: theme from its cached output.
+            self.apply_matugen(full_path, self.scheme_dropdown.get_active_id())
         else:
             # Matugen is disabled: run the alternative awww command.
             exec_shell_command_async(
-                f'awww img "{full_path}" -t outer --transition-duration 1.5 --transition-step 255 --transition-fps 60 -f Nearest'
+                f"awww img {shlex.quote(full_path)} -t outer --transition-duration 1.5 --transition-step 255 --transition-fps 60 -f Nearest"
             )
 
+    def apply_matugen(self, full_path, scheme):
+        """Swap in the rendered theme for this wallpaper and scheme, rendering it first if needed."""
+        entry = self.matugen_cache.cached_entry(full_path, scheme, self.MATUGEN_MODE)
+        if entry is not None:
+            self._theme_request = None
+            self._install_theme(entry, full_path)
+            return
+        future = self.matugen_cache.render(full_path, scheme, self.MATUGEN_MODE)
+        self._theme_request = future
+        future.add_done_callback(lambda f: GLib.idle_add(self._on_theme_rendered, f, full_path, scheme))
+
+    def _on_theme_rendered(self, future, full_path, scheme):
+        # A wallpaper picked later wins over one that was still rendering
+        if future is not self._theme_request:
+            return False
+        self._theme_request = None
+        try:
+            entry = future.result()
+        except Exception as e:
+            print(f"Error rendering matugen theme for {full_path}: {e}")
+            exec_shell_command_async(f"matugen image {shlex.quote(full_path)} -t {scheme}")
+            return False
+        self._install_theme(entry, full_path)
+        return False
+
+    def _install_theme(self, entry, full_path):
+        try:
+            commands = self.matugen_cache.install(entry, full_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error installing matugen theme from {entry}: {e}")
+            return
+        for command in commands:
+            exec_shell_command_async(["sh", "-c", command])
+
+    def queue_prefetch(self):
+        if self._prefetch_handler:
+            GLib.source_remove(self._prefetch_handler)
+        self._prefetch_handler = GLib.timeout_add(self.PREFETCH_DELAY, self._prefetch_neighbours)
+
+    def _prefetch_neighbours(self):
+        """Render themes around the selection in the background, so picking one next is instant."""
+        self._prefetch_handler = 0
+        if not self.matugen_switcher.get_active() or self.selected_index == -1:
+            return False
+        scheme = self.scheme_dropdown.get_active_id()
+        total = len(self.sorted_model)
+        requests = []
+        for offset in range(self.PREFETCH_RADIUS + 1):
+            for index in dict.fromkeys((self.selected_index + offset, self.selected_index - offset)):
+                if 0 <= index < total:
+                    full_path = os.path.join(data.WALLPAPERS_DIR, self.sorted_model[index][1])
+                    requests.append((full_path, scheme, self.MATUGEN_MODE))
+        self.matugen_cache.prefetch(requests)
+        return False
+
     def on_scheme_changed(self, combo):
         selected_scheme = combo.get_active_id()
         print(f"Color scheme selected: {selected_scheme}")
+        self.queue_prefetch()
 
     def on_search_entry_key_press(self, widget, event):
         if event.state & Gdk.ModifierType.SHIFT_MASK:
@@ -413,6 +527,7 @@ class WallpaperSelector(Box):
             self.move_selection_2d(event.keyval)
             return True
         elif event.keyval in (Gdk.KEY_Return, Gdk.KEY_KP_Enter):
+            self.flush_search()
             if self.selected_index != -1:
                 path = Gtk.TreePath.new_from_indices([self.selected_index])
                 self.on_wallpaper_selected(self.viewport, path)
@@ -518,56 +633,131 @@ class WallpaperSelector(Box):
             path, False, 0.5, 0.5
         )  # Ensure the selected icon is visible
         self.selected_index = new_index
+        self.queue_prefetch()
+
+    def queue_reprioritize(self, *_):
+        if not self._reprioritize_handler:
+            self._reprioritize_handler = GLib.idle_add(self._reprioritize)
+
+    def _reprioritize(self):
+        """Order pending thumbnails by distance from what the grid shows right now."""
+        self._reprioritize_handler = 0
+        visible = self.viewport.get_visible_range()
+        if visible and visible[-1] is not None:
+            first, last = visible[-2].get_indices()[0], visible[-1].get_indices()[0]
+        else:
+            first = last = 0
+        span = last - first + 1
+
+        def distance(file_name):
+            index = self._view_index(file_name)
+            if index is None:
+                # Hidden by the search: load after everything shown
+                return len(self._rows) + 1
+            return max(first - index, index - last, 0)
+
+        # Jobs not yet picked up by a worker for rows far out of view go back in the queue
+        for file_name, future in list(self._in_flight.items()):
+            if distance(file_name) > 2 * span and future.cancel():
+                del self._in_flight[file_name]
+
+        self._queue = [(distance(file_name), file_name) for file_name in self._pending if file_name not in self._in_flight]
+        heapq.heapify(self._queue)
+        self._schedule_pump()
+        return False
+
+    def _schedule_pump(self):
+        if not self._pump_handler and self._queue:
+            self._pump_handler = GLib.idle_add(self._pump)
+
+    def _pump(self):
+        """Load cached thumbnails and dispatch decode jobs, nearest rows first."""
+        loads = 0
+        while self._queue and loads < self.LOADS_PER_IDLE:
+            _, file_name = self._queue[0]
+            if file_name not in self._pending or file_name in self._in_flight:
+                heapq.heappop(self._queue)
+                continue
+            full_path = os.path.join(data.WALLPAPERS_DIR, file_name)
+            cache_path = self.thumbnail_cache.cached_path(full_path)
+            if cache_path is not None:
+                heapq.heappop(self._queue)
+                self._set_thumbnail(file_name, cache_path)
+                loads += 1
+                continue
+            if len(self._in_flight) >= self.MAX_IN_FLIGHT:
+                # A finishing job schedules the next pump
+                self._pump_handler = 0
+                return False
+            heapq.heappop(self._queue)
+            future = self.thumbnail_cache.submit(full_path)
+            self._in_flight[file_name] = future
+            future.add_done_callback(
+                lambda f, name=file_name: not f.cancelled() and GLib.idle_add(self._on_thumbnail_ready, f, name)
+            )
+        if self._queue:
+            return True
+        self._pump_handler = 0
+        if not self._pending and not self._in_flight:
+            GLib.Thread.new("thumbnail-prune", self._prune_thumbnails, list(self.files))
+        return False
 
-    def _start_thumbnail_thread(self):
-        thread = GLib.Thread.new("thumbnail-loader", self._preload_thumbnails, None)
+    def _on_thumbnail_ready(self, future, file_name):
+        if self._in_flight.get(file_name) is not future:
+            return False
+        del self._in_flight[file_name]
+        try:
+            self._set_thumbnail(file_name, future.result())
+        except Exception as e:
+            print(f"Error processing {file_name}: {e}")
+            self._pending.discard(file_name)
+        self._schedule_pump()
+        if not self._queue and not self._in_flight and not self._pending:
+            GLib.Thread.new("thumbnail-prune", self._prune_thumbnails, list(self.files))
+        return False
 
-    def _preload_thumbnails(self, _data):
-        futures = [
-            self.executor.submit(self._process_file, file_name)
-            for file_name in self.files
-        ]
-        concurrent.futures.wait(futures)
-        GLib.idle_add(self._process_batch)
+    def _set_thumbnail(self, file_name, cache_path):
+        self._pending.discard(file_name)
+        try:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file(cache_path)
+        except Exception as e:
+            print(f"Error loading thumbnail {cache_path}: {e}")
+            return
+        self.thumbnails[file_name] = pixbuf
+        row = self._rows.get(file_name)
+        if row is not None:
+            self.store.set_value(row, 0, pixbuf)
+        future = self.wallpaper_index.ensure(file_name, os.path.join(data.WALLPAPERS_DIR, file_name), cache_path)
+        if future is not None:
+            future.add_done_callback(lambda f: GLib.idle_add(self._on_info_ready, f, file_name))
+
+    def _on_info_ready(self, future, file_name):
+        """Metadata for `file_name` changed: re-rank its row and save the index soon."""
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error reading wallpaper info for {file_name}: {e}")
+            return False
+        row = self._rows.get(file_name)
+        if row is not None:
+            key = self._rank(file_name)
+            if key != self._sort_keys.get(file_name):
+                self._sort_keys[file_name] = key
+                # Makes the filter and sort views re-evaluate just this row
+                self.store.row_changed(self.store.get_path(row), row)
+        if not self._index_save_handler:
+            self._index_save_handler = GLib.timeout_add_seconds(2, self._save_index)
+        return False
 
-    def _process_file(self, file_name):
-        full_path = os.path.join(data.WALLPAPERS_DIR, file_name)
-        cache_path = self._get_cache_path(file_name)
-        if not os.path.exists(cache_path):
-            try:
-                with Image.open(full_path) as img:
-                    width, height = img.size
-                    side = min(width, height)
-                    left = (img.width - side) // 2
-                    top = (height - side) // 2
-                    right = left + side
-                    bottom = top + side
-                    img_cropped = img.crop((left, top, right, bottom))
-                    img_cropped.thumbnail((96, 96), Image.Resampling.LANCZOS)
-                    img_cropped.save(cache_path, "PNG")
-            except Exception as e:
-                print(f"Error processing {file_name}: {e}")
-                return
-        self.thumbnail_queue.append((cache_path, file_name))
-        GLib.idle_add(self._process_batch)
-
-    def _process_batch(self):
-        batch = self.thumbnail_queue[:10]
-        del self.thumbnail_queue[:10]
-        for cache_path, file_name in batch:
-            try:
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file(cache_path)
-                self.thumbnails.append((pixbuf, file_name))
-                self.viewport.get_model().append([pixbuf, file_name])
-            except Exception as e:
-                print(f"Error loading thumbnail {cache_path}: {e}")
-        if self.thumbnail_queue:
-            GLib.idle_add(self._process_batch)
+    def _save_index(self):
+        self._index_save_handler = 0
+        GLib.Thread.new("wallpaper-index-save", lambda _: self.wallpaper_index.save(), None)
         return False
 
-    def _get_cache_path(self, file_name: str) -> str:
-        file_hash = hashlib.md5(file_name.encode("utf-8")).hexdigest()
-        return os.path.join(self.CACHE_DIR, f"{file_hash}.png")
+    def _prune_thumbnails(self, file_names):
+        self.thumbnail_cache.prune(os.path.join(data.WALLPAPERS_DIR, file_name) for file_name in file_names)
+        self.thumbnail_cache.save()
+        self.wallpaper_index.save()
 
     @staticmethod
     def _is_image(file_name: str) -> bool:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Headless benchmark of one spectrum frame, before and after the numpy path.
+
+Both sides draw the same random cava frames onto an image surface the size
+of the bar's visualizer. "before" is what Spectrum did per frame until now:
+stat colors.css, decode the frame into a list and add a rectangle and two
+arcs per bar. "after" eases the levels with `BarLevels` and strokes every
+bar in one go with `stroke_bars()`.
+
+    scripts/bench_spectrum.py --bars 60 --frames 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+from math import pi
+
+import cairo
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.spectrum import BarLevels, bar_centres, stroke_bars
+
+COLORS_CSS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "styles", "colors.css")
+
+
+def frame_before(cr, raw, bars, width, height, padding, max_height):
+    try:
+        os.path.getmtime(COLORS_CSS)
+    except OSError:
+        pass
+    sample = [i / 65535 for i in np.frombuffer(raw, dtype="<u2").tolist()]
+    cr.set_source_rgba(0.65, 0.78, 1.0, 1.0)
+    dx = 3
+    center_y = height / 2
+    for value in sample:
+        bar_width = width / bars - padding
+        radius = bar_width / 2
+        bar_height = min(max(height * min(value, 1), 0) / 2, max_height)
+        cr.rectangle(dx, center_y - bar_height, bar_width, bar_height * 2)
+        cr.arc(dx + radius, center_y - bar_height, radius, 0, 2 * pi)
+        cr.arc(dx + radius, center_y + bar_height, radius, 0, 2 * pi)
+        cr.close_path()
+        dx += bar_width + padding
+    cr.fill()
+
+
+def frame_after(cr, raw, levels, centres, width, height, padding, max_height, bars):
+    levels.set_target(np.frombuffer(raw, dtype="<u2").astype(np.float32) / 65535)
+    levels.step()
+    cr.set_source_rgba(0.65, 0.78, 1.0, 1.0)
+    heights = levels.half_heights(height, max_height)
+    stroke_bars(cr, centres, heights, height / 2, width / bars - padding)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bars", type=int, default=60)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--width", type=int, default=180)
+    parser.add_argument("--height", type=int, default=40)
+    args = parser.parse_args()
+
+    padding = 100 / args.bars
+    max_height = 12
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 65535, args.bars, dtype="<u2").tobytes() for _ in range(256)]
+    surface = cairo.ImageSurface(cairo.Format.ARGB32, args.width, args.height)
+
+    def run(draw):
+        cr = cairo.Context(surface)
+        started = time.perf_counter()
+        for i in range(args.frames):
+            cr.set_operator(cairo.Operator.CLEAR)
+            cr.paint()
+            cr.set_operator(cairo.Operator.OVER)
+            draw(cr, frames[i % len(frames)])
+        surface.flush()
+        return (time.perf_counter() - started) / args.frames * 1e6
+
+    levels = BarLevels(args.bars)
+    centres = bar_centres(args.bars, args.width, padding)
+    before = run(lambda cr, raw: frame_before(cr, raw, args.bars, args.width, args.height, padding, max_height))
+    after = run(
+        lambda cr, raw: frame_after(cr, raw, levels, centres, args.width, args.height, padding, max_height, args.bars)
+    )
+    print(f"{args.bars} bars, {args.width}x{args.height}, {args.frames} frames")
+    print(f"before: {before:.1f} us/frame")
+    print(f"after:  {after:.1f} us/frame ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+Table-driven check of AppIdentityResolver on the windows that are easy to get wrong.
+
+Each row is the (class, initialClass, initialTitle, process executable)
+a window is resolved from, and the desktop entry it should land on, or None
+when it should be grouped under its own class key instead. Covers Flatpak
+and Snap ids, Steam games (`steam_app_N`), Electron and other generic
+runtimes, and `-bin`/`.exe` style class suffixes. Exits non-zero if any row
+resolves differently.
+
+    scripts/check_app_identity.py
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.app_identity import AppIdentityResolver
+
+
+def entry(name, window_class=None, executable=None, command_line=None):
+    return SimpleNamespace(
+        name=name, display_name=name, window_class=window_class, executable=executable, command_line=command_line
+    )
+
+
+APPS = [
+    entry("Firefox", "firefox", "firefox", "/usr/lib/firefox/firefox %u"),
+    entry(
+        "Firefox (Flatpak)",
+        None,
+        "flatpak",
+        "/usr/bin/flatpak run --branch=stable --arch=x86_64 --command=firefox --file-forwarding org.mozilla.firefox @@u %u @@",
+    ),
+    entry("Fractal", None, "flatpak", "flatpak run org.gnome.Fractal"),
+    entry("Spotify", None, "env", "env BAMF_DESKTOP_FILE_HINT=/var/lib/snapd/desktop/applications/spotify_spotify.desktop /snap/bin/spotify %U"),
+    entry("Mattermost", None, "snap", "snap run mattermost-desktop %U"),
+    entry("Visual Studio Code", "Code", "code", "/usr/share/code/code --unity-launch %F"),
+    entry("Discord", "discord", "Discord", "/opt/discord/Discord"),
+    entry("Element", None, "electron", "electron /usr/lib/element/app.asar %u"),
+    entry("Steam", "steam", "steam", "/usr/bin/steam %U"),
+    entry("Hades", None, "steam", "steam steam://rungameid/1145360"),
+    entry("Obsidian", None, "obsidian", "obsidian %U"),
+    entry("Zen Browser", "zen", "zen", "zen %u"),
+    entry("Notepad++", None, "wine", "wine notepad++.exe"),
+    entry("Telegram", "org.telegram.desktop", "telegram-desktop", "telegram-desktop -- %u"),
+]
+
+# (class, initialClass, initialTitle, executable) -> expected entry name
+WINDOWS = [
+    (("firefox", "firefox", "", "firefox"), "Firefox"),
+    # Flatpak: full app id, or only its last part
+    (("org.mozilla.firefox", "org.mozilla.firefox", "", "bwrap"), "Firefox (Flatpak)"),
+    (("fractal", "fractal", "", "bwrap"), "Fractal"),
+    # Snap: the snap name, also in its name_name form
+    (("spotify", "spotify", "", "spotify"), "Spotify"),
+    (("mattermost-desktop_mattermost-desktop", "", "", ""), "Mattermost"),
+    # Steam: a game resolves to its own shortcut, never to the client
+    (("steam", "steam", "Steam", "steam"), "Steam"),
+    (("steam_app_1145360", "steam_app_1145360", "Hades", "Hades.exe"), "Hades"),
+    (("steam_app_999", "steam_app_999", "Some Game", "game.exe"), None),
+    # Electron and other runtimes: the executable says nothing about the app
+    (("", "", "Untitled", "electron"), None),
+    (("Element", "Element", "Element", "electron"), "Element"),
+    (("", "", "", "python3"), None),
+    # ... but a real executable is enough when the class is unknown
+    (("", "", "", "discord"), "Discord"),
+    (("", "", "Obsidian - vault", "electron"), "Obsidian"),
+    # Class suffixes
+    (("code-url-handler", "code-url-handler", "", "code"), "Visual Studio Code"),
+    (("zen-bin", "zen-bin", "", "zen-bin"), "Zen Browser"),
+    (("notepad++.exe", "notepad++.exe", "", "wine64-preloader"), "Notepad++"),
+    (("telegram-desktop", "telegram-desktop", "", "telegram-desktop"), "Telegram"),
+    # Unknown programs still group by class
+    (("foot", "foot", "~", "foot"), None),
+]
+
+PINS = [
+    ({"name": "Firefox", "command_line": "/usr/lib/firefox/firefox %u"}, "Firefox"),
+    ({"name": "Hades", "command_line": "steam steam://rungameid/1145360"}, "Hades"),
+    ({"name": "Spotify", "executable": "env", "command_line": "env X=1 /snap/bin/spotify %U"}, "Spotify"),
+    ("foot", None),
+]
+
+
+def main():
+    resolver = AppIdentityResolver(APPS)
+    failures = 0
+
+    # resolve_window() adds the /proc executable lookup and caching around this
+    for signature, expected in WINDOWS:
+        key, app = resolver._resolve(*signature)
+        got = app.name if app else None
+        failures += got != expected
+        print(f"{'ok' if got == expected else 'FAIL'}: {signature} -> {key} (expected {expected})")
+
+    for pin, expected in PINS:
+        key, app = resolver.resolve_pinned(pin)
+        got = app.name if app else None
+        failures += got != expected
+        print(f"{'ok' if got == expected else 'FAIL'}: pinned {pin} -> {key} (expected {expected})")
+
+    # A pin and a window of the same unknown program share a key, so they group in the dock
+    same = resolver.resolve_pinned("foot")[0] == resolver.resolve_window({"address": "0x1", "class": "foot", "initialClass": "foot"})[0]
+    failures += not same
+    print(f"{'ok' if same else 'FAIL'}: unknown pinned and open program share a key")
+
+    # A window that sets its class after it was first seen is resolved again
+    late = {"address": "0x2", "class": "", "initialClass": "", "initialTitle": ""}
+    resolver.resolve_window(late)
+    late_app = resolver.resolve_window(dict(late, **{"class": "firefox"}))[1]
+    regrouped = late_app is not None and late_app.name == "Firefox"
+    failures += not regrouped
+    print(f"{'ok' if regrouped else 'FAIL'}: a window that sets its class late is resolved again")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
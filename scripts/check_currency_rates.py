@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Check CurrencyRates against a local stand-in for the rates service.
+
+Serves floatrates-style JSON from http.server on localhost and points
+`FloatRatesSource` at it through its URL template, then walks through a
+first fetch, the persisted cache, TTL expiry, serving stale rates while the
+source fails, and `RatesUnavailableError`. Exits non-zero on the first
+failed check.
+
+    scripts/check_currency_rates.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.conversion import CurrencyRates, FloatRatesSource, RatesUnavailableError
+
+TTL = 0.5
+
+
+class RatesServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RatesHandler)
+        self.eur = 0.9
+        self.failing = False
+        self.requests = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url_template(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/daily/{{base}}.json"
+
+
+class RatesHandler(BaseHTTPRequestHandler):
+    server: RatesServer
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.failing or self.path != "/daily/usd.json":
+            self.send_error(503 if self.server.failing else 404)
+            return
+        body = json.dumps({
+            "eur": {"code": "EUR", "rate": self.server.eur},
+            "gbp": {"code": "GBP", "rate": 0.75},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(label: str, condition: bool):
+    print(f"{'ok' if condition else 'FAIL'}: {label}")
+    if not condition:
+        sys.exit(1)
+
+
+def raises_unavailable(rates: CurrencyRates, **kwargs) -> bool:
+    try:
+        rates.rate("USD", "EUR", **kwargs)
+    except RatesUnavailableError:
+        return True
+    return False
+
+
+def main():
+    server = RatesServer()
+    source = FloatRatesSource(server.url_template, timeout=2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "rates.json")
+
+        def new_rates() -> CurrencyRates:
+            return CurrencyRates(source, cache_path, ttl=TTL, retry_interval=0)
+
+        rates = new_rates()
+        check("nothing loaded and fetch=False raises RatesUnavailableError", raises_unavailable(rates, fetch=False))
+        check("... without touching the network", server.requests == 0)
+
+        check("first rate is fetched and fresh", rates.rate("USD", "EUR") == (0.9, False))
+        check("cross rates go through the base", abs(rates.rate("EUR", "GBP")[0] - 0.75 / 0.9) < 1e-12)
+        check("rates within the TTL are not fetched again", server.requests == 1)
+
+        check("a new instance starts from the persisted cache", new_rates().rate("USD", "EUR", fetch=False) == (0.9, False))
+        check("... without a request", server.requests == 1)
+
+        server.eur = 0.8
+        time.sleep(TTL + 0.1)
+        check("expired rates raise with fetch=False", raises_unavailable(rates, fetch=False))
+        check("expired rates are fetched again", rates.rate("USD", "EUR") == (0.8, False))
+        check("... with one more request", server.requests == 2)
+
+        server.failing = True
+        time.sleep(TTL + 0.1)
+        check("a failing source serves the last rates, flagged stale", rates.rate("USD", "EUR") == (0.8, True))
+
+        os.remove(cache_path)
+        check("no rates and a failing source raise RatesUnavailableError", raises_unavailable(new_rates()))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
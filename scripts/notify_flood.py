@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+Stress test for the notification popup.
+
+Sends notifications over DBus as fast as asked and reports how long the
+server took to answer each call; a main loop stalled by widget building
+shows up as a long tail. A few senders repeat one summary, one keeps
+replacing its own notification through replaces_id, and the rest send
+unique summaries.
+
+    scripts/notify_flood.py --rate 500 --seconds 5 --apps 4
+"""
+
+import argparse
+import sys
+import time
+
+import gi
+
+gi.require_version("Gio", "2.0")
+from gi.repository import Gio, GLib
+
+
+def notify(proxy, app_name, summary, body, replaces_id=0):
+    result = proxy.call_sync(
+        "Notify",
+        GLib.Variant(
+            "(susssasa{sv}i)",
+            (app_name, replaces_id, "dialog-information", summary, body, [], {}, 5000),
+        ),
+        Gio.DBusCallFlags.NONE,
+        -1,
+        None,
+    )
+    return result.unpack()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=200, help="notifications per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--apps", type=int, default=3, help="senders repeating one summary")
+    parser.add_argument("--unique-apps", type=int, default=1, help="senders with a new summary every time")
+    args = parser.parse_args()
+
+    bus = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+    proxy = Gio.DBusProxy.new_sync(
+        bus,
+        Gio.DBusProxyFlags.NONE,
+        None,
+        "org.freedesktop.Notifications",
+        "/org/freedesktop/Notifications",
+        "org.freedesktop.Notifications",
+        None,
+    )
+
+    interval = 1 / args.rate
+    began = time.monotonic()
+    deadline = began + args.seconds
+    latencies = []
+    replace_id = 0
+    sent = 0
+    next_send = time.monotonic()
+    while next_send < deadline:
+        kind = sent % (args.apps + args.unique_apps + 1)
+        start = time.monotonic()
+        try:
+            if kind < args.apps:
+                notify(proxy, f"flood-repeat-{kind}", "Build failed", f"run {sent}")
+            elif kind < args.apps + args.unique_apps:
+                notify(proxy, f"flood-unique-{kind}", f"Message {sent}", "unique summary")
+            else:
+                replace_id = notify(proxy, "flood-progress", "Downloading", f"{sent} events", replace_id)
+        except GLib.Error as e:
+            print(f"Notify failed: {e.message}")
+            sys.exit(1)
+        latencies.append(time.monotonic() - start)
+        sent += 1
+        next_send += interval
+        pause = next_send - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    latencies.sort()
+    elapsed = time.monotonic() - began
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"Sent {sent} notifications in {elapsed:.1f}s ({sent / elapsed:.0f}/s)")
+    print(
+        f"Notify round trip: p50 {percentile(0.5):.1f} ms, p95 {percentile(0.95):.1f} ms, "
+        f"p99 {percentile(0.99):.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
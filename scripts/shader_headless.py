@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Render a Shadertoy shader headless and report the time per frame.
+
+Runs `ShadertoyRenderer` in an EGL pbuffer without any display server, on
+Mesa's llvmpipe software rasteriser unless told otherwise, so shaders and
+the renderer can be checked in CI. The last frame can be saved as a PPM.
+With --cache the program is built through the program binary cache, and the
+time until it is ready is reported; run it twice to see a cold and a warm
+start.
+
+    scripts/shader_headless.py shader.glsl --frames 120 --size 320x180 --output frame.ppm
+    scripts/shader_headless.py shader.glsl --cache /tmp/shader-cache
+"""
+
+import argparse
+import ctypes
+import os
+import sys
+import time
+
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")
+os.environ.setdefault("GALLIUM_DRIVER", "llvmpipe")
+
+import OpenGL.GL as GL
+from OpenGL import EGL
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.shader_cache import ProgramBinaryCache
+from utils.shadertoy_renderer import ShadertoyRenderer
+
+SAMPLE_SHADER = """
+void mainImage(out vec4 fragColor, in vec2 fragCoord) {
+    vec2 uv = fragCoord / iResolution.xy;
+    fragColor = vec4(0.5 + 0.5 * cos(iTime + uv.xyx + vec3(0, 2, 4)), 1.0);
+}
+"""
+
+
+def egl_context(width: int, height: int):
+    """Make a GL 3.3 core context current on a `width` x `height` pbuffer."""
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("eglInitialize failed")
+    config_attributes = (EGL.EGLint * 13)(
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_RED_SIZE, 8,
+        EGL.EGL_GREEN_SIZE, 8,
+        EGL.EGL_BLUE_SIZE, 8,
+        EGL.EGL_ALPHA_SIZE, 8,
+        EGL.EGL_NONE,
+    )
+    config = EGL.EGLConfig()
+    count = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, config_attributes, ctypes.pointer(config), 1, ctypes.pointer(count)) or not count.value:
+        raise RuntimeError("no EGL config with an OpenGL pbuffer")
+    surface = EGL.eglCreatePbufferSurface(
+        display, config, (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE)
+    )
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(
+        display,
+        config,
+        EGL.EGL_NO_CONTEXT,
+        (EGL.EGLint * 7)(
+            EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+            EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+            EGL.EGL_NONE,
+        ),
+    )
+    if not context or not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("could not make a GL 3.3 core context current")
+    return display
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("shader", nargs="?", help="file defining mainImage(); a sample shader if omitted")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--size", default="320x180")
+    parser.add_argument("--output", help="save the last frame as a PPM")
+    parser.add_argument("--cache", help="directory for cached program binaries")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    source = SAMPLE_SHADER
+    if args.shader:
+        with open(args.shader) as f:
+            source = f.read()
+
+    display = egl_context(width, height)
+    print(f"Renderer: {GL.glGetString(GL.GL_RENDERER).decode()}")
+    renderer = ShadertoyRenderer(source)
+    cache = ProgramBinaryCache.shared(args.cache) if args.cache else None
+
+    started = time.perf_counter()
+    pending = renderer.start_build(cache)
+    issued = time.perf_counter()
+    polls = 1
+    while not pending.poll():
+        polls += 1
+        time.sleep(0.001)
+    from_cache = pending.from_cache
+    renderer.finish_build(pending)
+    ready = time.perf_counter()
+    print(
+        f"Program {'loaded from cache' if from_cache else 'compiled'}: "
+        f"issued in {(issued - started) * 1000:.2f} ms, ready after {(ready - started) * 1000:.2f} ms "
+        f"({polls} polls)"
+    )
+
+    started = time.perf_counter()
+    for frame in range(args.frames):
+        renderer.render(width, height, frame / 60, 1 / 60, frame)
+    GL.glFinish()
+    elapsed = time.perf_counter() - started
+    print(f"{args.frames} frames at {width}x{height}: {elapsed / args.frames * 1000:.2f} ms/frame")
+
+    if args.output:
+        pixels = GL.glReadPixels(0, 0, width, height, GL.GL_RGB, GL.GL_UNSIGNED_BYTE)
+        rows = [pixels[y * width * 3:(y + 1) * width * 3] for y in range(height)]
+        with open(args.output, "wb") as f:
+            f.write(f"P6 {width} {height} 255\n".encode())
+            # GL rows start at the bottom
+            f.write(b"".join(reversed(rows)))
+        print(f"Saved {args.output}")
+
+    renderer.release()
+    EGL.eglTerminate(display)
+
+
+if __name__ == "__main__":
+    main()
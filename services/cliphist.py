@@ -0,0 +1,468 @@
+import hashlib
+import os
+import re
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from fabric.core.service import Service, Signal
+from gi.repository import GdkPixbuf, Gio, GLib
+from loguru import logger
+
+from utils.pixbuf_cache import PixbufLRU
+
+
+def is_image_preview(content: str) -> bool:
+    """Determine if clipboard content is likely an image"""
+    return (
+        content.startswith("data:image/") or
+        content.startswith("\x89PNG") or
+        content.startswith("GIF8") or
+        content.startswith("\xff\xd8\xff") or
+        re.match(r'^\s*<img\s+', content) is not None or
+        "binary" in content.lower() and any(ext in content.lower() for ext in ["jpg", "jpeg", "png", "bmp", "gif"])
+    )
+
+
+_URL_RE = re.compile(r"^\s*(?:(?:https?|ftp|file)://|www\.)\S+\s*$", re.IGNORECASE)
+_CODE_RE = re.compile(
+    r"^\s*(?:def|class|import|from|fn|func|function|const|let|var|return|#include|#!)\b"
+    r"|[{};]\s*$|=>|::|\$\(|&&|\|\||</?[a-z][\w-]*[^>]*>|\w+\([^()]*\)\s*[{;:]"
+)
+
+# Query prefixes that restrict a search to one kind of entry
+KIND_FILTERS = {"image:": "image", "img:": "image", "url:": "url", "code:": "code", "text:": "text"}
+
+
+def classify(content: str) -> str:
+    if is_image_preview(content):
+        return "image"
+    if _URL_RE.match(content):
+        return "url"
+    if _CODE_RE.search(content):
+        return "code"
+    return "text"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+@dataclass(slots=True)
+class ClipItem:
+    id: str
+    preview: str
+    kind: str
+
+    @classmethod
+    def from_line(cls, line: str) -> "ClipItem":
+        item_id, _, content = line.partition("\t")
+        return cls(item_id, content, classify(content))
+
+    @property
+    def order(self) -> int:
+        """cliphist ids grow with every copy, so they double as recency."""
+        return int(self.id) if self.id.isdigit() else 0
+
+
+class ClipSearchIndex:
+    """
+    Search over entry previews, updated one entry at a time.
+
+    Queries of three or more characters intersect trigram postings and
+    confirm the substring; shorter ones match word prefixes. Results come
+    back newest first, optionally limited to one kind. Entries are queued
+    by `add()` and indexed in small batches by `index_pending()`; until
+    then searches scan them directly.
+    """
+
+    BATCH_SIZE = 100
+
+    def __init__(self):
+        self._pending: Dict[int, ClipItem] = {}
+        self._items: Dict[int, ClipItem] = {}
+        self._text: Dict[int, str] = {}
+        self._trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self._prefixes: Dict[str, Set[int]] = defaultdict(set)
+        self._kinds: Dict[str, Set[int]] = defaultdict(set)
+
+    @staticmethod
+    def _trigrams_of(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def _prefixes_of(text: str) -> Set[str]:
+        return {word[:n] for word in text.split(" ") for n in (1, 2) if len(word) >= n}
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def add(self, item: ClipItem):
+        if item.order in self._items:
+            self.remove(self._items[item.order])
+        self._pending[item.order] = item
+
+    def index_pending(self) -> bool:
+        """Index up to BATCH_SIZE queued entries; returns True while more remain."""
+        for _ in range(min(self.BATCH_SIZE, len(self._pending))):
+            key = next(iter(self._pending))
+            self._index(self._pending.pop(key))
+        return bool(self._pending)
+
+    def _index(self, item: ClipItem):
+        key = item.order
+        text = normalize(item.preview)
+        self._items[key] = item
+        self._text[key] = text
+        self._kinds[item.kind].add(key)
+        for trigram in self._trigrams_of(text):
+            self._trigrams[trigram].add(key)
+        for prefix in self._prefixes_of(text):
+            self._prefixes[prefix].add(key)
+
+    def remove(self, item: ClipItem):
+        key = item.order
+        if self._pending.get(key) is item:
+            del self._pending[key]
+            return
+        if self._items.get(key) is not item:
+            return
+        del self._items[key]
+        text = self._text.pop(key)
+        self._kinds[item.kind].discard(key)
+        for index, grams in ((self._trigrams, self._trigrams_of(text)), (self._prefixes, self._prefixes_of(text))):
+            for gram in grams:
+                postings = index.get(gram)
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del index[gram]
+
+    def clear(self):
+        for index in (self._pending, self._items, self._text, self._trigrams, self._prefixes, self._kinds):
+            index.clear()
+
+    @staticmethod
+    def parse_query(query: str):
+        """Split a leading kind filter such as `url:` off the query."""
+        query = query.lstrip()
+        lowered = query.casefold()
+        for prefix, kind in KIND_FILTERS.items():
+            if lowered.startswith(prefix):
+                return kind, normalize(query[len(prefix):])
+        return None, normalize(query)
+
+    def search(self, query: str) -> List[ClipItem]:
+        kind, text = self.parse_query(query)
+
+        if not text:
+            keys = self._kinds.get(kind, set()) if kind else self._items.keys()
+        elif len(text) < 3:
+            if " " in text:
+                keys = [key for key, value in self._text.items() if text in value]
+            else:
+                keys = self._prefixes.get(text, set())
+        else:
+            postings = sorted((self._trigrams.get(gram, set()) for gram in self._trigrams_of(text)), key=len)
+            keys = set(postings[0]).intersection(*postings[1:])
+            if len(text) > 3:
+                keys = [key for key in keys if text in self._text[key]]
+
+        if kind and text:
+            kind_keys = self._kinds.get(kind, set())
+            keys = [key for key in keys if key in kind_keys]
+
+        matches = [self._items[key] for key in sorted(keys, reverse=True)]
+        if self._pending:
+            matches.extend(
+                item for item in self._pending.values()
+                if (not kind or item.kind == kind) and text in normalize(item.preview)
+            )
+            matches.sort(key=lambda item: item.order, reverse=True)
+        return matches
+
+
+class ClipboardHistory(Service):
+    """
+    In-memory copy of the cliphist history, loaded once and kept current.
+
+    The cliphist database file is watched with a `Gio.FileMonitor`; after a
+    burst of writes settles, `cliphist list` is re-read off the main thread
+    and only the entries that appeared or disappeared are applied and
+    signalled, newest first.
+    """
+
+    instance = None
+    SETTLE_DELAY = 150  # ms to wait for a burst of DB writes to finish
+
+    @staticmethod
+    def get_initial():
+        if ClipboardHistory.instance is None:
+            ClipboardHistory.instance = ClipboardHistory()
+        return ClipboardHistory.instance
+
+    @Signal
+    def item_added(self, item: object, position: int) -> None: ...
+
+    @Signal
+    def item_removed(self, item: object) -> None: ...
+
+    @Signal
+    def loaded(self) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.items: List[ClipItem] = []
+        self._by_id: Dict[str, ClipItem] = {}
+        self.index = ClipSearchIndex()
+        self._index_handler = 0
+        self.is_loaded = False
+        self._refreshing = False
+        self._refresh_again = False
+        self._settle_id = 0
+
+        self.db_path = os.environ.get("CLIPHIST_DB_PATH") or os.path.join(
+            GLib.get_user_cache_dir(), "cliphist", "db"
+        )
+        self._monitor: Optional[Gio.FileMonitor] = None
+        try:
+            self._monitor = Gio.File.new_for_path(self.db_path).monitor_file(Gio.FileMonitorFlags.NONE, None)
+            self._monitor.connect("changed", self._on_db_changed)
+        except GLib.Error as e:
+            logger.warning(f"[Cliphist] Cannot watch {self.db_path}: {e}")
+
+        self.refresh()
+
+    def get(self, item_id: str) -> Optional[ClipItem]:
+        return self._by_id.get(item_id)
+
+    def search(self, query: str) -> List[ClipItem]:
+        """Entries matching `query`, newest first; see `ClipSearchIndex`."""
+        if not query.strip():
+            return list(self.items)
+        return self.index.search(query)
+
+    def _on_db_changed(self, monitor, file, other_file, event_type):
+        if event_type not in (
+            Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+            Gio.FileMonitorEvent.CHANGED,
+            Gio.FileMonitorEvent.CREATED,
+            Gio.FileMonitorEvent.DELETED,
+        ):
+            return
+        if self._settle_id:
+            GLib.source_remove(self._settle_id)
+        self._settle_id = GLib.timeout_add(self.SETTLE_DELAY, self._on_settled)
+
+    def _on_settled(self):
+        self._settle_id = 0
+        self.refresh()
+        return False
+
+    def refresh(self):
+        """Re-read `cliphist list` in the background and apply the differences."""
+        if self._refreshing:
+            self._refresh_again = True
+            return
+        self._refreshing = True
+        GLib.Thread.new("cliphist-list", self._list_thread, None)
+
+    def _list_thread(self, _):
+        lines = None
+        try:
+            result = subprocess.run(["cliphist", "list"], capture_output=True, check=True)
+            # a line without an id cannot be pasted or deleted, so it is not listed
+            lines = [
+                line for line in result.stdout.decode("utf-8", errors="replace").split("\n")
+                if "\t" in line and "<meta http-equiv" not in line
+            ]
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error(f"[Cliphist] Error loading clipboard history: {e}")
+        GLib.idle_add(self._apply, lines)
+
+    def _apply(self, lines: Optional[List[str]]):
+        self._refreshing = False
+        if lines is not None:
+            self._apply_lines(lines)
+        if self._refresh_again:
+            self._refresh_again = False
+            self.refresh()
+        return False
+
+    def _apply_lines(self, lines: List[str]):
+        new_ids = [line.partition("\t")[0] for line in lines]
+        wanted = set(new_ids)
+
+        for item in [item for item in self.items if item.id not in wanted]:
+            self._remove(item)
+
+        # Everything left keeps its relative order, so inserting the new
+        # entries at their final positions in ascending order is enough.
+        for position, (item_id, line) in enumerate(zip(new_ids, lines)):
+            if item_id not in self._by_id:
+                item = ClipItem.from_line(line)
+                self.items.insert(position, item)
+                self._by_id[item.id] = item
+                self.index.add(item)
+                self.item_added(item, position)
+
+        if self.index.has_pending and not self._index_handler:
+            self._index_handler = GLib.idle_add(self._index_pending)
+
+        if not self.is_loaded:
+            self.is_loaded = True
+            self.loaded()
+
+    def _index_pending(self):
+        if self.index.index_pending():
+            return True
+        self._index_handler = 0
+        return False
+
+    def _remove(self, item: ClipItem):
+        self.items.remove(item)
+        del self._by_id[item.id]
+        self.index.remove(item)
+        self.item_removed(item)
+
+    def delete(self, item_id: str):
+        """Delete an entry; it leaves the model right away, cliphist catches up in the background."""
+        item = self._by_id.get(item_id)
+        if item:
+            self._remove(item)
+        GLib.Thread.new("cliphist-delete", self._run_thread, ["cliphist", "delete", item_id])
+
+    def clear(self):
+        for item in list(self.items):
+            self._remove(item)
+        GLib.Thread.new("cliphist-wipe", self._run_thread, ["cliphist", "wipe"])
+
+    def _run_thread(self, command):
+        try:
+            subprocess.run(command, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error(f"[Cliphist] {' '.join(command)} failed: {e}")
+
+
+class ClipPreviewLoader:
+    """
+    Thumbnails for image entries, decoded by a small fixed worker pool.
+
+    Only ids passed to `retain()` are worth decoding; queued requests for
+    anything else are dropped when a worker reaches them. Thumbnails are
+    stored on disk under the hash of the clipboard content, so a restart
+    only costs a `cliphist decode` per entry, and decoded pixbufs stay in
+    a byte-bounded LRU.
+    """
+
+    def __init__(
+        self, cache_dir: str, width: int = 72, height: int = 72, workers: int = 1, memory_budget: int = 16 * 1024 * 1024
+    ):
+        self.cache_dir = cache_dir
+        self.width = width
+        self.height = height
+        self.memory = PixbufLRU(memory_budget)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clip-preview")
+        self._hashes: Dict[str, str] = {}
+        self._wanted: Set[str] = set()
+        self._queued: Set[str] = set()
+        self._callbacks: Dict[str, Callable[[GdkPixbuf.Pixbuf], None]] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def retain(self, item_ids: Iterable[str]):
+        """Forget interest in everything except `item_ids`."""
+        self._wanted = set(item_ids)
+        for item_id in list(self._callbacks):
+            if item_id not in self._wanted:
+                del self._callbacks[item_id]
+
+    def request(self, item_id: str, callback: Callable[[GdkPixbuf.Pixbuf], None]):
+        content_hash = self._hashes.get(item_id)
+        pixbuf = self.memory.get(content_hash) if content_hash else None
+        if pixbuf is not None:
+            callback(pixbuf)
+            return
+        self._wanted.add(item_id)
+        self._callbacks[item_id] = callback
+        if item_id not in self._queued:
+            self._queued.add(item_id)
+            self._executor.submit(self._load, item_id, content_hash)
+
+    def forget(self, item_id: str):
+        self._wanted.discard(item_id)
+        self._callbacks.pop(item_id, None)
+        content_hash = self._hashes.pop(item_id, None)
+        if content_hash:
+            self.memory.discard(content_hash)
+
+    def _load(self, item_id: str, content_hash: Optional[str]):
+        # Scrolled away or closed while queued
+        if item_id not in self._wanted:
+            GLib.idle_add(self._skipped, item_id)
+            return
+        pixbuf = None
+        try:
+            path = self._path(content_hash) if content_hash else None
+            if path is None or not os.path.exists(path):
+                data = subprocess.run(["cliphist", "decode", item_id], capture_output=True, check=True).stdout
+                content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+                path = self._path(content_hash)
+                if not os.path.exists(path):
+                    pixbuf = self._thumbnail(data)
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    pixbuf.savev(tmp_path, "png", [], [])
+                    os.replace(tmp_path, path)
+            if pixbuf is None:
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+        except (OSError, subprocess.CalledProcessError, GLib.Error) as e:
+            logger.error(f"[Cliphist] Error loading image preview: {e}")
+        finally:
+            GLib.idle_add(self._deliver, item_id, content_hash, pixbuf)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}-{self.width}x{self.height}.png")
+
+    def _scale(self, width: int, height: int) -> float:
+        return min(self.width / max(width, 1), self.height / max(height, 1))
+
+    def _thumbnail(self, data: bytes) -> GdkPixbuf.Pixbuf:
+        """Decode straight to thumbnail size where the format supports it (JPEG does)."""
+        def on_size_prepared(loader, width, height):
+            scale = self._scale(width, height)
+            if scale < 1:
+                loader.set_size(max(1, int(width * scale)), max(1, int(height * scale)))
+
+        loader = GdkPixbuf.PixbufLoader()
+        loader.connect("size-prepared", on_size_prepared)
+        loader.write(data)
+        loader.close()
+        pixbuf = loader.get_pixbuf()
+        width, height = pixbuf.get_width(), pixbuf.get_height()
+        scale = self._scale(width, height)
+        if scale < 1:
+            pixbuf = pixbuf.scale_simple(
+                max(1, int(width * scale)), max(1, int(height * scale)), GdkPixbuf.InterpType.BILINEAR
+            )
+        return pixbuf
+
+    def _skipped(self, item_id: str):
+        self._queued.discard(item_id)
+        # Requested again after the worker had already passed on it
+        if item_id in self._callbacks:
+            self._queued.add(item_id)
+            self._executor.submit(self._load, item_id, self._hashes.get(item_id))
+        return False
+
+    def _deliver(self, item_id: str, content_hash: Optional[str], pixbuf: Optional[GdkPixbuf.Pixbuf]):
+        self._queued.discard(item_id)
+        if content_hash:
+            self._hashes[item_id] = content_hash
+        if pixbuf is not None and content_hash:
+            self.memory.put(content_hash, pixbuf)
+        callback = self._callbacks.pop(item_id, None)
+        if callback and pixbuf is not None:
+            callback(pixbuf)
+        return False
@@ -0,0 +1,243 @@
+import bisect
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from fabric.core.service import Service, Signal
+from gi.repository import GLib
+from loguru import logger
+
+import config.data as data
+from services.notification_images import NotificationImageCache
+from utils.notification_index import NotificationIndex, NotificationQuery
+from utils.notification_journal import NotificationJournal
+
+PERSISTENT_DIR = f"{data.STATE_DIR}/notifications"
+PERSISTENT_HISTORY_FILE = os.path.join(PERSISTENT_DIR, "history.jsonl")
+LEGACY_HISTORY_FILE = f"/tmp/{data.APP_NAME}/notifications/notification_history.json"
+
+
+@dataclass(slots=True)
+class HistoryRecord:
+    """One stored notification; history rows are bound to these, never built per record."""
+
+    id: str
+    app_name: str = ""
+    summary: str = ""
+    body: str = ""
+    app_icon: str = ""
+    timestamp: str = ""
+    cached_image_path: Optional[str] = None
+    count: int = 1  # repeats coalesced into this one
+    urgency: int = 1
+    arrival: datetime = field(default=None, compare=False)
+
+    @classmethod
+    def from_note(cls, note: dict) -> "HistoryRecord":
+        record = cls(
+            id=str(note.get("id")),
+            app_name=note.get("app_name") or "",
+            summary=note.get("summary") or "",
+            body=note.get("body") or "",
+            app_icon=note.get("app_icon") or "",
+            timestamp=note.get("timestamp") or "",
+            cached_image_path=note.get("cached_image_path"),
+            count=note.get("count") or 1,
+            urgency=note.get("urgency", 1),
+        )
+        try:
+            record.arrival = datetime.fromisoformat(record.timestamp)
+        except (TypeError, ValueError):
+            record.arrival = datetime.now()
+        return record
+
+    def to_note(self) -> dict:
+        return {
+            "id": self.id,
+            "app_icon": self.app_icon,
+            "summary": self.summary,
+            "body": self.body,
+            "app_name": self.app_name,
+            "timestamp": self.timestamp,
+            "cached_image_path": self.cached_image_path,
+            "count": self.count,
+            "urgency": self.urgency,
+        }
+
+    @property
+    def day(self) -> date:
+        return self.arrival.date()
+
+
+class NotificationHistoryStore(Service):
+    """
+    The notification history shared by every monitor's history view.
+
+    Records are kept newest first and mirrored to the journal. Only pages that
+    a view scrolled to are read from it; views are told about every insertion
+    and removal and build widgets for the records on screen only.
+
+    Every record holds a reference on its cached image. Images of records that
+    were never loaded are released by the sweep at the next start.
+
+    Search runs over an index of the whole journal, built from the startup
+    compaction off the main loop. Until it is ready the index covers the
+    loaded records, and changes made meanwhile are replayed onto it.
+    """
+
+    instance = None
+
+    @staticmethod
+    def get_initial():
+        if NotificationHistoryStore.instance is None:
+            NotificationHistoryStore.instance = NotificationHistoryStore()
+        return NotificationHistoryStore.instance
+
+    @Signal
+    def record_added(self, record: object, position: int) -> None: ...
+
+    @Signal
+    def record_removed(self, record: object, position: int) -> None: ...
+
+    @Signal
+    def cleared(self) -> None: ...
+
+    @Signal
+    def indexed(self) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.records: List[HistoryRecord] = []
+        self._by_id: Dict[str, HistoryRecord] = {}
+        self.journal = NotificationJournal(PERSISTENT_HISTORY_FILE, limit=data.NOTIFICATION_HISTORY_LIMIT)
+        self.images = NotificationImageCache.get_initial()
+        self.index = NotificationIndex()
+        self._index_log = []  # changes since the compaction the full index is built from
+        self.cursor: Optional[int] = None  # journal offset of the next older page
+        self.has_more = True
+        os.makedirs(PERSISTENT_DIR, exist_ok=True)
+        if os.path.exists(LEGACY_HISTORY_FILE):
+            self._import_legacy_history()
+        self.load_more()
+        compaction_started = datetime.now().timestamp()
+        self.journal.compact().add_done_callback(
+            lambda f: self._on_journal_compacted(f, compaction_started)
+        )
+
+    def _import_legacy_history(self):
+        """Move the history kept in /tmp by earlier versions into the journal."""
+        try:
+            with open(LEGACY_HISTORY_FILE, "r") as f:
+                notes = json.load(f)
+            last_write = None
+            for note in reversed(notes):
+                last_write = self.journal.append(note)
+            if last_write is not None:
+                last_write.result()
+            os.remove(LEGACY_HISTORY_FILE)
+            logger.info(f"Imported {len(notes)} notifications from {LEGACY_HISTORY_FILE}")
+        except Exception as e:
+            logger.error(f"Error importing legacy notification history: {e}")
+
+    def _insert(self, record: HistoryRecord) -> int:
+        arrival = -record.arrival.timestamp()
+        position = bisect.bisect_left(self.records, arrival, key=lambda r: -r.arrival.timestamp())
+        self.records.insert(position, record)
+        self._by_id[record.id] = record
+        self._update_index("add", record)
+        self.record_added(record, position)
+        return position
+
+    def load_more(self):
+        """Read the next older page of the journal into the model."""
+        if not self.has_more:
+            return
+        try:
+            notes, self.cursor = self.journal.page(self.cursor)
+        except Exception as e:
+            logger.error(f"Error loading persistent history: {e}")
+            notes, self.cursor = [], None
+        self.has_more = self.cursor is not None
+        for note in notes:
+            record = HistoryRecord.from_note(note)
+            if record.id not in self._by_id:
+                self._insert(record)
+
+    def add(self, note: dict) -> HistoryRecord:
+        record = HistoryRecord.from_note(note)
+        self.images.acquire(record.cached_image_path)
+        self.journal.append(record.to_note())
+        self._insert(record)
+        return record
+
+    def get(self, record_id: str) -> Optional[HistoryRecord]:
+        return self._by_id.get(record_id)
+
+    def _forget(self, record: HistoryRecord):
+        position = self.records.index(record)
+        del self.records[position]
+        del self._by_id[record.id]
+        self.images.release(record.cached_image_path)
+        self.record_removed(record, position)
+
+    def remove(self, record: HistoryRecord):
+        """Remove `record`; search results may come from pages not loaded yet."""
+        loaded = self._by_id.get(record.id)
+        if loaded is None and record.id not in self.index:
+            return
+        self.journal.delete([record.id])
+        self._update_index("remove", record.id)
+        if loaded is not None:
+            self._forget(loaded)
+        else:
+            self.images.release(record.cached_image_path)
+            self.record_removed(record, -1)
+        logger.info(f"Notification with ID {record.id} was removed from history.")
+
+    def clear_app(self, app_name: str):
+        """Drop every notification of `app_name`, including pages not loaded yet."""
+        for record in [r for r in self.records if r.app_name == app_name]:
+            self._forget(record)
+        self.journal.delete_app(app_name)
+        self._update_index("remove_app", app_name)
+
+    def clear(self):
+        self.journal.clear()
+        self._update_index("clear")
+        for record in self.records:
+            self.images.release(record.cached_image_path)
+        self.records = []
+        self._by_id = {}
+        self.cursor = None
+        self.has_more = False
+        logger.info("Notification history cleared.")
+        self.cleared()
+
+    def search(self, query: NotificationQuery, limit: Optional[int] = None) -> List[HistoryRecord]:
+        return self.index.search(query, limit)
+
+    def _update_index(self, operation: str, *args):
+        getattr(self.index, operation)(*args)
+        if self._index_log is not None:
+            self._index_log.append((operation, args))
+
+    def _on_journal_compacted(self, future, started):
+        # On the journal thread: the index is built here, installed on the main loop
+        index = None
+        if future.exception() is None:
+            index = NotificationIndex.build(HistoryRecord.from_note(note) for note in future.result())
+        GLib.idle_add(self._on_compacted, future, started, index)
+
+    def _on_compacted(self, future, started, index):
+        if future.exception() is None:
+            self.images.set_base_counts((note.get("cached_image_path") for note in future.result()), started)
+        if index is not None:
+            # Replaying the log also puts the loaded records themselves in the index
+            for operation, args in self._index_log:
+                getattr(index, operation)(*args)
+            self.index = index
+        self._index_log = None
+        self.indexed()
+        return False
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from gi.repository import GdkPixbuf
+from loguru import logger
+
+IMAGE_SIZE = 48
+
+
+class NotificationImageCache:
+    """
+    Content-addressed, reference-counted notification images.
+
+    `store()` names a pixbuf after the hash of its pixels and returns that
+    path right away; scaling and PNG encoding happen once per distinct image
+    on a worker thread, so an app sending the same icon with every message
+    shares one file. Popup boxes and history records hold references, and a
+    file is deleted when the last one is released.
+
+    Counts for history that is not loaded come from one pass over the journal
+    (`set_base_counts()`); until then releases are only tallied.
+    """
+
+    instance = None
+
+    @staticmethod
+    def get_initial():
+        if NotificationImageCache.instance is None:
+            from services.notification_history import PERSISTENT_DIR
+
+            NotificationImageCache.instance = NotificationImageCache(
+                os.path.join(PERSISTENT_DIR, "images"), legacy_dir=PERSISTENT_DIR
+            )
+        return NotificationImageCache.instance
+
+    def __init__(self, image_dir: str, legacy_dir: Optional[str] = None):
+        self.image_dir = image_dir
+        self.legacy_dir = legacy_dir  # holds images named after their notification, from older versions
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()  # path -> references, relative to the base until it is known
+        self._base_known = False
+        self._pending: Dict[str, GdkPixbuf.Pixbuf] = {}  # path -> pixbuf still being written
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notification-images")
+        os.makedirs(image_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(pixbuf: GdkPixbuf.Pixbuf) -> str:
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(
+            f"{pixbuf.get_width()}x{pixbuf.get_height()}:{pixbuf.get_rowstride()}:{pixbuf.get_has_alpha()}".encode()
+        )
+        hasher.update(pixbuf.read_pixel_bytes().get_data())
+        return hasher.hexdigest()
+
+    def store(self, pixbuf: GdkPixbuf.Pixbuf) -> str:
+        """Path the image is (or will shortly be) saved at; the caller holds one reference."""
+        path = os.path.join(self.image_dir, f"{self.digest(pixbuf)}.png")
+        with self._lock:
+            self._counts[path] += 1
+            if path in self._pending or os.path.exists(path):
+                return path
+            self._pending[path] = pixbuf
+        self._executor.submit(self._write, path, pixbuf)
+        return path
+
+    def _write(self, path: str, pixbuf: GdkPixbuf.Pixbuf):
+        tmp_path = f"{path}.tmp"
+        try:
+            scaled = pixbuf.scale_simple(IMAGE_SIZE, IMAGE_SIZE, GdkPixbuf.InterpType.BILINEAR)
+            scaled.savev(tmp_path, "png", [], [])
+            with self._lock:
+                # Every reference may have gone while it was encoding
+                if self._base_known and self._counts[path] <= 0:
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error caching notification image {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def pixbuf(self, path: str) -> Optional[GdkPixbuf.Pixbuf]:
+        """The in-memory image for `path` while it is still being written."""
+        with self._lock:
+            return self._pending.get(path)
+
+    def acquire(self, path: Optional[str]):
+        if path:
+            with self._lock:
+                self._counts[path] += 1
+
+    def release(self, path: Optional[str]):
+        if not path:
+            return
+        with self._lock:
+            self._counts[path] -= 1
+            if not self._base_known or self._counts[path] > 0:
+                return
+            del self._counts[path]
+            if path in self._pending:
+                return  # `_write()` drops it
+        self._remove(path)
+
+    def set_base_counts(self, paths: Iterable[Optional[str]], started: float):
+        """
+        References held by the whole journal when it was last replayed. Files
+        nothing refers to and that predate `started` are deleted.
+        """
+        base = Counter(path for path in paths if path)
+        with self._lock:
+            self._counts.update(base)
+            self._base_known = True
+            live = {path for path, count in self._counts.items() if count > 0}
+        self._executor.submit(self._sweep, live, started)
+
+    def _sweep(self, live, started: float):
+        deleted = 0
+        for directory in filter(None, (self.image_dir, self.legacy_dir)):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.endswith(".png") or entry.path in live:
+                    continue
+                try:
+                    if entry.stat().st_mtime < started:
+                        os.remove(entry.path)
+                        deleted += 1
+                except OSError:
+                    pass
+        logger.info(f"Notification image cleanup finished. Deleted {deleted} unused images.")
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+            logger.info(f"Deleted cached image: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error deleting cached image {path}: {e}")
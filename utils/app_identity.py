@@ -0,0 +1,204 @@
+"""
+Which installed app a Hyprland window belongs to.
+
+Desktop entries are indexed once (StartupWMClass, executable, the command's
+program, Flatpak and Snap app ids, names and Steam game ids), and each
+window is resolved from its class, initial class, initial title and the
+executable of its process. Results are cached both for the window (by
+address, until it closes) and for the tuple describing it, so opening another
+window of a known app costs a dictionary lookup.
+
+Windows without a desktop entry are keyed by their normalized class, so
+windows of the same unknown program still group together.
+"""
+
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+CLASS_SUFFIXES = (".bin", ".exe", ".so", "-bin", "-gtk", "-url-handler")
+STEAM_GAME_CLASS = re.compile(r"^steam_app_(\d+)$")
+STEAM_GAME_COMMAND = re.compile(r"steam://rungameid/(\d+)")
+# Runtimes whose process name says nothing about the app they run
+GENERIC_EXECUTABLES = {"electron", "java", "python", "python3", "node", "wine", "wine64-preloader", "bwrap", "flatpak-bwrap"}
+
+
+def normalize_class(class_name: str) -> str:
+    normalized = (class_name or "").strip().lower()
+    for suffix in CLASS_SUFFIXES:
+        if normalized.endswith(suffix):
+            normalized = normalized[: -len(suffix)]
+    return normalized
+
+
+def _program(command: str) -> str:
+    return os.path.basename(command.split()[0]).lower() if command and command.split() else ""
+
+
+def _flatpak_id(command_line: str) -> Optional[str]:
+    """`org.foo.Bar` from `flatpak run [--options] org.foo.Bar [args]`."""
+    words = (command_line or "").split()
+    if "flatpak" not in map(os.path.basename, words[:2]) or "run" not in words:
+        return None
+    for word in words[words.index("run") + 1 :]:
+        if not word.startswith("-") and not word.startswith("@@"):
+            return word.lower()
+    return None
+
+
+def _snap_name(command_line: str) -> Optional[str]:
+    """`foo` from `/snap/bin/foo` or `snap run foo`, whatever env wrapper precedes it."""
+    words = (command_line or "").split()
+    for i, word in enumerate(words):
+        if word.startswith("/snap/bin/"):
+            return word[len("/snap/bin/") :].lower()
+        if os.path.basename(word) == "snap" and i + 2 < len(words) and words[i + 1] == "run":
+            return words[i + 2].lower()
+    return None
+
+
+def app_key(app) -> str:
+    return f"desktop:{(app.name or '').lower()}:{_program(app.command_line or app.executable or '')}"
+
+
+def process_executable(pid) -> str:
+    try:
+        return os.path.basename(os.readlink(f"/proc/{int(pid)}/exe")).lower()
+    except (OSError, TypeError, ValueError):
+        return ""
+
+
+class AppIdentityResolver:
+    def __init__(self, apps: Iterable):
+        self._by_class: Dict[str, object] = {}
+        self._by_id: Dict[str, object] = {}  # Flatpak and Snap app ids
+        self._by_executable: Dict[str, object] = {}
+        self._by_name: Dict[str, object] = {}
+        self._by_steam_game: Dict[str, object] = {}
+        self._by_entry: Dict[Tuple[str, str], object] = {}  # (name, command line)
+        for app in apps:
+            self._register(app)
+        self._by_tuple: Dict[Tuple[str, str, str, str], Tuple[str, Optional[object]]] = {}
+        # address -> (class it was resolved under, result); a window may set its class late
+        self._by_address: Dict[str, Tuple[str, Tuple[str, Optional[object]]]] = {}
+        self._pinned: Dict[tuple, Tuple[str, Optional[object]]] = {}
+
+    def _register(self, app):
+        self._by_entry.setdefault(((app.name or "").lower(), app.command_line or ""), app)
+        # First entry wins, so an app's own .desktop beats later helpers sharing its class
+        if app.window_class:
+            self._by_class.setdefault(app.window_class.lower(), app)
+            self._by_class.setdefault(normalize_class(app.window_class), app)
+        flatpak_id = _flatpak_id(app.command_line)
+        if flatpak_id:
+            self._by_id.setdefault(flatpak_id, app)
+            # Some Flatpak apps set only the last part of their id as the class
+            self._by_id.setdefault(flatpak_id.rsplit(".", 1)[-1], app)
+        snap_name = _snap_name(app.command_line)
+        if snap_name:
+            self._by_id.setdefault(snap_name, app)
+            self._by_id.setdefault(f"{snap_name}_{snap_name}", app)
+        steam_game = STEAM_GAME_COMMAND.search(app.command_line or "")
+        if steam_game:
+            self._by_steam_game.setdefault(steam_game.group(1), app)
+        for program in (_program(app.executable or ""), _program(app.command_line or "")):
+            if program and program not in GENERIC_EXECUTABLES and program not in ("flatpak", "env", "snap", "steam"):
+                self._by_executable.setdefault(program, app)
+                self._by_executable.setdefault(normalize_class(program), app)
+        for name in (app.name, app.display_name):
+            if name:
+                self._by_name.setdefault(name.lower(), app)
+
+    def _lookup(self, name: str):
+        if not name:
+            return None
+        lowered = name.lower()
+        normalized = normalize_class(lowered)
+        for table in (self._by_class, self._by_id, self._by_executable, self._by_name):
+            app = table.get(lowered) or table.get(normalized)
+            if app is not None:
+                return app
+        return None
+
+    def _resolve(self, window_class: str, initial_class: str, initial_title: str, executable: str):
+        for class_name in (initial_class, window_class):
+            steam_game = STEAM_GAME_CLASS.match((class_name or "").lower())
+            if steam_game:
+                app = self._by_steam_game.get(steam_game.group(1))
+                # A game is never the Steam client, even without a shortcut of its own
+                return (app_key(app) if app else f"steam:{steam_game.group(1)}", app)
+        for name in (initial_class, window_class):
+            app = self._lookup(name)
+            if app is not None:
+                return app_key(app), app
+        if executable and executable not in GENERIC_EXECUTABLES:
+            app = self._by_executable.get(executable) or self._by_executable.get(normalize_class(executable))
+            if app is not None:
+                return app_key(app), app
+        if initial_title:
+            app = self._by_name.get(initial_title.split(" - ")[0].strip().lower())
+            if app is not None:
+                return app_key(app), app
+        class_name = normalize_class(initial_class or window_class)
+        if class_name:
+            return f"class:{class_name}", None
+        title = (initial_title or "").split(" - ")[0].strip().lower()
+        return f"class:{title or 'unknown-app'}", None
+
+    def resolve_window(self, client: dict) -> Tuple[str, Optional[object]]:
+        """(canonical key, desktop app or None) for a `j/clients` entry."""
+        address = client.get("address")
+        window_class = client.get("class", "")
+        cached = self._by_address.get(address) if address else None
+        if cached is not None and cached[0] == window_class:
+            return cached[1]
+        executable = process_executable(client.get("pid"))
+        signature = (
+            window_class,
+            client.get("initialClass", ""),
+            client.get("initialTitle", client.get("title", "")),
+            executable,
+        )
+        resolved = self._by_tuple.get(signature)
+        if resolved is None:
+            resolved = self._by_tuple[signature] = self._resolve(*signature)
+        if address and window_class:
+            self._by_address[address] = (window_class, resolved)
+        return resolved
+
+    def forget_windows_except(self, addresses: Iterable[str]):
+        """Drop cached windows that are gone; pass the addresses still open."""
+        alive = set(addresses)
+        for address in [a for a in self._by_address if a not in alive]:
+            del self._by_address[address]
+
+    def resolve_pinned(self, item) -> Tuple[str, Optional[object]]:
+        """(canonical key, desktop app or None) for a pinned entry of dock.json."""
+        if isinstance(item, dict):
+            signature = tuple(item.get(k) or "" for k in ("name", "window_class", "executable", "command_line", "display_name"))
+        else:
+            signature = (str(item),)
+        resolved = self._pinned.get(signature)
+        if resolved is None:
+            resolved = self._pinned[signature] = self._resolve_pinned(item)
+        return resolved
+
+    def _resolve_pinned(self, item):
+        if not isinstance(item, dict):
+            item = {"name": str(item)}
+        # Pins are saved from desktop entries, so the entry they came from matches exactly
+        app = self._by_entry.get(((item.get("name") or "").lower(), item.get("command_line") or ""))
+        if app is None:
+            command_line = item.get("command_line") or ""
+            candidates = (
+                self._lookup(item.get("window_class")),
+                self._by_id.get(_flatpak_id(command_line) or _snap_name(command_line) or ""),
+                self._by_executable.get(_program(command_line)),
+                self._by_executable.get(_program(item.get("executable") or "")),
+                self._lookup(item.get("name")),
+                self._lookup(item.get("display_name")),
+            )
+            app = next((candidate for candidate in candidates if candidate is not None), None)
+        if app is not None:
+            return app_key(app), app
+        return f"class:{normalize_class(item.get('window_class') or item.get('name') or _program(item.get('executable') or ''))}", None
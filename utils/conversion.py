@@ -1,3 +1,10 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import NamedTuple, Optional, Protocol
+
 import requests
 
 
@@ -300,107 +307,316 @@ class Units():
             "mm2": 1e-6,
         }
 
-        # Ya no usamos currency_converter aquí.
 
+# Base dimensions every chart is expressed in. Each unit carries a vector of
+# exponents over these, so compound units ("km/h", "kWh", "m3") can be
+# compared against the plain charts ("kmph", "joule", "liter").
+BASE_DIMENSIONS = ("mass", "length", "time", "current", "information", "angle", "luminous")
+
+# chart attribute -> (exponents over BASE_DIMENSIONS, factor to the SI unit)
+CHART_DIMENSIONS: dict[str, tuple[dict[str, int], float]] = {
+    "WEIGHT_CHART": ({"mass": 1}, 1),
+    "LENGTH_CHART": ({"length": 1}, 1),
+    "TIME_CHART": ({"time": 1}, 1),
+    "LIQUID_VOLUME_CHART": ({"length": 3}, 1e-3),
+    "STORAGE_TYPE_CHART": ({"information": 1}, 1),
+    "ANGLE_CHART": ({"angle": 1}, 1),
+    "ENERGY_CHART": ({"mass": 1, "length": 2, "time": -2}, 1),
+    "SPEED_CHART": ({"length": 1, "time": -1}, 1),
+    "PRESSURE_CHART": ({"mass": 1, "length": -1, "time": -2}, 1),
+    "FORCE_CHART": ({"mass": 1, "length": 1, "time": -2}, 1),
+    "POWER_CHART": ({"mass": 1, "length": 2, "time": -3}, 1),
+    "VOLTAGE_CHART": ({"mass": 1, "length": 2, "time": -3, "current": -1}, 1),
+    "CURRENT_CHART": ({"current": 1}, 1),
+    "RESISTANCE_CHART": ({"mass": 1, "length": 2, "time": -3, "current": -2}, 1),
+    "CAPACITANCE_CHART": ({"mass": -1, "length": -2, "time": 4, "current": 2}, 1),
+    "INDUCTANCE_CHART": ({"mass": 1, "length": 2, "time": -2, "current": -2}, 1),
+    "FREQUENCY_CHART": ({"time": -1}, 1),
+    "LUMINANCE_CHART": ({"luminous": 1}, 1),
+    "AREA_CHART": ({"length": 2}, 1),
+}
+
+_POWER_SUFFIX = re.compile(r"^(.+?)\^?([23])$")
+
+
+class Unit(NamedTuple):
+    dimension: tuple[int, ...]
+    factor: float
+
+
+def _dimension(exponents: dict[str, int]) -> tuple[int, ...]:
+    return tuple(exponents.get(name, 0) for name in BASE_DIMENSIONS)
+
+
+def _combine(a: Unit, b: Unit, sign: int = 1) -> Unit:
+    dimension = tuple(x + sign * y for x, y in zip(a.dimension, b.dimension))
+    return Unit(dimension, a.factor * b.factor ** sign)
+
+
+class UnitIndex:
+    """
+    All charts of `Units` compiled into a single alias -> candidates map.
+
+    An alias can belong to several dimensions ("m" is both meter and minute),
+    so lookups return every candidate in chart order and the caller picks the
+    first pair whose dimensions agree. Compound units are resolved on demand
+    and memoized.
+    """
+
+    def __init__(self, units: Optional[Units] = None):
+        units = units or Units()
+        self.temperature = units.TEMPERATURE_CHART
+        self._aliases: dict[str, tuple[Unit, ...]] = {}
+        self._resolved: dict[str, tuple[Unit, ...]] = {}
+
+        for chart_name, (exponents, scale) in CHART_DIMENSIONS.items():
+            dimension = _dimension(exponents)
+            for alias, value in getattr(units, chart_name).items():
+                factor = value[0] if isinstance(value, tuple) else value
+                unit = Unit(dimension, factor * scale)
+                if unit not in self._aliases.get(alias, ()):
+                    self._aliases[alias] = self._aliases.get(alias, ()) + (unit,)
+
+        # Case-insensitive fallback, only where it cannot change the meaning
+        # (e.g. "mV" and "MV" both fold to "mv", so neither gets an entry).
+        folded: dict[str, set[tuple[Unit, ...]]] = {}
+        for alias, candidates in self._aliases.items():
+            folded.setdefault(alias.casefold(), set()).add(candidates)
+        self._folded = {
+            alias: next(iter(options))
+            for alias, options in folded.items()
+            if len(options) == 1
+        }
 
-class Conversion():
-    def __init__(self):
-        self.units = Units()
+    def __contains__(self, alias: str) -> bool:
+        return alias in self.temperature or bool(self.resolve(alias))
+
+    def is_simple(self, alias: str) -> bool:
+        """True for aliases listed in a chart, without compound parsing."""
+        return alias in self.temperature or bool(self._simple(alias)) or alias.casefold() in self._folded
+
+    def _simple(self, alias: str) -> tuple[Unit, ...]:
+        if alias in self._aliases:
+            return self._aliases[alias]
+        match = _POWER_SUFFIX.match(alias)
+        if match and match.group(1) in self._aliases:
+            power = int(match.group(2))
+            return tuple(
+                Unit(tuple(e * power for e in u.dimension), u.factor ** power)
+                for u in self._aliases[match.group(1)]
+            )
+        return ()
+
+    def _product(self, alias: str) -> tuple[Unit, ...]:
+        for sep in ("*", "·", "-"):
+            if sep in alias:
+                left, _, right = alias.partition(sep)
+                return self._pairs(self._product(left), self._product(right), 1)
+        if simple := self._simple(alias):
+            return simple
+        # Concatenated products of short symbols such as "kWh" or "Nm". Longer
+        # words are left alone so "liters" never reads as liter-seconds.
+        if len(alias) > 4:
+            return ()
+        for i in range(1, len(alias)):
+            left, right = self._simple(alias[:i]), self._simple(alias[i:])
+            if left and right:
+                return self._pairs(left, right, 1)
+        return ()
+
+    @staticmethod
+    def _pairs(left: tuple[Unit, ...], right: tuple[Unit, ...], sign: int) -> tuple[Unit, ...]:
+        combined: list[Unit] = []
+        for a in left:
+            for b in right:
+                unit = _combine(a, b, sign)
+                if unit not in combined:
+                    combined.append(unit)
+        return tuple(combined)
+
+    def resolve(self, alias: str) -> tuple[Unit, ...]:
+        """Return every (dimension, factor) reading of `alias`, memoized."""
+        if alias in self._resolved:
+            return self._resolved[alias]
+        if simple := self._simple(alias):
+            result = simple
+        elif "/" in alias:
+            numerator, _, denominator = alias.partition("/")
+            result = self._pairs(self._product(numerator), self._product(denominator), -1)
+        else:
+            result = self._product(alias)
+        if not result:
+            result = self._folded.get(alias.casefold(), ())
+        self._resolved[alias] = result
+        return result
 
-    def convert(self, value: float, from_type: str, to_type: str):
-        """
-        Generalized conversion function que funciona con todas las categorías,
-        incluyendo moneda via floatrates.com.
-        """
-        # Colección de todos los charts no-monedas
-        charts = {
-            "WEIGHT_CHART": self.units.WEIGHT_CHART,
-            "LENGTH_CHART": self.units.LENGTH_CHART,
-            "TEMPERATURE_CHART": self.units.TEMPERATURE_CHART,
-            "TIME_CHART": self.units.TIME_CHART,
-            "LIQUID_VOLUME_CHART": self.units.LIQUID_VOLUME_CHART,
-            "STORAGE_TYPE_CHART": self.units.STORAGE_TYPE_CHART,
-            "ANGLE_CHART": self.units.ANGLE_CHART,
-            "ENERGY_CHART": self.units.ENERGY_CHART,
-            "SPEED_CHART": self.units.SPEED_CHART,  
-            "PRESSURE_CHART": self.units.PRESSURE_CHART,
-            "FORCE_CHART": self.units.FORCE_CHART,
-            "POWER_CHART": self.units.POWER_CHART,
-            "VOLTAGE_CHART": self.units.VOLTAGE_CHART,
-            "CURRENT_CHART": self.units.CURRENT_CHART,
-            "RESISTANCE_CHART": self.units.RESISTANCE_CHART,
-            "CAPACITANCE_CHART": self.units.CAPACITANCE_CHART,
-            "INDUCTANCE_CHART": self.units.INDUCTANCE_CHART,
-            "FREQUENCY_CHART": self.units.FREQUENCY_CHART,
-            "LUMINANCE_CHART": self.units.LUMINANCE_CHART,
-            "AREA_CHART": self.units.AREA_CHART,
-        }
 
-        # 1) Revisar si está en alguno de los charts (no monedas)
-        for chart_name, chart in charts.items():
-            if from_type in chart and to_type in chart:
-                # Temperaturas usan lambdas
-                if chart_name == "TEMPERATURE_CHART":
-                    if from_type == to_type:
-                        return value
-                    to_kelvin = chart[from_type][0]
-                    from_kelvin = chart[to_type][1]
-                    return from_kelvin(to_kelvin(value))
-                
-                # Handle WEIGHT_CHART separately (tuple values)
-                if chart_name == "WEIGHT_CHART":
-                    if from_type == to_type:
-                        return value
-                    to_kg = chart[from_type][0]
-                    from_kg = chart[to_type][1]
-                    return value * to_kg * from_kg
-
-                # Cualquier otro chart numérico
-                if from_type == to_type:
-                    return value
-                return value * (chart[from_type] / chart[to_type])
-
-        # 2) Si ambos son códigos de moneda (p. ej. “USD”, “ARS”)
-        #    asumimos que están en mayúsculas y tienen 3 letras.
-        if len(from_type) == 3 and len(to_type) == 3 and from_type.isalpha() and to_type.isalpha():
-            return self._convert_currency_via_floatrates(value, from_type, to_type)
-
-        # 3) Si no cae en ningún caso, error.
-        raise ValueError(f"Unsupported conversion: {from_type} to {to_type}")
+class RatesUnavailableError(LookupError):
+    """Raised when currency rates are needed but none are loaded."""
+
+
+class RateSource(Protocol):
+    def fetch(self, base: str) -> dict[str, float]:
+        """Return how many units of each currency one unit of `base` buys."""
+        ...
+
+
+class FloatRatesSource:
+    """Daily reference rates from floatrates.com (or anything serving its JSON layout)."""
 
-    def _convert_currency_via_floatrates(self, value: float, from_code: str, to_code: str) -> float:
+    def __init__(self, url_template: str = "https://www.floatrates.com/daily/{base}.json", timeout: float = 5):
+        self.url_template = url_template
+        self.timeout = timeout
+
+    def fetch(self, base: str) -> dict[str, float]:
+        resp = requests.get(self.url_template.format(base=base.lower()), timeout=self.timeout)
+        if resp.status_code != 200:
+            raise ValueError(f"Error fetching rates for {base} (HTTP {resp.status_code})")
+        return {code.upper(): float(entry["rate"]) for code, entry in resp.json().items()}
+
+
+class CurrencyRates:
+    """
+    Cross rates for every currency, fetched against a single base at most once
+    per `ttl` seconds and persisted to `cache_path`. When the source cannot be
+    reached the last known rates keep being served, flagged as stale.
+    """
+
+    def __init__(
+        self,
+        source: Optional[RateSource] = None,
+        cache_path: Optional[str] = None,
+        ttl: float = 6 * 3600,
+        base: str = "USD",
+        retry_interval: float = 60,
+    ):
+        self.source = source or FloatRatesSource()
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.base = base.upper()
+        self.retry_interval = retry_interval
+        self._rates: dict[str, float] = {}
+        self._fetched_at = 0.0
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r") as f:
+                cached = json.load(f)
+            if cached.get("base") == self.base:
+                self._rates = {code: float(rate) for code, rate in cached["rates"].items()}
+                self._fetched_at = float(cached["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Ignoring unreadable currency cache {self.cache_path}: {e}")
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"base": self.base, "fetched_at": self._fetched_at, "rates": self._rates}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    @property
+    def fresh(self) -> bool:
+        return bool(self._rates) and time.time() - self._fetched_at < self.ttl
+
+    def refresh(self) -> bool:
+        """Fetch new rates unless they are fresh. Returns False when the source failed."""
+        with self._lock:
+            if self.fresh:
+                return True
+            if time.time() - self._failed_at < self.retry_interval:
+                return False
+            try:
+                rates = self.source.fetch(self.base)
+            except Exception as e:
+                print(f"Currency rate fetch failed: {e}")
+                self._failed_at = time.time()
+                return False
+            rates[self.base] = 1.0
+            self._rates = rates
+            self._fetched_at = time.time()
+            self._failed_at = 0.0
+            try:
+                self._save()
+            except OSError as e:
+                print(f"Could not persist currency rates: {e}")
+            return True
+
+    def rate(self, from_code: str, to_code: str, fetch: bool = True) -> tuple[float, bool]:
         """
-        Convierte usando el JSON de floatrates.com:
-        - Hace GET a https://www.floatrates.com/daily/{from_lower}.json
-        - Toma el rate de la clave to_lower y multiplica.
+        Return (rate, stale) for converting `from_code` into `to_code`.
+
+        With `fetch=False` nothing touches the network: expired or missing
+        rates raise `RatesUnavailableError` so the caller can retry off the
+        main thread.
         """
-        from_lower = from_code.lower()
-        to_lower = to_code.lower()
+        if not self.fresh:
+            if not fetch:
+                raise RatesUnavailableError("Currency rates need refreshing")
+            self.refresh()
+        rates = self._rates
+        if not rates:
+            raise RatesUnavailableError("No currency rates available")
+        from_code, to_code = from_code.upper(), to_code.upper()
+        for code in (from_code, to_code):
+            if code not in rates:
+                raise ValueError(f"Unknown currency '{code}'")
+        return rates[to_code] / rates[from_code], not self.fresh
 
-        if from_lower == to_lower:
-            return value
 
-        url = f"https://www.floatrates.com/daily/{from_lower}.json"
-        resp = requests.get(url, timeout=5)
-        if resp.status_code != 200:
-            raise ValueError(f"Error al obtener datos de floatrates para {from_code}")
+class Conversion():
+    def __init__(self, rates: Optional[CurrencyRates] = None):
+        self.units = Units()
+        self.index = UnitIndex(self.units)
+        self.rates = rates or CurrencyRates()
+
+    def convert(self, value: float, from_type: str, to_type: str, fetch: bool = True) -> float:
+        """Convert between any two units of the same dimension, or two currencies."""
+        return self._convert(value, from_type, to_type, fetch)[0]
+
+    def _convert(self, value: float, from_type: str, to_type: str, fetch: bool = True) -> tuple[float, bool]:
+        # 1) Temperatures are affine, not a plain scale factor.
+        temperature = self.index.temperature
+        if from_type in temperature and to_type in temperature:
+            if from_type == to_type:
+                return value, False
+            return temperature[to_type][1](temperature[from_type][0](value)), False
+
+        # 2) Everything else: first pair of readings with matching dimensions.
+        for source in self.index.resolve(from_type):
+            for target in self.index.resolve(to_type):
+                if source.dimension == target.dimension:
+                    if from_type == to_type:
+                        return value, False
+                    return value * (source.factor / target.factor), False
+
+        # 3) Currency codes (e.g. "USD", "ARS").
+        if self._is_currency(from_type) and self._is_currency(to_type):
+            if from_type.upper() == to_type.upper():
+                return value, False
+            rate, stale = self.rates.rate(from_type, to_type, fetch=fetch)
+            return value * rate, stale
 
-        data = resp.json()
-        if to_lower not in data:
-            raise ValueError(f"Moneda destino '{to_code}' no encontrada en la respuesta de floatrates para '{from_code}'")
+        raise ValueError(f"Unsupported conversion: {from_type} to {to_type}")
 
-        rate = data[to_lower]["rate"]
-        return value * rate
+    def _is_currency(self, code: str) -> bool:
+        return len(code) == 3 and code.isalpha() and code not in self.index
 
-    def parse_input_and_convert(self, input: str):
+    def parse_input_and_convert(self, input: str, fetch: bool = True):
         parts = input.split()
-        addition = "s" if parts[-1].endswith("s") else ""
 
-        if "and" in parts:  # valor unidad1 and valor2 unidad2 _ a unidad_destino
+        if "and" in parts:  # value unit1 and value2 unit2 _ target_unit
             parts.remove("and")
             if len(parts) != 6:
-                raise ValueError("Formato inválido. Esperado: 'value from_type and value2 from_type2 _ to_type'")
-            
+                raise ValueError("Invalid format. Expected: 'value from_type and value2 from_type2 _ to_type'")
+
             value1, from_type1, value2, from_type2, _, to_type = parts
             value1, value2 = float(value1), float(value2)
             from_type1 = self.clean_type(from_type1)
@@ -408,42 +624,53 @@ class Conversion():
             to_type = self.clean_type(to_type)
 
             if from_type1 == from_type2:
-                return self.convert(value1 + value2, from_type1, to_type), to_type + addition
+                res, stale = self._convert(value1 + value2, from_type1, to_type, fetch)
             else:
-                res = 0
-                res += self.convert(value1, from_type1, to_type)
-                res += self.convert(value2, from_type2, to_type)
-                return res, to_type + addition
+                res1, stale1 = self._convert(value1, from_type1, to_type, fetch)
+                res2, stale2 = self._convert(value2, from_type2, to_type, fetch)
+                res, stale = res1 + res2, stale1 or stale2
         else:
             if len(parts) != 4:
-                raise ValueError("Formato inválido. Esperado: 'value from_type _ to_type'")
+                raise ValueError("Invalid format. Expected: 'value from_type _ to_type'")
             value, from_type, _, to_type = parts
-            value = float(value)
             from_type = self.clean_type(from_type)
             to_type = self.clean_type(to_type)
-            return self.convert(value, from_type, to_type), to_type + addition
+            res, stale = self._convert(float(value), from_type, to_type, fetch)
+
+        # Keep the plural the user typed ("hours") on the singular unit ("hour").
+        addition = "s" if parts[-1].lower() == f"{to_type}s".lower() else ""
+        return res, to_type + addition + (" (offline rates)" if stale else "")
 
     def clean_type(self, type: str) -> str:
         """
-        Si es moneda (3 letras), lo pasa a mayúsculas. 
-        Si termina en 's' (y no es 'celsius'), le quita la 's' para 
-        las otras unidades. """
-        if len(type) == 3 and type.isalpha():
-            return type.upper()
+        Known units are returned untouched, plurals ("hours", "meters") are
+        reduced to their singular, and anything else that looks like a
+        three-letter code is treated as a currency.
+        """
+        if len(type) == 3 and type.isalpha() and type.isupper():
+            return type
+        if self.index.is_simple(type):
+            return type
         if type.endswith("s") and type.lower() != "celsius":
-            # Para las tablas que tienen singular/plural
-            singular = type[:-1].lower()
-            # Si existe en STORAGE_TYPE_CHART, lo usamos; 
-            # si no, devolvemos singular en minúsculas para otros charts.
-            if singular in self.units.STORAGE_TYPE_CHART:
+            singular = type[:-1]
+            if self.index.is_simple(singular):
                 return singular
-            return singular.lower()
+            if self.index.is_simple(singular.lower()):
+                return singular.lower()
+        if type in self.index:
+            return type
+        if len(type) == 3 and type.isalpha():
+            return type.upper()
         return type
 
 
-# Ejemplo rápido de uso:
 if __name__ == "__main__":
     conv = Conversion()
-    # Convierte 10 USD a ARS:
-    result, suffix = conv.parse_input_and_convert("10 USD _ ARS")
-    print(f"{result:.2f} {suffix}")  # Ej: "10 USD _ ARS" -> "38754.23 ARS"
+    for expr in ("10 km/h _ mps", "3 kWh _ kj", "2 m3 _ liters", "90 minutes _ hours"):
+        result, suffix = conv.parse_input_and_convert(expr)
+        print(f"{expr} -> {result:.4g} {suffix}")
+
+    start = time.perf_counter()
+    for _ in range(100_000):
+        conv.convert(12.5, "km/h", "mph")
+    print(f"convert(): {(time.perf_counter() - start) * 10:.2f} µs per call")
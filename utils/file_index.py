@@ -0,0 +1,565 @@
+"""
+Persistent file-name index used by the launcher's file search.
+
+The index stores every path component once: directories are (parent, name)
+pairs and files are (directory, name) pairs, all referring into a single
+interned name table. It is kept current by inotify watches on exactly the
+directories in the index (hidden and excluded trees get none), and a
+periodic pass that re-lists only directories whose mtime changed catches
+anything the watches missed or that happened while the shell was not
+running.
+
+Queries never scan every path: a trigram index over the casefolded names
+narrows substring queries to a handful of candidates, and a per-name letter
+mask does the same for fuzzy (in-order characters) queries. Both are built
+with numpy in the background and names added since the last build are
+checked directly until the next one.
+"""
+
+import array
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from watchdog.observers.inotify_c import Inotify, InotifyConstants
+
+INDEX_MAGIC = b"AWFIDX1\n"
+DELETED = 0xFFFFFFFF
+ROOT_PARENT = -1
+DELETED_PARENT = -2
+FUZZY_CHECK_LIMIT = 5000
+DEFAULT_EXCLUDES = frozenset({"node_modules", "__pycache__", "venv", "site-packages"})
+WATCH_MASK = (
+    InotifyConstants.IN_CREATE
+    | InotifyConstants.IN_DELETE
+    | InotifyConstants.IN_MOVED_FROM
+    | InotifyConstants.IN_MOVED_TO
+)
+
+
+class _NameTrigrams:
+    """Trigram postings and letter masks for a snapshot of the name table."""
+
+    def __init__(self, names: List[str]):
+        self.size = len(names)
+        if not names:
+            self.codes = self.starts = self.ids = self.masks = np.zeros(0, dtype=np.uint32)
+            return
+        blob = ("\n".join(n.casefold().replace("\n", " ") for n in names) + "\n").encode("utf-8", "surrogateescape")
+        data = np.frombuffer(blob, dtype=np.uint8)
+        ends = np.flatnonzero(data == 10)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        owner = np.repeat(np.arange(self.size, dtype=np.uint64), ends - starts + 1)
+
+        wide = data.astype(np.uint64)
+        codes = (wide[:-2] << 16) | (wide[1:-1] << 8) | wide[2:]
+        valid = (data[:-2] != 10) & (data[1:-1] != 10) & (data[2:] != 10)
+        # Sorted, de-duplicated (trigram, name id) pairs. Sorting and masking
+        # by hand is an order of magnitude faster than np.unique here.
+        keys = (codes[valid] << 32) | owner[:-2][valid]
+        keys.sort()
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        self.ids = (keys & 0xFFFFFFFF).astype(np.uint32)
+        trigram = (keys >> 32).astype(np.uint32)
+        self.starts = np.flatnonzero(np.concatenate(([True], trigram[1:] != trigram[:-1])))
+        self.codes = trigram[self.starts]
+
+        bits = np.left_shift(np.uint32(1), (data & 31).astype(np.uint32))
+        bits[data == 10] = 0
+        self.masks = np.bitwise_or.reduceat(bits, starts)
+
+    @staticmethod
+    def mask(query: bytes) -> int:
+        mask = 0
+        for byte in query:
+            mask |= 1 << (byte & 31)
+        return mask
+
+    def _postings(self, code: int) -> np.ndarray:
+        i = int(np.searchsorted(self.codes, code))
+        if i == len(self.codes) or self.codes[i] != code:
+            return self.ids[:0]
+        end = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.ids)
+        return self.ids[self.starts[i]:end]
+
+    def substring_candidates(self, query: bytes) -> np.ndarray:
+        """Sorted ids of names containing every trigram of `query` (len >= 3)."""
+        postings = sorted(
+            (self._postings((query[i] << 16) | (query[i + 1] << 8) | query[i + 2]) for i in range(len(query) - 2)),
+            key=len,
+        )
+        result = postings[0]
+        for other in postings[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def fuzzy_candidates(self, query: bytes) -> np.ndarray:
+        mask = np.uint32(self.mask(query))
+        return np.flatnonzero((self.masks & mask) == mask)
+
+
+def _iter_ids(ids: np.ndarray, chunk: int = 1024):
+    """Iterate a numpy id array without converting all of it to Python ints up front."""
+    for start in range(0, len(ids), chunk):
+        yield from ids[start:start + chunk].tolist()
+
+
+class _DirectoryWatcher:
+    """
+    One inotify instance with a watch on each directory handed to `add()`.
+
+    A recursive watch on a root would also cover every hidden, cache and
+    excluded tree below it, which the index never reads, and quickly use up
+    `max_user_watches` in a large home. Watches of deleted directories are
+    dropped by the kernel; ones that left the index otherwise only cost a
+    watch until restart.
+    """
+
+    def __init__(self, index: "FileIndex", paths: List[str]):
+        self.index = index
+        self._warned = False
+        self._inotify = Inotify(os.fsencode(paths[0]), event_mask=WATCH_MASK)
+        for path in paths[1:]:
+            self.add(path)
+        threading.Thread(target=self._run, name="file-index-watch", daemon=True).start()
+
+    def add(self, path: str) -> None:
+        try:
+            self._inotify.add_watch(os.fsencode(path))
+        except OSError as e:
+            # Usually the inotify watch limit; reconciliation still keeps up.
+            if not self._warned:
+                self._warned = True
+                print(f"Not watching every directory of the file index: {e}")
+
+    def _run(self):
+        while True:
+            for event in self._inotify.read_events():
+                if not event.is_ignored:
+                    self.index.invalidate(os.path.dirname(os.fsdecode(event.src_path)))
+
+
+class FileIndex:
+    """
+    Index of the files under `roots`, persisted to `index_path`.
+
+    Call `start()` once; loading, the initial walk, watching and periodic
+    reconciliation all happen on a background thread. `search()` is safe to
+    call from any thread and returns nothing until the index is loaded.
+    """
+
+    _instances: Dict[tuple, "FileIndex"] = {}
+
+    @classmethod
+    def shared(cls, roots: Iterable[str], index_path: str) -> "FileIndex":
+        """One index per configuration, shared by the launchers on every monitor."""
+        key = (tuple(roots), index_path)
+        if key not in cls._instances:
+            cls._instances[key] = cls(roots, index_path)
+        return cls._instances[key]
+
+    def __init__(
+        self,
+        roots: Iterable[str],
+        index_path: str,
+        excludes: Iterable[str] = DEFAULT_EXCLUDES,
+        include_hidden: bool = False,
+        reconcile_interval: float = 600,
+        save_interval: float = 60,
+    ):
+        roots = sorted({os.path.realpath(os.path.expanduser(r)) for r in roots})
+        # Nested roots would index the same files twice.
+        self.roots = [r for r in roots if not any(r.startswith(o + os.sep) for o in roots if o != r)]
+        self.index_path = index_path
+        self.excludes = frozenset(excludes)
+        self.include_hidden = include_hidden
+        self.reconcile_interval = reconcile_interval
+        self.save_interval = save_interval
+
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._pending_dirs: Set[str] = set()
+        self._started = False
+        self._ready = False
+        self._dirty = False
+        self._saved_at = 0.0
+        self._watcher: Optional[_DirectoryWatcher] = None
+        self._trigrams: Optional[_NameTrigrams] = None
+        self._reset()
+
+    # Storage
+
+    def _reset(self):
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self._dir_parent = array.array("i")
+        self._dir_name = array.array("I")
+        self._dir_mtime = array.array("d")
+        self._file_dir = array.array("I")
+        self._file_name = array.array("I")
+        self._derive()
+
+    def _derive(self):
+        """Rebuild the in-memory lookup tables that are not persisted."""
+        self._dir_paths: List[Optional[str]] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._dir_children: Dict[int, Set[int]] = {}
+        self._dir_files: Dict[int, Dict[int, int]] = {}
+        self._files_by_name: Dict[int, List[int]] = {}
+
+        for dir_id, parent in enumerate(self._dir_parent):
+            if parent == DELETED_PARENT:
+                self._dir_paths.append(None)
+                continue
+            name = self._names[self._dir_name[dir_id]]
+            path = name if parent == ROOT_PARENT else os.path.join(self._dir_paths[parent], name)
+            self._dir_paths.append(path)
+            self._dir_ids[path] = dir_id
+            if parent != ROOT_PARENT:
+                self._dir_children.setdefault(parent, set()).add(dir_id)
+
+        for file_id, dir_id in enumerate(self._file_dir):
+            if dir_id == DELETED:
+                continue
+            name_id = self._file_name[file_id]
+            self._dir_files.setdefault(dir_id, {})[name_id] = file_id
+            self._files_by_name.setdefault(name_id, []).append(file_id)
+
+    def _intern(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def _add_dir(self, parent: int, name: str) -> int:
+        dir_id = len(self._dir_parent)
+        path = name if parent == ROOT_PARENT else os.path.join(self._dir_paths[parent], name)
+        self._dir_parent.append(parent)
+        self._dir_name.append(self._intern(name))
+        self._dir_mtime.append(0.0)
+        self._dir_paths.append(path)
+        self._dir_ids[path] = dir_id
+        if parent != ROOT_PARENT:
+            self._dir_children.setdefault(parent, set()).add(dir_id)
+        if self._watcher is not None:
+            # Watched before it is listed, so nothing created meanwhile is missed
+            self._watcher.add(path)
+        self._dirty = True
+        return dir_id
+
+    def _add_file(self, dir_id: int, name: str) -> None:
+        name_id = self._intern(name)
+        file_id = len(self._file_dir)
+        self._file_dir.append(dir_id)
+        self._file_name.append(name_id)
+        self._dir_files.setdefault(dir_id, {})[name_id] = file_id
+        self._files_by_name.setdefault(name_id, []).append(file_id)
+        self._dirty = True
+
+    def _remove_file(self, file_id: int) -> None:
+        name_id = self._file_name[file_id]
+        self._file_dir[file_id] = DELETED
+        self._files_by_name[name_id].remove(file_id)
+        self._dirty = True
+
+    def _remove_dir(self, dir_id: int) -> None:
+        for file_id in self._dir_files.pop(dir_id, {}).values():
+            self._remove_file(file_id)
+        for child in list(self._dir_children.pop(dir_id, ())):
+            self._remove_dir(child)
+        parent = self._dir_parent[dir_id]
+        if parent >= 0:
+            self._dir_children.get(parent, set()).discard(dir_id)
+        self._dir_ids.pop(self._dir_paths[dir_id], None)
+        self._dir_paths[dir_id] = None
+        self._dir_parent[dir_id] = DELETED_PARENT
+        self._dirty = True
+
+    # Walking
+
+    def _wanted(self, name: str) -> bool:
+        if not self.include_hidden and name.startswith("."):
+            return False
+        return name not in self.excludes
+
+    def _rescan(self, dir_id: int) -> List[int]:
+        """Re-list one directory, apply the differences and return any new subdirectories."""
+        path = self._dir_paths[dir_id]
+        if path is None:
+            return []
+        try:
+            mtime = os.stat(path).st_mtime
+            with os.scandir(path) as it:
+                entries = [(e.name, e.is_dir(follow_symlinks=False)) for e in it if self._wanted(e.name)]
+        except OSError:
+            with self._lock:
+                if self._dir_parent[dir_id] >= 0:
+                    self._remove_dir(dir_id)
+            return []
+
+        with self._lock:
+            files = self._dir_files.get(dir_id, {})
+            subdirs = {self._dir_name[c]: c for c in self._dir_children.get(dir_id, ())}
+            seen_dirs, new_dirs = set(), []
+            for name, is_dir in entries:
+                name_id = self._name_ids.get(name)
+                if is_dir:
+                    if name_id in subdirs:
+                        seen_dirs.add(name_id)
+                    else:
+                        new_dirs.append(self._add_dir(dir_id, name))
+                elif name_id not in files:
+                    self._add_file(dir_id, name)
+            current_files = {self._name_ids[name] for name, is_dir in entries if not is_dir}
+            for name_id, file_id in list(files.items()):
+                if name_id not in current_files:
+                    del files[name_id]
+                    self._remove_file(file_id)
+            for name_id, child in subdirs.items():
+                if name_id not in seen_dirs:
+                    self._remove_dir(child)
+            if self._dir_mtime[dir_id] != mtime:
+                self._dir_mtime[dir_id] = mtime
+                self._dirty = True
+        return new_dirs
+
+    def _walk(self, dir_ids: List[int]) -> None:
+        stack = list(dir_ids)
+        while stack:
+            stack.extend(self._rescan(stack.pop()))
+
+    def build(self) -> None:
+        """Index every root from scratch."""
+        with self._lock:
+            self._reset()
+            roots = [self._add_dir(ROOT_PARENT, root) for root in self.roots if os.path.isdir(root)]
+        self._walk(roots)
+
+    def reconcile(self) -> None:
+        """Re-list only the directories whose mtime no longer matches the index."""
+        with self._lock:
+            roots = [d for d, p in enumerate(self._dir_parent) if p == ROOT_PARENT]
+        stack = roots
+        while stack:
+            dir_id = stack.pop()
+            path = self._dir_paths[dir_id]
+            if path is None:
+                continue
+            try:
+                changed = os.stat(path).st_mtime != self._dir_mtime[dir_id]
+            except OSError:
+                changed = True
+            if changed:
+                self._walk(self._rescan(dir_id))
+            stack.extend(self._dir_children.get(dir_id, ()))
+
+    def invalidate(self, dir_path: str) -> None:
+        """Queue a directory for re-listing; called from the watch thread."""
+        with self._lock:
+            self._pending_dirs.add(dir_path)
+        self._wakeup.set()
+
+    # Persistence
+
+    def save(self) -> None:
+        """Write a compacted copy of the index: deleted entries and unused names are dropped."""
+        with self._lock:
+            dir_map, name_map, names = {}, {}, []
+
+            def name_ref(name_id):
+                if name_id not in name_map:
+                    name_map[name_id] = len(names)
+                    names.append(self._names[name_id])
+                return name_map[name_id]
+
+            dir_parent, dir_name, dir_mtime = array.array("i"), array.array("I"), array.array("d")
+            for dir_id, parent in enumerate(self._dir_parent):
+                if parent == DELETED_PARENT:
+                    continue
+                dir_map[dir_id] = len(dir_parent)
+                dir_parent.append(parent if parent == ROOT_PARENT else dir_map[parent])
+                dir_name.append(name_ref(self._dir_name[dir_id]))
+                dir_mtime.append(self._dir_mtime[dir_id])
+
+            file_dir, file_name = array.array("I"), array.array("I")
+            for file_id, dir_id in enumerate(self._file_dir):
+                if dir_id == DELETED:
+                    continue
+                file_dir.append(dir_map[dir_id])
+                file_name.append(name_ref(self._file_name[file_id]))
+            self._dirty = False
+
+        blob = "\0".join(names).encode("utf-8", "surrogateescape")
+        header = {
+            "roots": self.roots,
+            "byteorder": sys.byteorder,
+            "names": len(names),
+            "names_bytes": len(blob),
+            "dirs": len(dir_parent),
+            "files": len(file_dir),
+        }
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(blob)
+            for arr in (dir_parent, dir_name, dir_mtime, file_dir, file_name):
+                arr.tofile(f)
+        os.replace(tmp_path, self.index_path)
+        self._saved_at = time.monotonic()
+
+    def load(self) -> bool:
+        """Load the index from disk. Returns False if it is missing, corrupt or for other roots."""
+        try:
+            with open(self.index_path, "rb") as f:
+                if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return False
+                header = json.loads(f.readline())
+                if header["roots"] != self.roots or header["byteorder"] != sys.byteorder:
+                    return False
+                blob = f.read(header["names_bytes"])
+                names = blob.decode("utf-8", "surrogateescape").split("\0") if header["names"] else []
+                arrays = []
+                for typecode, count in (("i", "dirs"), ("I", "dirs"), ("d", "dirs"), ("I", "files"), ("I", "files")):
+                    arr = array.array(typecode)
+                    arr.fromfile(f, header[count])
+                    arrays.append(arr)
+        except (OSError, EOFError, ValueError, KeyError) as e:
+            print(f"Rebuilding file index: {e}")
+            return False
+
+        with self._lock:
+            self._names = names
+            self._name_ids = {name: i for i, name in enumerate(names)}
+            self._dir_parent, self._dir_name, self._dir_mtime, self._file_dir, self._file_name = arrays
+            self._derive()
+            self._dirty = False
+        return True
+
+    # Background maintenance
+
+    def start(self) -> None:
+        if self._started or not self.roots:
+            return
+        self._started = True
+        threading.Thread(target=self._run, name="file-index", daemon=True).start()
+
+    def _run(self):
+        if self.load():
+            self._refresh_trigrams()
+            self._ready = True
+            self.reconcile()
+        else:
+            self.build()
+            self._refresh_trigrams()
+            self._ready = True
+        self.save()
+        self._watch()
+
+        last_reconcile = time.monotonic()
+        while True:
+            self._wakeup.wait(timeout=self.reconcile_interval)
+            if self._wakeup.is_set():
+                # Let bursts (archive extraction, builds) settle into one pass.
+                time.sleep(0.5)
+                self._wakeup.clear()
+            with self._lock:
+                pending, self._pending_dirs = self._pending_dirs, set()
+            for path in pending:
+                with self._lock:
+                    dir_id = self._dir_ids.get(path)
+                if dir_id is not None:
+                    self._walk(self._rescan(dir_id))
+            if time.monotonic() - last_reconcile >= self.reconcile_interval:
+                self.reconcile()
+                last_reconcile = time.monotonic()
+            self._refresh_trigrams()
+            if self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+                try:
+                    self.save()
+                except OSError as e:
+                    print(f"Could not save file index: {e}")
+
+    def _watch(self):
+        with self._lock:
+            paths = [path for path in self._dir_paths if path is not None]
+        if not paths:
+            return
+        try:
+            self._watcher = _DirectoryWatcher(self, paths)
+        except OSError as e:
+            print(f"Not watching the file index: {e}")
+
+    # Queries
+
+    def _refresh_trigrams(self) -> None:
+        """Rebuild the trigram index once enough names were added since the last build."""
+        if self._trigrams is not None:
+            added = len(self._names) - self._trigrams.size
+            if added < max(20000, self._trigrams.size // 20):
+                return
+        with self._lock:
+            names = self._names[:]
+        self._trigrams = _NameTrigrams(names)
+
+    def search(self, query: str, limit: int = 50, stopped: Callable[[], bool] = lambda: False) -> List[str]:
+        """
+        Paths of files whose name matches `query`: name prefixes first, then
+        substrings, then names containing the query's characters in order.
+        """
+        q = query.casefold()
+        if not self._ready or not q:
+            return []
+        q_bytes = q.encode("utf-8", "surrogateescape")
+        names = self._names
+        trigrams = self._trigrams
+        indexed = trigrams.size if trigrams else 0
+        tail = range(indexed, len(names))
+
+        prefix, substring = [], []
+        if trigrams and len(q_bytes) >= 3:
+            candidates = [_iter_ids(trigrams.substring_candidates(q_bytes)), tail]
+        else:
+            candidates = [range(len(names))]
+        for ids in candidates:
+            for name_id in ids:
+                name = names[name_id].casefold()
+                if name.startswith(q):
+                    prefix.append(name_id)
+                elif q in name:
+                    substring.append(name_id)
+                if len(prefix) >= limit or len(prefix) + len(substring) >= 4 * limit or stopped():
+                    break
+
+        fuzzy = []
+        if len(prefix) + len(substring) < limit and not stopped():
+            matched = set(prefix) | set(substring)
+            pattern = re.compile("".join(f"{re.escape(c)}.*?" for c in q), re.DOTALL)
+            ids = [_iter_ids(trigrams.fuzzy_candidates(q_bytes)), tail] if trigrams else [range(len(names))]
+            # Best effort: the letter mask cannot tell "zz" from "z", so cap
+            # how many candidates are checked to keep the query bounded.
+            for checked, name_id in enumerate(i for chunk in ids for i in chunk):
+                if name_id not in matched and pattern.search(names[name_id].casefold()):
+                    fuzzy.append(name_id)
+                    if len(prefix) + len(substring) + len(fuzzy) >= limit:
+                        break
+                if checked >= FUZZY_CHECK_LIMIT or stopped():
+                    break
+
+        paths: List[str] = []
+        with self._lock:
+            for name_id in prefix + substring + fuzzy:
+                for file_id in self._files_by_name.get(name_id, ()):
+                    paths.append(os.path.join(self._dir_paths[self._file_dir[file_id]], self._names[name_id]))
+                if len(paths) >= limit:
+                    break
+        return paths[:limit]
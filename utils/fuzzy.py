@@ -0,0 +1,22 @@
+import re
+
+
+def fuzzy_score(query: str, text: str) -> int:
+    """Relevance of `text` for an already casefolded `query`. 0 means no match."""
+    text = (text or "").casefold()
+    if not query or not text:
+        return 0
+    if text == query:
+        return 10000
+    if text.startswith(query):
+        return 8000 - len(text)
+    for i, word in enumerate(re.split(r"[\s\-_./]+", text)):
+        if word.startswith(query):
+            return 6000 - (i * 100) - len(text)
+    pos = text.find(query)
+    if pos != -1:
+        return 4000 - pos - len(text)
+    it = iter(text)
+    if all(c in it for c in query):
+        return 1000
+    return 0
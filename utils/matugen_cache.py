@@ -0,0 +1,264 @@
+"""
+Rendered matugen output, cached per (wallpaper content, scheme, mode).
+
+A plain `matugen image` run re-extracts the palette and rewrites every
+template, after which the post hooks reload the whole stylesheet. Here
+matugen instead renders into a private copy of the user's matugen config
+whose template outputs point into a cache entry. Applying a combination that
+was rendered before then only copies a few small files into place and runs
+the post hooks of the templates whose output actually changed.
+
+Entries are grouped under a fingerprint of the config and template sources,
+so editing a template invalidates everything rendered from the old one.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import toml
+
+from utils.thumbnails import content_hash, file_signature
+
+MATUGEN_CONFIG = os.path.expanduser("~/.config/matugen/config.toml")
+MAX_ENTRIES = 64  # per fingerprint; an entry is a few KB
+STALE_RENDER_AGE = 600  # s before an abandoned render directory is removed
+
+
+class MatugenCache:
+    """Background matugen renders and the entries they leave behind."""
+
+    _instances: Dict[str, "MatugenCache"] = {}
+
+    @classmethod
+    def shared(cls, cache_dir: str) -> "MatugenCache":
+        if cache_dir not in cls._instances:
+            cls._instances[cache_dir] = cls(cache_dir)
+        return cls._instances[cache_dir]
+
+    def __init__(self, cache_dir: str, config_path: str = MATUGEN_CONFIG):
+        self.cache_dir = cache_dir
+        self.config_path = config_path
+        self._lock = threading.Lock()
+        self._digests: Dict[str, str] = {}  # file signature -> content hash
+        self._jobs: Dict[Tuple[str, str, str], Future] = {}
+        self._prefetches: Dict[Tuple[str, str, str], Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="matugen")
+        self._config: dict = {}
+        self._config_signature: Optional[str] = None
+        self._stamp: Optional[tuple] = None
+        self._fingerprint = ""
+
+    def _refresh_config(self) -> str:
+        """Re-read the matugen config when it or a template changed; returns its fingerprint."""
+        with self._lock:
+            try:
+                config_signature = file_signature(os.stat(self.config_path))
+            except OSError:
+                config_signature = ""
+            if config_signature != self._config_signature:
+                try:
+                    self._config = toml.load(self.config_path)
+                except (OSError, toml.TomlDecodeError) as e:
+                    print(f"Error reading matugen config {self.config_path}: {e}")
+                    self._config = {}
+                self._config_signature = config_signature
+            inputs = [
+                os.path.expanduser(template.get("input_path", ""))
+                for template in self._config.get("templates", {}).values()
+            ]
+            stamp = [config_signature]
+            for path in inputs:
+                try:
+                    stamp.append(file_signature(os.stat(path)))
+                except OSError:
+                    stamp.append("")
+            if tuple(stamp) != self._stamp:
+                digest = hashlib.blake2b(digest_size=8)
+                digest.update(json.dumps(self._config, sort_keys=True, default=str).encode())
+                for path in inputs:
+                    with suppress(OSError), open(path, "rb") as f:
+                        digest.update(f.read())
+                self._fingerprint = digest.hexdigest()
+                self._stamp = tuple(stamp)
+            return self._fingerprint
+
+    def _entry_path(self, fingerprint: str, digest: str, scheme: str, mode: str) -> str:
+        return os.path.join(self.cache_dir, fingerprint, f"{digest}-{scheme}-{mode}")
+
+    def cached_entry(self, path: str, scheme: str, mode: str) -> Optional[str]:
+        """The rendered entry for this combination if it is known, without reading the image."""
+        try:
+            signature = file_signature(os.stat(path))
+        except OSError:
+            return None
+        digest = self._digests.get(signature)
+        if digest is None:
+            return None
+        entry = self._entry_path(self._refresh_config(), digest, scheme, mode)
+        return entry if os.path.isdir(entry) else None
+
+    def render(self, path: str, scheme: str, mode: str) -> "Future[str]":
+        """
+        Render (or find) the entry for this combination; resolves to its
+        directory. Queued prefetches are dropped so this runs next.
+        """
+        key = (path, scheme, mode)
+        with self._lock:
+            job = self._jobs.get(key)
+            dropped = [future for other, future in self._prefetches.items() if other != key]
+            self._prefetches.clear()
+            if job is None:
+                job = self._submit(key)
+        # Outside the lock: cancelling runs the jobs' done callbacks right here
+        for future in dropped:
+            future.cancel()
+        return job
+
+    def prefetch(self, requests: Iterable[Tuple[str, str, str]]):
+        """Replace the queued speculative renders with `requests` (path, scheme, mode)."""
+        wanted = [key for key in requests if self.cached_entry(*key) is None]
+        with self._lock:
+            dropped = [future for key, future in self._prefetches.items() if key not in wanted]
+            self._prefetches = {key: future for key, future in self._prefetches.items() if key in wanted}
+            for key in wanted:
+                # Jobs already queued, speculative or not, are left as they are
+                if key not in self._jobs:
+                    self._prefetches[key] = self._submit(key)
+        for future in dropped:
+            future.cancel()
+
+    def _submit(self, key: Tuple[str, str, str]) -> "Future[str]":
+        job = self._executor.submit(self._render, *key)
+        self._jobs[key] = job
+        job.add_done_callback(lambda f: self._finish(key, f))
+        return job
+
+    def _finish(self, key: Tuple[str, str, str], job: "Future[str]"):
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+            if self._prefetches.get(key) is job:
+                del self._prefetches[key]
+
+    def _render(self, path: str, scheme: str, mode: str) -> str:
+        signature = file_signature(os.stat(path))
+        digest = self._digests.get(signature)
+        if digest is None:
+            digest = self._digests[signature] = content_hash(path)
+        fingerprint = self._refresh_config()
+        entry = self._entry_path(fingerprint, digest, scheme, mode)
+        if os.path.isdir(entry):
+            os.utime(entry)
+            return entry
+
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".render-", dir=os.path.dirname(entry))
+        try:
+            config_path = os.path.join(tmp_dir, "config.toml")
+            with open(config_path, "w") as f:
+                toml.dump(self._render_config(os.path.join(tmp_dir, "templates")), f)
+            result = subprocess.run(
+                ["matugen", "image", path, "-t", scheme, "-m", mode, "-c", config_path, "--json", "hex"],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            with open(os.path.join(tmp_dir, "palette.json"), "w") as f:
+                f.write(result.stdout)
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump({"image": path, "scheme": scheme, "mode": mode}, f)
+            os.remove(config_path)
+            os.rename(tmp_dir, entry)
+        except OSError:
+            # Another render of the same content may have finished first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._prune(fingerprint)
+        return entry
+
+    def _render_config(self, output_dir: str) -> dict:
+        """The user's matugen config, writing into `output_dir` and with every side effect off."""
+        with self._lock:
+            config = copy.deepcopy(self._config)
+        settings = config.setdefault("config", {})
+        settings["reload_apps"] = False
+        if isinstance(settings.get("wallpaper"), dict):
+            settings["wallpaper"]["set"] = False
+        for name, template in config.get("templates", {}).items():
+            template["output_path"] = os.path.join(output_dir, name)
+            template.pop("pre_hook", None)
+            template.pop("post_hook", None)
+        return config
+
+    def install(self, entry: str, image_path: str) -> List[str]:
+        """
+        Copy a rendered entry's outputs into place. Returns the shell commands
+        matugen would have run afterwards: setting the wallpaper and the post
+        hooks of templates whose output changed.
+        """
+        with open(os.path.join(entry, "meta.json"), "r") as f:
+            rendered_for = json.load(f)["image"]
+        self._refresh_config()
+        with self._lock:
+            config = self._config
+        commands = []
+        wallpaper = config.get("config", {}).get("wallpaper", {})
+        if wallpaper.get("set") and wallpaper.get("command"):
+            commands.append(shlex.join([wallpaper["command"], *wallpaper.get("arguments", []), image_path]))
+        for name, template in config.get("templates", {}).items():
+            try:
+                with open(os.path.join(entry, "templates", name), "rb") as f:
+                    content = f.read()
+            except OSError:
+                continue
+            # Entries are shared by files with the same content; templates may embed the path
+            if rendered_for != image_path:
+                content = content.replace(rendered_for.encode(), image_path.encode())
+            target = os.path.expanduser(template["output_path"])
+            with suppress(OSError), open(target, "rb") as f:
+                if f.read() == content:
+                    continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, target)
+            if template.get("post_hook"):
+                commands.append(template["post_hook"])
+        os.utime(entry)
+        return commands
+
+    def _prune(self, fingerprint: str):
+        """Drop entries of old fingerprints, abandoned renders and the least recently used."""
+        with suppress(OSError), os.scandir(self.cache_dir) as groups:
+            for group in groups:
+                if group.is_dir() and group.name != fingerprint:
+                    shutil.rmtree(group.path, ignore_errors=True)
+        entries = []
+        now = time.time()
+        with suppress(OSError), os.scandir(os.path.join(self.cache_dir, fingerprint)) as scan:
+            for entry in scan:
+                mtime = entry.stat().st_mtime
+                if entry.name.startswith(".render-"):
+                    if now - mtime > STALE_RENDER_AGE:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    continue
+                entries.append((mtime, entry.path))
+        entries.sort()
+        for _, path in entries[:-MAX_ENTRIES]:
+            shutil.rmtree(path, ignore_errors=True)
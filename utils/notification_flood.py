@@ -0,0 +1,161 @@
+"""
+Admission control between the notification server and the popups.
+
+Every app gets a token bucket, and so do all apps together. A notification
+that finds tokens in both is shown right away; the rest wait in a bounded
+queue that the popup drains as tokens come back. While an entry waits,
+repeats of it (same app and summary) and `replaces_id` updates (same id)
+fold into it instead of taking another slot. When the queue is full the
+oldest entry is given up to `on_overflow`, which sends it to the history.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+APP_RATE = 2.0  # popups per second per app, once its burst is spent
+APP_BURST = 4
+TOTAL_RATE = 5.0  # popups per second across all apps
+TOTAL_BURST = 8
+QUEUE_LIMIT = 64
+MAX_BUCKETS = 256
+
+
+def coalesce_key(notification) -> Tuple[str, str]:
+    return (notification.app_name or "", notification.summary or "")
+
+
+@dataclass(slots=True)
+class Arrival:
+    """A notification on its way to a popup, standing for `count` that arrived."""
+
+    notification: object
+    count: int = 1
+    superseded: List[object] = field(default_factory=list)  # folded into this one; closed when it is shown
+
+    def fold(self, notification, count: int = 1):
+        self.superseded.append(self.notification)
+        self.notification = notification
+        # A replacement is the same notification, a repeat is one more of them
+        if notification.id != self.superseded[-1].id:
+            self.count += count
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = now
+
+    def refill(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return self.tokens
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available."""
+        return max(0.0, (1 - self.refill(now)) / self.rate)
+
+
+class NotificationFloodGate:
+    def __init__(
+        self,
+        on_overflow: Callable[[Arrival], None],
+        app_rate: float = APP_RATE,
+        app_burst: int = APP_BURST,
+        total_rate: float = TOTAL_RATE,
+        total_burst: int = TOTAL_BURST,
+        queue_limit: int = QUEUE_LIMIT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.on_overflow = on_overflow
+        self.app_rate = app_rate
+        self.app_burst = app_burst
+        self.queue_limit = queue_limit
+        self.clock = clock
+        self._total = _Bucket(total_rate, total_burst, clock())
+        self._apps: Dict[str, _Bucket] = {}
+        self._queue: "OrderedDict[int, Arrival]" = OrderedDict()  # by arrival order
+        self._by_key: Dict[Tuple[str, str], int] = {}
+        self._by_id: Dict[object, int] = {}
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _bucket(self, app_name: str, now: float) -> _Bucket:
+        bucket = self._apps.get(app_name)
+        if bucket is None:
+            if len(self._apps) >= MAX_BUCKETS:
+                # Full buckets carry no state worth keeping
+                for name in [n for n, b in self._apps.items() if b.refill(now) >= b.burst]:
+                    del self._apps[name]
+            bucket = self._apps[app_name] = _Bucket(self.app_rate, self.app_burst, now)
+        return bucket
+
+    def _take(self, app_name: str, now: float) -> bool:
+        bucket = self._bucket(app_name, now)
+        if bucket.refill(now) < 1 or self._total.refill(now) < 1:
+            return False
+        bucket.tokens -= 1
+        self._total.tokens -= 1
+        return True
+
+    def _index(self, seq: int, arrival: Arrival):
+        self._by_key[coalesce_key(arrival.notification)] = seq
+        self._by_id[arrival.notification.id] = seq
+
+    def _unindex(self, seq: int, arrival: Arrival):
+        if self._by_key.get(coalesce_key(arrival.notification)) == seq:
+            del self._by_key[coalesce_key(arrival.notification)]
+        if self._by_id.get(arrival.notification.id) == seq:
+            del self._by_id[arrival.notification.id]
+
+    def _pop(self, seq: int) -> Arrival:
+        arrival = self._queue.pop(seq)
+        self._unindex(seq, arrival)
+        return arrival
+
+    def offer(self, notification) -> Optional[Arrival]:
+        """The arrival to show now, or None if it was queued or folded into a queued one."""
+        seq = self._by_id.get(notification.id, self._by_key.get(coalesce_key(notification)))
+        if seq is not None:
+            arrival = self._queue[seq]
+            self._unindex(seq, arrival)
+            arrival.fold(notification)
+            self._index(seq, arrival)
+            return None
+        app_name = notification.app_name or ""
+        # Only an app's own backlog holds it back, as long as there are tokens
+        waiting = any((a.notification.app_name or "") == app_name for a in self._queue.values())
+        if not waiting and self._take(app_name, self.clock()):
+            return Arrival(notification)
+        while len(self._queue) >= self.queue_limit:
+            self.on_overflow(self._pop(next(iter(self._queue))))
+        self._sequence += 1
+        arrival = self._queue[self._sequence] = Arrival(notification)
+        self._index(self._sequence, arrival)
+        return None
+
+    def drain(self) -> List[Arrival]:
+        """Queued arrivals whose apps have tokens again, oldest first."""
+        now = self.clock()
+        ready = []
+        for seq, arrival in list(self._queue.items()):
+            if self._total.refill(now) < 1:
+                break
+            if self._take(arrival.notification.app_name or "", now):
+                ready.append(self._pop(seq))
+        return ready
+
+    def next_drain(self) -> Optional[float]:
+        """Seconds until `drain()` can release something, None when nothing waits."""
+        if not self._queue:
+            return None
+        now = self.clock()
+        soonest = min(self._bucket(a.notification.app_name or "", now).wait(now) for a in self._queue.values())
+        return max(soonest, self._total.wait(now))
@@ -0,0 +1,230 @@
+"""
+Inverted index over the notification history, and the search syntax for it.
+
+Each word of a record's app name, summary and body (markup stripped, case
+folded) maps to the ids of the records containing it. A sorted vocabulary
+lets a query word match every indexed word it is a prefix of, so results
+narrow as the query is typed. Records only need `id`, `app_name`,
+`summary`, `body`, `urgency` and `arrival`.
+"""
+
+import bisect
+import heapq
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+WORD = re.compile(r"\w+")
+MARKUP = re.compile(r"(<[^>]*>|&#?\w+;)")
+MIN_PREFIX = 2  # shorter query words only match whole words
+URGENCIES = {"low": 0, "normal": 1, "critical": 2}
+DURATIONS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+HIGHLIGHT = '<span underline="single" weight="bold">{}</span>'
+
+
+def words(text: str) -> List[str]:
+    return WORD.findall(MARKUP.sub(" ", text or "").casefold())
+
+
+def _parse_time(value: str, now: datetime) -> Optional[datetime]:
+    if value == "today":
+        return datetime.combine(now.date(), datetime.min.time())
+    if value == "yesterday":
+        return datetime.combine(now.date() - timedelta(days=1), datetime.min.time())
+    unit = DURATIONS.get(value[-1:])
+    if unit and value[:-1].isdigit():
+        return now - timedelta(**{unit: int(value[:-1])})
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+@dataclass(slots=True)
+class NotificationQuery:
+    """
+    A search string split into words and filters, e.g.
+    `build failed app:ci since:2d urgency:critical`. Times are durations
+    back from now (`30m`, `2h`, `3d`, `1w`), `today`, `yesterday` or ISO dates.
+    """
+
+    terms: List[str] = field(default_factory=list)
+    app: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    urgency: Optional[int] = None
+
+    @classmethod
+    def parse(cls, query: str, now: Optional[datetime] = None) -> "NotificationQuery":
+        now = now or datetime.now()
+        parsed = cls()
+        rest = []
+        for token in query.casefold().split():
+            key, sep, value = token.partition(":")
+            if sep and key == "app" and value:
+                parsed.app = value
+            elif sep and key in ("since", "until") and _parse_time(value, now):
+                setattr(parsed, key, _parse_time(value, now))
+            elif sep and key == "urgency" and value in URGENCIES:
+                parsed.urgency = URGENCIES[value]
+            else:
+                rest.append(token)
+        parsed.terms = words(" ".join(rest))
+        return parsed
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.terms and self.app is None and self.since is None and self.until is None and self.urgency is None
+
+
+class NotificationIndex:
+    def __init__(self):
+        self._records: Dict[str, object] = {}
+        self._words: Dict[str, Set[str]] = {}  # word -> record ids
+        self._vocabulary: List[str] = []  # the words, sorted
+        self._apps: Dict[str, Set[str]] = {}  # case-folded app name -> record ids
+        self._urgencies: Dict[int, Set[str]] = {}
+        self._timeline: List[Tuple[float, str]] = []  # (arrival, id), oldest first
+        self._arrivals: Dict[str, float] = {}
+
+    @classmethod
+    def build(cls, records: Iterable) -> "NotificationIndex":
+        index = cls()
+        for record in records:
+            index._add(record)
+        index._vocabulary = sorted(index._words)
+        index._timeline.sort()
+        return index
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, record_id: str):
+        return record_id in self._records
+
+    def get(self, record_id: str):
+        return self._records.get(record_id)
+
+    @staticmethod
+    def _record_words(record) -> Set[str]:
+        return set(words(record.app_name) + words(record.summary) + words(record.body))
+
+    def _add(self, record) -> List[str]:
+        """Index `record` apart from the sorted lists; returns the words new to the vocabulary."""
+        self._records[record.id] = record
+        new_words = []
+        for word in self._record_words(record):
+            ids = self._words.get(word)
+            if ids is None:
+                ids = self._words[word] = set()
+                new_words.append(word)
+            ids.add(record.id)
+        self._apps.setdefault((record.app_name or "").casefold(), set()).add(record.id)
+        self._urgencies.setdefault(record.urgency, set()).add(record.id)
+        arrival = self._arrivals[record.id] = record.arrival.timestamp()
+        self._timeline.append((arrival, record.id))
+        return new_words
+
+    def add(self, record):
+        """Index `record`, replacing any record with its id."""
+        if record.id in self._records:
+            self.remove(record.id)
+        for word in self._add(record):
+            bisect.insort(self._vocabulary, word)
+        entry = self._timeline.pop()
+        # Usually the newest, so this lands at the end
+        bisect.insort(self._timeline, entry)
+
+    def remove(self, record_id: str):
+        record = self._records.pop(record_id, None)
+        if record is None:
+            return
+        for word in self._record_words(record):
+            ids = self._words[word]
+            ids.discard(record_id)
+            if not ids:
+                del self._words[word]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+        for groups, key in ((self._apps, (record.app_name or "").casefold()), (self._urgencies, record.urgency)):
+            groups[key].discard(record_id)
+            if not groups[key]:
+                del groups[key]
+        entry = (self._arrivals.pop(record_id), record_id)
+        del self._timeline[bisect.bisect_left(self._timeline, entry)]
+
+    def remove_app(self, app_name: str):
+        for record_id in list(self._apps.get((app_name or "").casefold(), ())):
+            self.remove(record_id)
+
+    def clear(self):
+        self.__init__()
+
+    def _matching(self, term: str) -> Set[str]:
+        if len(term) < MIN_PREFIX:
+            return set(self._words.get(term, ()))
+        matched = set()
+        position = bisect.bisect_left(self._vocabulary, term)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+            matched |= self._words[self._vocabulary[position]]
+            position += 1
+        return matched
+
+    def search(self, query: NotificationQuery, limit: Optional[int] = None) -> List:
+        """Records matching every word and filter of `query`, newest first."""
+        sets = [self._matching(term) for term in query.terms]
+        if query.app is not None:
+            sets.append(set().union(*(ids for app, ids in self._apps.items() if query.app in app)))
+        if query.urgency is not None:
+            sets.append(self._urgencies.get(query.urgency, set()))
+        candidates = None
+        # Narrowest sets first keeps the intersections small
+        for ids in sorted(sets, key=len):
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        since = query.since.timestamp() if query.since is not None else float("-inf")
+        until = query.until.timestamp() if query.until is not None else float("inf")
+        start = bisect.bisect_left(self._timeline, (since, ""))
+        end = bisect.bisect_left(self._timeline, (until, ""))
+        records = self._records
+        # Walking the range newest first wins unless matches are sparse in it
+        if candidates is None or (
+            limit is not None and limit * (end - start) < len(candidates) * len(candidates)
+        ):
+            ranked = []
+            for position in range(end - 1, start - 1, -1):
+                record_id = self._timeline[position][1]
+                if candidates is None or record_id in candidates:
+                    ranked.append(records[record_id])
+                    if limit is not None and len(ranked) >= limit:
+                        break
+            return ranked
+
+        arrival = self._arrivals.__getitem__
+        in_range = [record_id for record_id in candidates if since <= arrival(record_id) < until]
+        if limit is None:
+            ranked = sorted(in_range, key=arrival, reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, in_range, key=arrival)
+        return [records[record_id] for record_id in ranked]
+
+
+def highlight(markup: str, terms: List[str]) -> str:
+    """`markup` with the words that `terms` match emphasised; tags and entities are left alone."""
+    if not markup or not terms:
+        return markup
+    pattern = re.compile(
+        r"\b(?:"
+        + "|".join(
+            re.escape(term) + (r"\w*" if len(term) >= MIN_PREFIX else r"\b")
+            for term in sorted(set(terms), key=len, reverse=True)
+        )
+        + ")",
+        re.IGNORECASE,
+    )
+    pieces = MARKUP.split(markup)
+    for i in range(0, len(pieces), 2):
+        pieces[i] = pattern.sub(lambda m: HIGHLIGHT.format(m.group(0)), pieces[i])
+    return "".join(pieces)
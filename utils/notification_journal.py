@@ -0,0 +1,230 @@
+"""
+Durable notification history as an append-only JSON-lines journal.
+
+Every record is one line: a notification (a dict with an "id"), or a
+tombstone that hides earlier ones (`{"op": "delete", "ids": [...]}`,
+`{"op": "delete_app", "app_name": ...}`). Writes happen on a single
+background thread, one `write()` per record on an O_APPEND descriptor, so a
+crash can at worst leave a torn last line, which readers skip.
+
+Pages are read backwards from the end of the file, so startup only parses
+the newest notifications. Compaction replays the journal on the writer thread
+and atomically replaces it with the live notifications, capped at `limit`;
+a reader that is part way through keeps paging through the file it opened.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Set, Tuple
+
+PAGE_SIZE = 50
+READ_BLOCK = 64 * 1024
+COMPACT_EVERY = 500  # records written before compaction is considered again
+COMPACT_MIN_GARBAGE = 256  # dead records worth rewriting the journal for
+
+
+class _Replay:
+    """Applies records newest first: tombstones hide the older notifications they name."""
+
+    __slots__ = ("deleted_ids", "deleted_apps", "seen")
+
+    def __init__(self):
+        self.deleted_ids: Set[str] = set()
+        self.deleted_apps: Set[str] = set()
+        self.seen: Set[str] = set()
+
+    def feed(self, line: bytes) -> Optional[dict]:
+        """The notification on `line` if it is still live, else None."""
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        op = record.get("op")
+        if op == "delete":
+            self.deleted_ids.update(str(note_id) for note_id in record.get("ids", ()))
+            return None
+        if op == "delete_app":
+            self.deleted_apps.add(record.get("app_name"))
+            return None
+        note_id = record.get("id")
+        if op is not None or note_id is None:
+            return None
+        note_id = str(note_id)
+        if note_id in self.deleted_ids or note_id in self.seen or record.get("app_name") in self.deleted_apps:
+            return None
+        self.seen.add(note_id)
+        return record
+
+
+def _lines_before(f, position: int):
+    """Yield (offset, line) for the complete lines that end before `position`, last first."""
+    tail = b""
+    while position > 0:
+        start = max(0, position - READ_BLOCK)
+        f.seek(start)
+        chunk = f.read(position - start) + tail
+        pieces = chunk.split(b"\n")
+        # Unless the chunk starts the file, its first piece is the end of an earlier line
+        tail = pieces.pop(0) if start > 0 else b""
+        offset = start + len(tail) + (1 if start > 0 else 0)
+        lines = []
+        for piece in pieces:
+            lines.append((offset, piece))
+            offset += len(piece) + 1
+        for offset, line in reversed(lines):
+            if line.strip():
+                yield offset, line
+        position = start
+
+
+class NotificationJournal:
+    """Appends, tombstones, paged reads and compaction of one journal file."""
+
+    def __init__(self, path: str, limit: int = 20000):
+        self.path = path
+        self.limit = limit
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notification-journal")
+        self._fd: Optional[int] = None  # writer side, only touched on the executor
+        self._written = 0
+        self._read_lock = threading.Lock()
+        self._reader = None
+        self._replay = _Replay()
+        self._served = 0
+        self._exhausted = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Writing
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            # A torn last line must not swallow the first record appended after it
+            size = os.fstat(self._fd).st_size
+            if size:
+                with open(self.path, "rb") as f:
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        os.write(self._fd, b"\n")
+        return self._fd
+
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        fd = self._open()
+        os.write(fd, line.encode("utf-8"))
+        os.fdatasync(fd)
+        self._written += 1
+        if self._written % COMPACT_EVERY == 0:
+            self._compact()
+
+    def _submit(self, func, *args) -> Future:
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._report)
+        return future
+
+    @staticmethod
+    def _report(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error writing notification journal: {future.exception()}")
+
+    def append(self, note: dict) -> Future:
+        return self._submit(self._write, note)
+
+    def delete(self, ids: Iterable[str]) -> Optional[Future]:
+        ids = [str(note_id) for note_id in ids]
+        if not ids:
+            return None
+        with self._read_lock:
+            self._replay.deleted_ids.update(ids)
+        return self._submit(self._write, {"op": "delete", "ids": ids})
+
+    def delete_app(self, app_name: str) -> Future:
+        """Hide every notification of `app_name` written so far."""
+        with self._read_lock:
+            self._replay.deleted_apps.add(app_name)
+        return self._submit(self._write, {"op": "delete_app", "app_name": app_name})
+
+    def clear(self) -> Future:
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            self._exhausted = True
+        return self._submit(self._rewrite, [])
+
+    def _rewrite(self, notes: List[dict]):
+        """Atomically replace the journal with `notes`, oldest first."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for note in notes:
+                f.write(json.dumps(note, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def compact(self) -> "Future[List[dict]]":
+        """Drop dead records and anything past the limit; resolves to the live notifications, newest first."""
+        return self._submit(self._compact)
+
+    def _compact(self) -> List[dict]:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            replay = _Replay()
+            live = []
+            total = 0
+            for _, line in _lines_before(f, os.fstat(f.fileno()).st_size):
+                total += 1
+                if len(live) < self.limit:
+                    note = replay.feed(line)
+                    if note is not None:
+                        live.append(note)
+        if total - len(live) >= COMPACT_MIN_GARBAGE:
+            self._rewrite(live[::-1])
+        return live
+
+    # Reading
+
+    def page(self, cursor: Optional[int] = None, size: int = PAGE_SIZE) -> Tuple[List[dict], Optional[int]]:
+        """
+        Up to `size` live notifications older than `cursor`, newest first, and
+        the cursor for the page after them (None once the journal is exhausted).
+        Pass None for the newest page; later pages must be read in order.
+        """
+        with self._read_lock:
+            if self._reader is None:
+                if self._exhausted:
+                    return [], None
+                try:
+                    self._reader = open(self.path, "rb")
+                except FileNotFoundError:
+                    self._exhausted = True
+                    return [], None
+            if cursor is None:
+                cursor = os.fstat(self._reader.fileno()).st_size
+            notes = []
+            for offset, line in _lines_before(self._reader, cursor):
+                cursor = offset
+                note = self._replay.feed(line)
+                if note is None:
+                    continue
+                notes.append(note)
+                self._served += 1
+                if len(notes) >= size or self._served >= self.limit:
+                    break
+            else:
+                cursor = 0
+            if cursor == 0 or self._served >= self.limit:
+                self._reader.close()
+                self._reader = None
+                self._exhausted = True
+                return notes, None
+            return notes, cursor
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from gi.repository import GdkPixbuf
+
+
+class PixbufLRU:
+    """Least-recently-used pixbuf cache bounded by decoded bytes rather than entry count."""
+
+    __slots__ = ("budget", "size", "_entries")
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, GdkPixbuf.Pixbuf]" = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[GdkPixbuf.Pixbuf]:
+        pixbuf = self._entries.get(key)
+        if pixbuf is not None:
+            self._entries.move_to_end(key)
+        return pixbuf
+
+    def put(self, key: Hashable, pixbuf: GdkPixbuf.Pixbuf) -> None:
+        self.discard(key)
+        self._entries[key] = pixbuf
+        self.size += pixbuf.get_byte_length()
+        # Always keep the newest entry, even if it alone is over budget
+        while self.size > self.budget and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.get_byte_length()
+
+    def discard(self, key: Hashable) -> None:
+        pixbuf = self._entries.pop(key, None)
+        if pixbuf is not None:
+            self.size -= pixbuf.get_byte_length()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
@@ -0,0 +1,117 @@
+"""
+Shared reasons for continuous animations to stop drawing.
+
+`PowerSource` follows UPower's OnBattery property, and `WorkspaceWatcher`
+follows each monitor's active workspace and whether a fullscreen window
+covers it. Both are event driven, with no polling, and there is one of each
+however many widgets listen.
+"""
+
+import json
+from typing import Dict, Optional, Set
+
+from gi.repository import Gio, GLib
+
+from utils.signal import Signal
+
+WORKSPACE_EVENTS = (
+    "workspace",
+    "focusedmon",
+    "fullscreen",
+    "moveworkspace",
+    "closewindow",
+    "monitoradded",
+    "monitorremoved",
+)
+
+
+class PowerSource:
+    _instance: Optional["PowerSource"] = None
+
+    @classmethod
+    def get_default(cls) -> "PowerSource":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.on_battery = False
+        self.changed = Signal()  # emitted with the new on_battery
+        self._proxy = None
+        Gio.DBusProxy.new_for_bus(
+            Gio.BusType.SYSTEM,
+            Gio.DBusProxyFlags.NONE,
+            None,
+            "org.freedesktop.UPower",
+            "/org/freedesktop/UPower",
+            "org.freedesktop.UPower",
+            None,
+            self._on_proxy,
+        )
+
+    def _on_proxy(self, source, result):
+        try:
+            self._proxy = Gio.DBusProxy.new_for_bus_finish(result)
+        except GLib.Error as e:
+            print(f"UPower unavailable, assuming AC power: {e.message}")
+            return
+        self._proxy.connect("g-properties-changed", lambda *_: self._read())
+        self._read()
+
+    def _read(self):
+        value = self._proxy.get_cached_property("OnBattery")
+        on_battery = bool(value.unpack()) if value is not None else False
+        if on_battery != self.on_battery:
+            self.on_battery = on_battery
+            self.changed.emit(on_battery)
+
+
+class WorkspaceWatcher:
+    _instance: Optional["WorkspaceWatcher"] = None
+
+    @classmethod
+    def get_default(cls) -> "WorkspaceWatcher":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        from fabric.hyprland.widgets import get_hyprland_connection
+
+        self.active: Dict[str, int] = {}  # monitor name -> active workspace id
+        self.fullscreen: Set[str] = set()  # monitors showing a fullscreen window
+        self.changed = Signal()
+        self._refresh_id = 0
+        self._conn = get_hyprland_connection()
+        for event in WORKSPACE_EVENTS:
+            self._conn.connect(f"event::{event}", self._queue_refresh)
+        self._refresh()
+
+    def covers(self, monitor: Optional[str], workspace: Optional[int] = None) -> bool:
+        """Whether a widget on `monitor` (for `workspace`, if given) is out of sight."""
+        if monitor is None:
+            return False
+        if monitor in self.fullscreen:
+            return True
+        return workspace is not None and self.active.get(monitor, workspace) != workspace
+
+    def _queue_refresh(self, *_):
+        if not self._refresh_id:
+            self._refresh_id = GLib.idle_add(self._refresh)
+
+    def _refresh(self):
+        self._refresh_id = 0
+        try:
+            monitors = json.loads(self._conn.send_command("j/monitors").reply.decode())
+            workspaces = json.loads(self._conn.send_command("j/workspaces").reply.decode())
+        except Exception as e:
+            print(f"Error reading Hyprland workspaces: {e}")
+            return False
+        active = {monitor["name"]: monitor["activeWorkspace"]["id"] for monitor in monitors}
+        with_fullscreen = {workspace["id"] for workspace in workspaces if workspace.get("hasfullscreen")}
+        fullscreen = {name for name, workspace_id in active.items() if workspace_id in with_fullscreen}
+        if active != self.active or fullscreen != self.fullscreen:
+            self.active = active
+            self.fullscreen = fullscreen
+            self.changed.emit()
+        return False
@@ -0,0 +1,201 @@
+"""
+Shader programs that link without stalling the caller, cached on disk.
+
+`PendingProgram` issues the compile and link and returns at once. Where the
+driver has `GL_ARB_parallel_shader_compile` (or the KHR variant) the work
+runs on the driver's compiler threads and `poll()` reports when it is done.
+Elsewhere the link completes inside the constructor, so callers should start
+builds from an idle callback after a frame is on screen.
+
+`ProgramBinaryCache` keeps linked programs as `GL_ARB_get_program_binary`
+blobs, keyed by a hash of the sources and the GL vendor, renderer and version
+strings. A driver update therefore misses the cache instead of loading a
+stale binary, and a binary the driver still rejects is dropped and rebuilt.
+"""
+
+import hashlib
+import os
+from typing import Dict, Optional
+
+import OpenGL.GL as GL
+from loguru import logger
+from OpenGL.GL.ARB import get_program_binary, parallel_shader_compile
+
+MAX_CACHED_PROGRAMS = 64
+FORMAT_BYTES = 4  # each file starts with the binary format, little endian
+
+
+class ShaderCompileError(Exception): ...
+
+
+def driver_string() -> str:
+    return "\n".join(
+        (GL.glGetString(name) or b"").decode(errors="replace")
+        for name in (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION)
+    )
+
+
+def program_key(vertex: str, fragment: str) -> str:
+    """The cache key of a program; needs a current context for the driver string."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (driver_string(), vertex, fragment):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ProgramBinaryCache:
+    """A directory of program binaries, one file per program key."""
+
+    _instances: Dict[str, "ProgramBinaryCache"] = {}
+
+    @classmethod
+    def shared(cls, cache_dir: str) -> "ProgramBinaryCache":
+        if cache_dir not in cls._instances:
+            cls._instances[cache_dir] = cls(cache_dir)
+        return cls._instances[cache_dir]
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def supported() -> bool:
+        return bool(
+            get_program_binary.glInitGetProgramBinaryARB()
+            and GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS)
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def load(self, key: str, program: int) -> bool:
+        """Link `program` from the cached binary for `key`, if there is a usable one."""
+        try:
+            with open(self._path(key), "rb") as f:
+                blob = f.read()
+        except OSError:
+            return False
+        if len(blob) <= FORMAT_BYTES or not self.supported():
+            return False
+        binary_format = int.from_bytes(blob[:FORMAT_BYTES], "little")
+        GL.glProgramBinary(program, binary_format, blob[FORMAT_BYTES:], len(blob) - FORMAT_BYTES)
+        if GL.glGetProgramiv(program, GL.GL_LINK_STATUS):
+            return True
+        # Rejected by this driver after all; the caller compiles from source.
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        return False
+
+    def store(self, key: str, program: int):
+        """Save the binary of the linked `program` under `key`."""
+        if not self.supported():
+            return
+        length = GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH)
+        if not length:
+            return
+        binary = (GL.GLubyte * length)()
+        written = GL.GLsizei()
+        binary_format = GL.GLenum()
+        GL.glGetProgramBinary(program, length, written, binary_format, binary)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(binary_format.value.to_bytes(FORMAT_BYTES, "little"))
+                f.write(bytes(binary)[: written.value])
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"[Shader] Cannot cache program binary: {e}")
+            return
+        self._prune()
+
+    def _prune(self):
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".bin")]
+        except OSError:
+            return
+        if len(entries) <= MAX_CACHED_PROGRAMS:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[: len(entries) - MAX_CACHED_PROGRAMS]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class PendingProgram:
+    """
+    A program being compiled and linked in the current context.
+
+    `poll()` until it returns True, then `finish()` for the program object,
+    or `cancel()` to drop it. All three need the same context current.
+    """
+
+    def __init__(self, vertex: str, fragment: str, cache: Optional[ProgramBinaryCache] = None):
+        self.cache = cache
+        self.key = program_key(vertex, fragment) if cache else None
+        self.program = GL.glCreateProgram()
+        self.from_cache = bool(cache and cache.load(self.key, self.program))
+        self._shaders = []
+        self._parallel = False
+        self._status = GL.GLint()
+        if self.from_cache:
+            return
+
+        if parallel_shader_compile.glInitParallelShaderCompileARB():
+            # let the driver pick how many compiler threads to use
+            parallel_shader_compile.glMaxShaderCompilerThreadsARB(0xFFFFFFFF)
+            self._parallel = True
+        if cache:
+            GL.glProgramParameteri(self.program, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
+        for kind, source in ((GL.GL_VERTEX_SHADER, vertex), (GL.GL_FRAGMENT_SHADER, fragment)):
+            shader = GL.glCreateShader(kind)
+            GL.glShaderSource(shader, source)
+            GL.glCompileShader(shader)
+            GL.glAttachShader(self.program, shader)
+            self._shaders.append(shader)
+        GL.glLinkProgram(self.program)
+
+    def poll(self) -> bool:
+        """Whether `finish()` will return without waiting for the driver."""
+        if not self._parallel:
+            return True
+        # PyOpenGL does not know this query's output size, so it gets an out parameter
+        GL.glGetProgramiv(self.program, parallel_shader_compile.GL_COMPLETION_STATUS_ARB, self._status)
+        return bool(self._status.value)
+
+    def finish(self) -> int:
+        """The linked program; raises `ShaderCompileError` with the driver's log."""
+        linked = GL.glGetProgramiv(self.program, GL.GL_LINK_STATUS)
+        log = None if linked else self._compile_log() or GL.glGetProgramInfoLog(self.program)
+        self._delete_shaders()
+        program, self.program = self.program, None
+        if not linked:
+            GL.glDeleteProgram(program)
+            raise ShaderCompileError(log.decode(errors="replace") if isinstance(log, bytes) else str(log))
+        if self.cache and not self.from_cache:
+            self.cache.store(self.key, program)
+        return program
+
+    def cancel(self):
+        self._delete_shaders()
+        if self.program:
+            GL.glDeleteProgram(self.program)
+            self.program = None
+
+    def _compile_log(self):
+        for shader in self._shaders:
+            if not GL.glGetShaderiv(shader, GL.GL_COMPILE_STATUS):
+                return GL.glGetShaderInfoLog(shader)
+        return None
+
+    def _delete_shaders(self):
+        for shader in self._shaders:
+            if self.program:
+                GL.glDetachShader(self.program, shader)
+            GL.glDeleteShader(shader)
+        self._shaders.clear()
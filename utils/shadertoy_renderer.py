@@ -0,0 +1,262 @@
+"""
+The OpenGL side of the Shadertoy widget.
+
+`ShadertoyRenderer` compiles a Shadertoy-style fragment shader (one that
+defines `mainImage`) into a program drawing a full-screen quad, and draws
+frames with it. It only needs a current OpenGL 3.3 core context, so it runs
+under a `Gtk.GLArea` as well as in a headless EGL context on Mesa's
+llvmpipe (scripts/shader_headless.py).
+
+Uniform locations are looked up once per program, and a frame sets its
+uniforms with scalar `glUniform*` calls, skipping the ones that did not
+change, so drawing builds no Python containers.
+
+Building is split in two so a caller can keep drawing while the driver
+compiles: `start_build()` returns a `PendingProgram` (utils/shader_cache.py)
+and `finish_build()` switches to it once it has linked. `build()` does both
+at once.
+"""
+
+from enum import Enum
+
+import OpenGL.GL as GL
+
+from utils.shader_cache import PendingProgram, ProgramBinaryCache, ShaderCompileError
+
+
+class ShadertoyUniformType(Enum):
+    # TODO: add more types
+    FLOAT = 1
+    INTEGER = 2
+    VECTOR = 3
+    TEXTURE = 4
+
+
+class ShadertoyCompileError(ShaderCompileError): ...
+
+
+class ShadertoyRenderer:
+    # signatures for building a replica of shadertoy
+    VERTEX_SHADER = """
+    #version 330
+
+    in vec2 position;
+
+    void main() {
+        gl_Position = vec4(position, 0.0, 1.0);
+    }
+    """
+
+    FRAGMENT_UNIFORMS = """
+    #version 330
+
+    uniform vec3 iResolution;           // viewport resolution (in pixels)
+    uniform float iTime;                 // shader playback time (in seconds)
+    uniform float iTimeDelta;            // render time (in seconds)
+    uniform float iFrameRate;            // shader frame rate
+    uniform int iFrame;                  // shader playback frame
+    uniform float iChannelTime[4];       // channel playback time (in seconds)
+    uniform vec3 iChannelResolution[4];  // channel resolution (in pixels)
+    uniform vec4 iMouse;                 // mouse pixel coords. xy: current (if MLB down), zw: click
+    uniform sampler2D iChannel0;         // input channel. XX = 2D/Cube
+    uniform sampler2D iChannel1;
+    uniform sampler2D iChannel2;
+    uniform sampler2D iChannel3;
+    uniform vec4 iDate;                  // (year, month, day, time in seconds)
+    uniform float iSampleRate;           // sound sample rate (i.e., 44100)
+
+    """
+
+    FRAGMENT_MAIN_FUNCTION = """
+    void main() {
+        mainImage(gl_FragColor, gl_FragCoord.xy);
+    }
+    """
+
+    def __init__(self, shader_buffer: str, shader_uniforms=None):
+        self.shader_buffer = shader_buffer
+        # name -> (type, value), applied again to every program that gets built
+        self.shader_uniforms = {name: (utype, value) for name, utype, value in shader_uniforms or ()}
+        self.program = None
+        self._vao = None
+        self._quad_vbo = None
+        self._locations: dict[str, int] = {}
+        self._texture_units: dict[str, tuple[int, int]] = {}
+        self._reset_frame_state()
+
+    def _reset_frame_state(self):
+        # Values last sent for the uniforms that rarely change
+        self._width = self._height = -1
+        self._mouse_x = self._mouse_y = -1.0
+
+    def fragment_source(self) -> str:
+        return self.FRAGMENT_UNIFORMS + self.shader_buffer + self.FRAGMENT_MAIN_FUNCTION
+
+    def start_build(self, cache: ProgramBinaryCache | None = None) -> PendingProgram:
+        """Begin compiling `shader_buffer`; hand the result to `finish_build()`."""
+        return PendingProgram(self.VERTEX_SHADER, self.fragment_source(), cache)
+
+    def finish_build(self, pending: PendingProgram):
+        """Switch to the program `pending` linked and set up the quad; the context must be current."""
+        try:
+            program = pending.finish()
+        except ShaderCompileError as e:
+            raise ShadertoyCompileError(
+                f"couldn't compile the provided shader, OpenGL error:\n {e}"
+            )
+        if self.program:
+            GL.glDeleteProgram(self.program)
+        self.program = program
+        self._locations.clear()
+        self._reset_frame_state()
+        GL.glUseProgram(self.program)
+
+        # NOTE: for this to work (alpha pixels) `set_has_alpha(True)` must be done on the GLArea
+        # this breaks some fragment shaders, for some reason, so i'm leaving it for anyone willing to use
+        GL.glEnable(GL.GL_BLEND)
+        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+
+        if self._vao is None:
+            self._quad_vbo = GL.glGenBuffers(1)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._quad_vbo)
+            # cast python type into GL type (list[float] -> arraybuf[GLfloat])
+            quad_verts = (-1.0, -1.0, 1.0, -1.0, -1.0, 1.0, 1.0, 1.0)
+            array_type = GL.GLfloat * len(quad_verts)
+            GL.glBufferData(
+                GL.GL_ARRAY_BUFFER,
+                len(quad_verts) * 4,
+                array_type(*quad_verts),
+                GL.GL_STATIC_DRAW,
+            )
+            self._vao = GL.glGenVertexArrays(1)
+
+        GL.glBindVertexArray(self._vao)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._quad_vbo)
+        position = GL.glGetAttribLocation(self.program, "position")
+        GL.glEnableVertexAttribArray(position)
+        GL.glVertexAttribPointer(position, 2, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
+
+        self._i_time = self.location("iTime")
+        self._i_time_delta = self.location("iTimeDelta")
+        self._i_frame_rate = self.location("iFrameRate")
+        self._i_frame = self.location("iFrame")
+        self._i_resolution = self.location("iResolution")
+        self._i_mouse = self.location("iMouse")
+
+        for uname, (utype, uvalue) in self.shader_uniforms.items():
+            self._apply_uniform(uname, utype, uvalue)
+
+    def build(self, cache: ProgramBinaryCache | None = None):
+        """Compile and switch to `shader_buffer` right away; the context must be current."""
+        self.finish_build(self.start_build(cache))
+
+    def location(self, name: str) -> int:
+        location = self._locations.get(name)
+        if location is None:
+            location = self._locations[name] = GL.glGetUniformLocation(self.program, name)
+        return location
+
+    def render(
+        self,
+        width: int,
+        height: int,
+        time: float,
+        delta: float,
+        frame: int,
+        mouse_x: float = 0.0,
+        mouse_y: float = 0.0,
+    ):
+        """Draw one frame into the current framebuffer, `width` x `height` pixels."""
+        GL.glUseProgram(self.program)
+        if width != self._width or height != self._height:
+            self._width, self._height = width, height
+            GL.glViewport(0, 0, width, height)
+            GL.glUniform3f(self._i_resolution, width, height, 1.0)
+        if mouse_x != self._mouse_x or mouse_y != self._mouse_y:
+            self._mouse_x, self._mouse_y = mouse_x, mouse_y
+            GL.glUniform4f(self._i_mouse, mouse_x, mouse_y, 0.0, 0.0)
+        GL.glUniform1f(self._i_time, time)
+        GL.glUniform1f(self._i_time_delta, delta)
+        GL.glUniform1f(self._i_frame_rate, 1.0 / delta if delta > 0 else 0.0)
+        GL.glUniform1i(self._i_frame, frame)
+
+        # clear up for next frame
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        GL.glBindVertexArray(self._vao)
+        GL.glDrawArrays(GL.GL_TRIANGLE_STRIP, 0, 4)
+
+    def clear(self, red: float, green: float, blue: float, alpha: float):
+        """Fill the current framebuffer with one colour, e.g. while no program is ready."""
+        GL.glClearColor(red, green, blue, alpha)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        GL.glClearColor(0.0, 0.0, 0.0, 0.0)
+
+    def set_uniform(self, name: str, type: ShadertoyUniformType, value):
+        """Set a uniform now if a program is built, and on every program built later."""
+        self.shader_uniforms[name] = (type, value)
+        if self.program:
+            self._apply_uniform(name, type, value)
+
+    def _apply_uniform(self, name: str, type: ShadertoyUniformType, value):
+        GL.glUseProgram(self.program)
+        location = self.location(name)
+        match type:
+            case ShadertoyUniformType.VECTOR:
+                (
+                    GL.glUniform2f
+                    if (vlen := len(value)) == 2
+                    else GL.glUniform3f
+                    if vlen == 3
+                    else GL.glUniform4f
+                )(location, *value)
+            case ShadertoyUniformType.FLOAT:
+                GL.glUniform1f(location, value)
+            case ShadertoyUniformType.INTEGER:
+                GL.glUniform1i(location, value)
+            case ShadertoyUniformType.TEXTURE:
+                # who dislikes boilerplate?
+                value = value.flip(False)
+                format = GL.GL_RGBA if value.get_has_alpha() else GL.GL_RGB
+
+                if name not in self._texture_units:
+                    texture = GL.glGenTextures(1)
+                    self._texture_units[name] = (len(self._texture_units), texture)
+                texture_unit, texture = self._texture_units[name]
+                GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit)
+                GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
+
+                GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_REPEAT)
+                GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_REPEAT)
+                GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+                GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+
+                # "upload" the texture
+                GL.glTexImage2D(
+                    GL.GL_TEXTURE_2D,
+                    0,  # detail level (woah?)
+                    format,  # result format
+                    value.get_width(),
+                    value.get_height(),
+                    0,  # "border"
+                    format,  # input format
+                    GL.GL_UNSIGNED_BYTE,
+                    value.get_pixels(),
+                )
+                GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+
+                # all aboard...
+                GL.glUniform1i(location, texture_unit)
+
+    def release(self):
+        """Free the GL objects; the context must be current."""
+        if self.program:
+            GL.glDeleteProgram(self.program)
+            self.program = None
+        if self._vao is not None:
+            GL.glDeleteVertexArrays(1, [self._vao])
+            GL.glDeleteBuffers(1, [self._quad_vbo])
+            self._vao = self._quad_vbo = None
+        if self._texture_units:
+            GL.glDeleteTextures(len(self._texture_units), [texture for _, texture in self._texture_units.values()])
+            self._texture_units.clear()
+        self._locations.clear()
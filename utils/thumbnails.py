@@ -0,0 +1,260 @@
+"""
+Square wallpaper thumbnails, cached on disk and shared by every selector.
+
+A thumbnail is stored under the hash of the image's content, so renamed or
+duplicated files share one. To avoid reading whole images on every start, the
+file's (device, inode, size, mtime) signature is mapped to that hash in a small
+JSON index; only files whose signature is unknown get hashed, and only content
+that was never seen before is decoded.
+
+Decoding runs in a process pool shared by all callers. JPEGs are decoded with
+`draft()`, letting libjpeg scale by 1/2-1/8 while decoding instead of
+producing the full 4K/8K bitmap first.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor
+from contextlib import suppress
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+HASH_CHUNK = 1 << 20
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """The pool image decoding runs in, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking the shell would copy its GLib and executor threads'
+            # locks, possibly mid-use. Workers come from a forkserver instead,
+            # which starts single-threaded and has only this module (and PIL)
+            # imported, so each one is a cheap fork of a clean process.
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                mp_context=context,
+            )
+        return _pool
+
+
+def file_signature(st: os.stat_result) -> str:
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_thumbnail(source: str, target: str, size: int):
+    """Center-crop `source` to a square and save it as a `size` px PNG at `target`."""
+    with Image.open(source) as img:
+        width, height = img.size
+        side = min(width, height)
+        # Ask the JPEG decoder for the smallest scale that still covers the
+        # thumbnail; other formats ignore this.
+        img.draft("RGB", (max(size, width * size // side), max(size, height * size // side)))
+        scale_x, scale_y = img.size[0] / width, img.size[1] / height
+        left = (width - side) // 2
+        top = (height - side) // 2
+        box = (int(left * scale_x), int(top * scale_y), int((left + side) * scale_x), int((top + side) * scale_y))
+        thumb = img.crop(box)
+        thumb.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if thumb.mode not in ("RGB", "RGBA"):
+            thumb = thumb.convert("RGBA")
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        thumb.save(tmp_path, "PNG", compress_level=1)
+        os.replace(tmp_path, target)
+
+
+def _make_thumbnail(source: str, cache_dir: str, size: int) -> Tuple[str, str]:
+    """Worker side: returns (signature, content hash) once the thumbnail exists."""
+    signature = file_signature(os.stat(source))
+    digest = content_hash(source)
+    target = os.path.join(cache_dir, f"{digest}.png")
+    if not os.path.exists(target):
+        render_thumbnail(source, target, size)
+    return signature, digest
+
+
+class _PoolJobFuture(Future):
+    """A caller's handle on a pool job; cancelling succeeds only while the job is still queued."""
+
+    def __init__(self, job: Future):
+        super().__init__()
+        self._job = job
+
+    def cancel(self) -> bool:
+        if not self._job.cancel():
+            return False
+        return super().cancel()
+
+
+class ThumbnailCache:
+    """Signature-indexed, content-addressed thumbnail directory."""
+
+    _instances: Dict[Tuple[str, int], "ThumbnailCache"] = {}
+
+    @classmethod
+    def shared(cls, cache_dir: str, size: int = 96) -> "ThumbnailCache":
+        key = (cache_dir, size)
+        if key not in cls._instances:
+            cls._instances[key] = cls(cache_dir, size)
+        return cls._instances[key]
+
+    def __init__(self, cache_dir: str, size: int = 96):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._created = time.time()
+        self._hashes: Dict[str, str] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path, "r") as f:
+                self._hashes = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.png")
+
+    def cached_path(self, source: str) -> Optional[str]:
+        """The thumbnail for `source` if it is already known, without reading the image."""
+        try:
+            signature = file_signature(os.stat(source))
+        except OSError:
+            return None
+        with self._lock:
+            digest = self._hashes.get(signature)
+        if digest:
+            path = self._path(digest)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def submit(self, source: str) -> "Future[str]":
+        """
+        Hash and, if needed, decode `source` in the process pool; resolves to
+        the thumbnail path. Cancelling the returned future withdraws the job
+        if no worker has picked it up yet, and fails (returns False) once one has.
+        """
+        job = get_process_pool().submit(_make_thumbnail, source, self.cache_dir, self.size)
+        result: "Future[str]" = _PoolJobFuture(job)
+
+        def on_done(job):
+            if job.cancelled():
+                return
+            try:
+                signature, digest = job.result()
+            except Exception as e:
+                with suppress(InvalidStateError):
+                    result.set_exception(e)
+                return
+            with self._lock:
+                self._hashes[signature] = digest
+                self._dirty = True
+            # The caller may have cancelled meanwhile; the index entry is still worth keeping
+            with suppress(InvalidStateError):
+                result.set_result(self._path(digest))
+
+        job.add_done_callback(on_done)
+        return result
+
+    def get(self, source: str) -> "Future[str]":
+        """Like `submit()`, but already resolved when the thumbnail is cached."""
+        path = self.cached_path(source)
+        if path is None:
+            return self.submit(source)
+        result: "Future[str]" = Future()
+        result.set_result(path)
+        return result
+
+    def prune(self, sources: Iterable[str]):
+        """
+        Forget signatures and thumbnails that no file in `sources` uses any more.
+
+        Thumbnails written since this cache was created are kept: another
+        caller may still be waiting for its index entry.
+        """
+        live = set()
+        for source in sources:
+            try:
+                live.add(file_signature(os.stat(source)))
+            except OSError:
+                pass
+        with self._lock:
+            stale = [signature for signature in self._hashes if signature not in live]
+            for signature in stale:
+                del self._hashes[signature]
+            self._dirty = self._dirty or bool(stale)
+            kept = {f"{digest}.png" for digest in self._hashes.values()}
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".png") or entry.name in kept:
+                continue
+            try:
+                if entry.stat().st_mtime < self._created:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = dict(self._hashes)
+            self._dirty = False
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Error saving thumbnail index: {e}")
+
+
+if __name__ == "__main__":
+    # Cold and warm pass over a synthetic folder of large JPEGs:
+    #   python -m utils.thumbnails [count] [width]x[height]
+    import sys
+    import tempfile
+    from concurrent.futures import wait
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    width, height = map(int, (sys.argv[2] if len(sys.argv) > 2 else "3840x2160").split("x"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = os.path.join(tmp, "walls")
+        os.makedirs(images)
+        base = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+        for i in range(count):
+            base.rotate(i % 360).save(os.path.join(images, f"wall-{i:04}.jpg"), quality=85)
+        sources = [entry.path for entry in os.scandir(images)]
+
+        def run(label, cache):
+            start = time.perf_counter()
+            wait([cache.get(source) for source in sources])
+            cache.save()
+            print(f"{label}: {time.perf_counter() - start:.2f} s for {count} images of {width}x{height}")
+
+        run("first open", ThumbnailCache(os.path.join(tmp, "thumbs")))
+        run("warm open", ThumbnailCache(os.path.join(tmp, "thumbs")))
+        for source in sources[::2]:
+            os.rename(source, f"{source}.renamed.jpg")
+        sources = [entry.path for entry in os.scandir(images)]
+        run("after renaming half", ThumbnailCache(os.path.join(tmp, "thumbs")))
@@ -0,0 +1,262 @@
+"""
+Persistent per-wallpaper metadata: dimensions, dominant colour and aspect class.
+
+Entries are keyed by file name and carry the file's signature (see
+`utils.thumbnails.file_signature`), so only new or changed files are ever
+re-read. Dimensions come from the image header alone and the dominant colour
+from the already rendered thumbnail, which keeps an update to a few
+milliseconds off the main thread.
+"""
+
+import colorsys
+import json
+import os
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image
+
+from utils.thumbnails import file_signature
+
+INDEX_VERSION = 1
+
+# Minimum short side, so portrait and landscape images of one class match alike
+RESOLUTIONS = {"720p": 720, "1080p": 1080, "1440p": 1440, "4k": 2160, "5k": 2880, "8k": 4320}
+
+# Upper hue bound (degrees) of each colour family
+HUE_FAMILIES = (
+    (15, "red"), (45, "orange"), (70, "yellow"), (160, "green"),
+    (200, "cyan"), (255, "blue"), (290, "purple"), (345, "pink"), (360, "red"),
+)
+COLOR_FAMILIES = ("red", "orange", "yellow", "green", "cyan", "blue", "purple", "pink", "gray", "black", "white")
+ASPECT_CLASSES = ("ultrawide", "landscape", "square", "portrait")
+SORT_MODES = {"name": "name", "res": "resolution", "resolution": "resolution", "color": "color", "colour": "color"}
+
+
+def dominant_color(img: Image.Image) -> str:
+    small = img.convert("RGB").resize((32, 32))
+    quantized = small.quantize(colors=5)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+@dataclass(slots=True)
+class WallpaperInfo:
+    signature: str
+    width: int
+    height: int
+    color: str
+
+    @property
+    def aspect(self) -> str:
+        ratio = self.width / max(self.height, 1)
+        if ratio >= 2.0:
+            return "ultrawide"
+        if ratio > 1.1:
+            return "landscape"
+        if ratio >= 0.9:
+            return "square"
+        return "portrait"
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    @property
+    def hls(self):
+        return colorsys.rgb_to_hls(*(int(self.color[i:i + 2], 16) / 255 for i in (1, 3, 5)))
+
+    @property
+    def color_family(self) -> str:
+        hue, lightness, saturation = self.hls
+        if lightness < 0.12:
+            return "black"
+        if lightness > 0.9:
+            return "white"
+        if saturation < 0.15:
+            return "gray"
+        degrees = hue * 360
+        return next(name for bound, name in HUE_FAMILIES if degrees < bound)
+
+    def resolution_at_least(self, resolution: str) -> bool:
+        return min(self.width, self.height) >= RESOLUTIONS[resolution]
+
+
+class WallpaperIndex:
+    """Name-keyed `WallpaperInfo`s plus the shuffled deck random picks are drawn from."""
+
+    _instances: Dict[str, "WallpaperIndex"] = {}
+
+    @classmethod
+    def shared(cls, index_path: str) -> "WallpaperIndex":
+        if index_path not in cls._instances:
+            cls._instances[index_path] = cls(index_path)
+        return cls._instances[index_path]
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.entries: Dict[str, WallpaperInfo] = {}
+        self._deck: List[str] = []
+        self._last_pick: Optional[str] = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # saves come from the main thread and from workers
+        self._dirty = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wallpaper-index")
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get("version") != INDEX_VERSION:
+            return
+        for name, fields in saved.get("wallpapers", {}).items():
+            self.entries[name] = WallpaperInfo(*fields)
+        self._deck = saved.get("deck", [])
+        self._last_pick = saved.get("last_pick")
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = {
+                    "version": INDEX_VERSION,
+                    "wallpapers": {
+                        name: [info.signature, info.width, info.height, info.color]
+                        for name, info in self.entries.items()
+                    },
+                    "deck": list(self._deck),
+                    "last_pick": self._last_pick,
+                }
+                self._dirty = False
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                print(f"Error saving wallpaper index: {e}")
+
+    def get(self, name: str) -> Optional[WallpaperInfo]:
+        return self.entries.get(name)
+
+    def ensure(self, name: str, path: str, thumbnail_path: str) -> Optional["Future[WallpaperInfo]"]:
+        """Re-read `name` in the background if its file changed; None when the entry is current."""
+        try:
+            signature = file_signature(os.stat(path))
+        except OSError:
+            return None
+        info = self.entries.get(name)
+        if info is not None and info.signature == signature:
+            return None
+        return self._executor.submit(self._read, name, path, thumbnail_path, signature)
+
+    def _read(self, name: str, path: str, thumbnail_path: str, signature: str) -> WallpaperInfo:
+        with Image.open(path) as img:
+            width, height = img.size
+        with Image.open(thumbnail_path) as thumb:
+            color = dominant_color(thumb)
+        info = WallpaperInfo(signature, width, height, color)
+        with self._lock:
+            self.entries[name] = info
+            self._dirty = True
+        return info
+
+    def remove(self, name: str):
+        with self._lock:
+            if self.entries.pop(name, None) is not None:
+                self._dirty = True
+
+    def reconcile(self, names: Iterable[str]):
+        """Drop entries for files that are gone; changed files are caught by `ensure()`."""
+        names = set(names)
+        with self._lock:
+            for name in [name for name in self.entries if name not in names]:
+                del self.entries[name]
+                self._dirty = True
+
+    def random_pick(self, names: Iterable[str]) -> Optional[str]:
+        """Next wallpaper from a shuffled deck, so nothing repeats until every file was shown."""
+        names = set(names)
+        if not names:
+            return None
+        with self._lock:
+            self._deck = [name for name in self._deck if name in names]
+            if not self._deck:
+                self._deck = list(names)
+                random.shuffle(self._deck)
+                # Don't start the new round with the wallpaper that ended the last one
+                if len(self._deck) > 1 and self._deck[-1] == self._last_pick:
+                    self._deck[0], self._deck[-1] = self._deck[-1], self._deck[0]
+            self._last_pick = self._deck.pop()
+            self._dirty = True
+            return self._last_pick
+
+
+@dataclass(slots=True)
+class WallpaperQuery:
+    """
+    A search string split into fuzzy text and metadata filters, e.g.
+    `sunset is:landscape res:4k color:orange sort:res`.
+    """
+
+    text: str = ""
+    aspect: Optional[str] = None
+    resolution: Optional[str] = None
+    color: Optional[str] = None
+    sort: str = "name"
+
+    @classmethod
+    def parse(cls, query: str) -> "WallpaperQuery":
+        parsed = cls()
+        words = []
+        for token in query.casefold().split():
+            key, sep, value = token.partition(":")
+            if sep and key == "is" and value in ASPECT_CLASSES:
+                parsed.aspect = value
+            elif sep and key == "res" and value in RESOLUTIONS:
+                parsed.resolution = value
+            elif sep and key in ("color", "colour") and value in COLOR_FAMILIES:
+                parsed.color = value
+            elif sep and key == "sort" and value in SORT_MODES:
+                parsed.sort = SORT_MODES[value]
+            else:
+                words.append(token)
+        parsed.text = " ".join(words)
+        return parsed
+
+    @property
+    def has_filters(self) -> bool:
+        return bool(self.aspect or self.resolution or self.color)
+
+    def matches(self, info: Optional[WallpaperInfo]) -> bool:
+        if not self.has_filters:
+            return True
+        if info is None:
+            return False
+        return (
+            (not self.aspect or info.aspect == self.aspect)
+            and (not self.resolution or info.resolution_at_least(self.resolution))
+            and (not self.color or info.color_family == self.color)
+        )
+
+    def sort_key(self, name: str, info: Optional[WallpaperInfo], score: int = 0) -> tuple:
+        if self.sort == "resolution":
+            return (info is None, -(info.pixels if info else 0), name.lower())
+        if self.sort == "color":
+            if info is None:
+                return (True, 0, 0.0, 0.0, name.lower())
+            hue, lightness, _ = info.hls
+            family = info.color_family
+            # Greys, black and white after the colours, each ordered by lightness
+            achromatic = family in ("gray", "black", "white")
+            return (False, achromatic, 0.0 if achromatic else hue, lightness, name.lower())
+        return (-score, name.lower())
@@ -0,0 +1,154 @@
+"""
+Live window previews for the overview.
+
+Frames come from a `FrameSource`. The real one runs `grim -T`, which
+captures a single toplevel through the ext-image-copy-capture protocols,
+so the overview drawn on top and windows on hidden workspaces do not get
+in the way. Anything with a `capture()` method works, for example a fake
+source that paints test frames.
+
+`WindowThumbnailer` captures and downscales on one worker thread, and only
+between `start()` and `stop()`, at most `fps` rounds a second (0 takes a
+single snapshot per opening). Frames are kept in a `PixbufLRU` bounded by
+bytes, so memory stays flat however often the overview opens, and a
+reopened overview shows the last frames right away.
+"""
+
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from gi.repository import GdkPixbuf, GLib
+from loguru import logger
+
+from utils.pixbuf_cache import PixbufLRU
+
+CACHE_BYTES = 32 * 1024 * 1024
+CAPTURE_TIMEOUT = 2.0
+MAX_FPS = 10
+
+
+class FrameSource:
+    def capture(self, client: dict) -> Optional[GdkPixbuf.Pixbuf]:
+        """Pixels of the window a `j/clients` entry describes, or None if it cannot be captured now."""
+        raise NotImplementedError
+
+
+class GrimFrameSource(FrameSource):
+    def __init__(self, command: str = "grim"):
+        self.command = command
+        self.supported = True  # until grim turns out not to know -T
+
+    @staticmethod
+    def available(command: str = "grim") -> bool:
+        return shutil.which(command) is not None
+
+    @staticmethod
+    def toplevel_id(client: dict) -> Optional[str]:
+        # The ext-foreign-toplevel-list identifier, which Hyprland reports as stableId
+        stable_id = client.get("stableId")
+        if stable_id is None or stable_id == "":
+            return None
+        return f"{stable_id:x}" if isinstance(stable_id, int) else str(stable_id)
+
+    def capture(self, client: dict) -> Optional[GdkPixbuf.Pixbuf]:
+        toplevel = self.toplevel_id(client)
+        if not self.supported or toplevel is None:
+            return None
+        try:
+            result = subprocess.run(
+                [self.command, "-T", toplevel, "-t", "ppm", "-"],
+                capture_output=True,
+                timeout=CAPTURE_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"[Overview] Window capture failed: {e}")
+            return None
+        if result.returncode != 0:
+            if b"invalid option" in result.stderr or b"unrecognized option" in result.stderr:
+                logger.warning("[Overview] grim cannot capture single windows (needs -T); previews are off")
+                self.supported = False
+            return None
+        loader = GdkPixbuf.PixbufLoader.new_with_type("pnm")
+        try:
+            loader.write(result.stdout)
+            loader.close()
+        except GLib.Error:
+            return None
+        return loader.get_pixbuf()
+
+
+class WindowThumbnailer:
+    def __init__(
+        self,
+        source: FrameSource,
+        on_frame: Callable[[str, GdkPixbuf.Pixbuf], None],
+        fps: float = 2,
+        budget: int = CACHE_BYTES,
+    ):
+        self.source = source
+        self.on_frame = on_frame
+        self.fps = min(max(fps, 0), MAX_FPS)
+        self.cache = PixbufLRU(budget)
+        self._windows: Dict[str, Tuple[dict, Tuple[int, int]]] = {}  # address -> (client, preview size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="window-thumbnails")
+        self._generation = 0  # bumped by stop(), so frames of an earlier opening are dropped
+        self._timer = 0
+        self._busy = False
+
+    def track(self, address: str, client: dict, size: Tuple[int, int]):
+        """Capture the window `client` describes into `size` previews from now on."""
+        self._windows[address] = (client, (max(1, int(size[0])), max(1, int(size[1]))))
+
+    def forget(self, address: str):
+        self._windows.pop(address, None)
+        self.cache.discard(address)
+
+    def get(self, address: str) -> Optional[GdkPixbuf.Pixbuf]:
+        return self.cache.get(address)
+
+    def start(self):
+        if self._timer:
+            return
+        self._capture_round()
+        if self.fps > 0:
+            self._timer = GLib.timeout_add(int(1000 / self.fps), self._capture_round)
+
+    def stop(self):
+        self._generation += 1
+        if self._timer:
+            GLib.source_remove(self._timer)
+            self._timer = 0
+
+    def _capture_round(self):
+        # A slow capture skips rounds rather than queueing them
+        if not self._busy and self._windows:
+            self._busy = True
+            self._executor.submit(self._capture, self._generation, list(self._windows.items()))
+        return True
+
+    def _capture(self, generation: int, windows):
+        try:
+            for address, (client, (width, height)) in windows:
+                if generation != self._generation:
+                    break
+                frame = self.source.capture(client)
+                if frame is None:
+                    continue
+                scaled = frame.scale_simple(width, height, GdkPixbuf.InterpType.BILINEAR)
+                GLib.idle_add(self._deliver, generation, address, scaled)
+        except Exception as e:
+            logger.error(f"[Overview] Error capturing window previews: {e}")
+        finally:
+            GLib.idle_add(self._round_done)
+
+    def _deliver(self, generation: int, address: str, pixbuf: GdkPixbuf.Pixbuf):
+        if generation == self._generation and address in self._windows:
+            self.cache.put(address, pixbuf)
+            self.on_frame(address, pixbuf)
+        return False
+
+    def _round_done(self):
+        self._busy = False
+        return False
@@ -1,86 +1,61 @@
 from collections.abc import Iterable
-from enum import Enum
-from typing import Literal, cast, overload
+from typing import Literal, overload
 
 import gi
-import OpenGL.GL as GL
-from fabric import Application, Property, Signal
+from fabric import Property, Signal
 from fabric.widgets.widget import Widget
-from OpenGL.GL.shaders import compileProgram, compileShader
-
-gi.require_version("Gtk", "3.0")
-from gi.repository import Gdk, GdkPixbuf, GLib, Gtk
+from loguru import logger
 
+import config.data as data
+from utils.render_pause import PowerSource, WorkspaceWatcher
+from utils.shader_cache import ProgramBinaryCache
+from utils.shadertoy_renderer import (ShadertoyCompileError, ShadertoyRenderer,
+                                      ShadertoyUniformType)
 
-class ShadertoyUniformType(Enum):
-    # TODO: add more types
-    FLOAT = 1
-    INTEGER = 2
-    VECTOR = 3
-    TEXTURE = 4
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Gtk
 
+__all__ = ["Shadertoy", "ShadertoyCompileError", "ShadertoyUniformType"]
 
-class ShadertoyCompileError(Exception): ...
+FRAME_SLACK_US = 2000  # a frame this early still counts, so 30 fps on 60 Hz does not drop to 20
 
 
 class Shadertoy(Gtk.GLArea, Widget):
+    """
+    A Shadertoy-style fragment shader drawn continuously.
+
+    Frames are drawn at most `max_fps` times a second, and not at all while
+    the widget is unmapped, while the machine runs on battery (unless
+    `pause_on_battery` is off), or while its monitor shows a fullscreen
+    window or, if `workspace` is given, any other workspace.
+
+    Programs are built after the widget has drawn, through the on-disk
+    program binary cache, and linked by the driver's compiler threads where
+    it has them. Until the first program is ready the widget is filled with
+    `placeholder`, and a rebuild keeps drawing the previous program until
+    the new one links. With `shader_file` the source is read from that file
+    and rebuilt whenever it changes on disk.
+    """
+
     @Signal  # pygobject signal
     def ready(self) -> None: ...
 
     @Property(str, "read-write")
     def shader_buffer(self) -> str:
-        return self._shader_buffer
+        return self.renderer.shader_buffer
 
     @shader_buffer.setter
     def shader_buffer(self, shader_buffer: str) -> None:
-        self._shader_buffer = shader_buffer
+        self.renderer.shader_buffer = shader_buffer
         if not self._ready:
             return
-        self._shader_uniforms.clear()
-        self.do_realize()
-        self.queue_draw()
+        self.renderer.shader_uniforms.clear()
+        self._queue_build()
         return
 
-    # signatures for building a replica of shadertoy
-    DEFAULT_VERTEX_SHADER = """
-    #version 330
-
-    in vec2 position;
-
-    void main() {
-        gl_Position = vec4(position, 0.0, 1.0);
-    }
-    """
-
-    DEFAULT_FRAGMENT_UNIFORMS = """
-    #version 330
-
-    uniform vec3 iResolution;           // viewport resolution (in pixels)
-    uniform float iTime;                 // shader playback time (in seconds)
-    uniform float iTimeDelta;            // render time (in seconds)
-    uniform float iFrameRate;            // shader frame rate
-    uniform int iFrame;                  // shader playback frame
-    uniform float iChannelTime[4];       // channel playback time (in seconds)
-    uniform vec3 iChannelResolution[4];  // channel resolution (in pixels)
-    uniform vec4 iMouse;                 // mouse pixel coords. xy: current (if MLB down), zw: click
-    uniform sampler2D iChannel0;         // input channel. XX = 2D/Cube
-    uniform sampler2D iChannel1;
-    uniform sampler2D iChannel2;
-    uniform sampler2D iChannel3;
-    uniform vec4 iDate;                  // (year, month, day, time in seconds)
-    uniform float iSampleRate;           // sound sample rate (i.e., 44100)
-
-    """
-
-    FRAGMENT_MAIN_FUNCTION = """
-    void main() {
-        mainImage(gl_FragColor, gl_FragCoord.xy);
-    }
-    """
-
     def __init__(
         self,
-        shader_buffer: str,
+        shader_buffer: str = "",
         shader_uniforms: list[
             tuple[
                 str,
@@ -89,6 +64,11 @@ class Shadertoy(Gtk.GLArea, Widget):
             ]
         ]
         | None = None,
+        shader_file: str | None = None,
+        placeholder: tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0),
+        max_fps: float | None = None,
+        pause_on_battery: bool | None = None,
+        workspace: int | None = None,
         name: str | None = None,
         visible: bool = True,
         all_visible: bool = False,
@@ -126,8 +106,11 @@ class Shadertoy(Gtk.GLArea, Widget):
             size,
             **kwargs,
         )
-        self._shader_buffer = shader_buffer
-        self._shader_uniforms = shader_uniforms or []
+        self.renderer = ShadertoyRenderer(shader_buffer, shader_uniforms)
+        self.max_fps = data.SHADER_FPS if max_fps is None else max_fps
+        self.workspace = workspace
+        self.placeholder = placeholder
+        self.shader_file = shader_file
 
         # widget settings
         self.set_required_version(3, 3)
@@ -135,146 +118,196 @@ class Shadertoy(Gtk.GLArea, Widget):
         self.set_has_stencil_buffer(False)
 
         self._ready = False
-        self._program = None
-        self._vao = None
-        self._quad_vbo = None
-        self._texture_units = {}
+        self._paused_by: set[str] = set()
+        self._monitor: str | None = None
+        self._pending = None
+        self._build_id = 0
 
-        # timer
+        # timing
         self._start_time = GLib.get_monotonic_time() / 1e6
         self._frame_time = self._start_time
         self._frame_count = 0
+        self._tick_id = 0
+        self._last_tick = 0
+
+        self.connect("map", self._on_map)
+        self.connect("unmap", lambda *_: self._update_ticking())
+        self.connect("destroy", self._on_destroy)
+
+        self._power = None
+        if data.SHADER_PAUSE_ON_BATTERY if pause_on_battery is None else pause_on_battery:
+            self._power = PowerSource.get_default()
+            self._power.changed.connect(self._on_power_changed)
+            self._on_power_changed(self._power.on_battery)
+        self._workspaces = WorkspaceWatcher.get_default()
+        self._workspaces.changed.connect(self._on_workspaces_changed)
+
+        self._file_monitor = None
+        if shader_file:
+            self._watch_file()
+
+    def set_paused(self, reason: str, paused: bool):
+        """Stop drawing while any reason holds; callers can add their own."""
+        if paused:
+            self._paused_by.add(reason)
+        else:
+            self._paused_by.discard(reason)
+        self._update_ticking()
+
+    def _update_ticking(self):
+        # a pending build is polled from draws, so it keeps the clock going even while paused
+        running = (
+            self._ready
+            and self.get_mapped()
+            and (self._pending is not None or (self.renderer.program is not None and not self._paused_by))
+        )
+        if running and not self._tick_id:
+            self._tick_id = self.add_tick_callback(self._on_tick)
+        elif not running and self._tick_id:
+            self.remove_tick_callback(self._tick_id)
+            self._tick_id = 0
+
+    def _on_tick(self, widget, frame_clock):
+        now = frame_clock.get_frame_time()
+        if self.max_fps <= 0 or now - self._last_tick >= 1_000_000 / self.max_fps - FRAME_SLACK_US:
+            self._last_tick = now
+            self.queue_draw()
+        return True
+
+    def _on_map(self, *_):
+        window = self.get_window()
+        display = window.get_display()
+        monitor = display.get_monitor_at_window(window)
+        self._monitor = next(
+            (
+                display.get_default_screen().get_monitor_plug_name(i)
+                for i in range(display.get_n_monitors())
+                if display.get_monitor(i) == monitor
+            ),
+            None,
+        )
+        self._on_workspaces_changed()
+
+    def _on_power_changed(self, on_battery: bool):
+        self.set_paused("battery", on_battery)
 
-        # to avoid a constant framerate we tell
-        # gtk to render a frame whenever possible
-        self._tick_id = self.add_tick_callback(lambda *_: (self.queue_draw(), True)[1])
+    def _on_workspaces_changed(self):
+        self.set_paused("workspace", self._workspaces.covers(self._monitor, self.workspace))
 
-    def do_bake_program(self):
+    def _watch_file(self):
+        self._reload_file()
         try:
-            vertex_shader = compileShader(
-                self.DEFAULT_VERTEX_SHADER, GL.GL_VERTEX_SHADER
-            )
-            fragment_shader = compileShader(
-                self.DEFAULT_FRAGMENT_UNIFORMS
-                + self._shader_buffer
-                + self.FRAGMENT_MAIN_FUNCTION,
-                GL.GL_FRAGMENT_SHADER,
-            )
-        except Exception as e:
-            raise ShadertoyCompileError(
-                f"couldn't compile the provided shader, OpenGL error:\n {e}"
+            self._file_monitor = Gio.File.new_for_path(self.shader_file).monitor_file(
+                Gio.FileMonitorFlags.NONE, None
             )
+            self._file_monitor.connect("changed", self._on_file_changed)
+        except GLib.Error as e:
+            logger.warning(f"[Shader] Cannot watch {self.shader_file}: {e}")
 
-        return compileProgram(vertex_shader, fragment_shader)
+    def _on_file_changed(self, monitor, file, other_file, event_type):
+        if event_type in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED):
+            self._reload_file()
 
-    def do_realize(self, *_):
-        Gtk.GLArea.do_realize(self)
+    def _reload_file(self):
+        # unlike setting `shader_buffer`, a reload keeps the uniforms set so far
+        try:
+            with open(self.shader_file) as f:
+                source = f.read()
+        except OSError as e:
+            logger.warning(f"[Shader] Cannot read {self.shader_file}: {e}")
+            return
+        if source != self.renderer.shader_buffer:
+            self.renderer.shader_buffer = source
+            if self._ready:
+                self._queue_build()
+
+    def _queue_build(self):
+        # idle priority runs after the pending redraw, so the placeholder or
+        # the previous frame is on screen before the driver is kept busy
+        if not self._build_id:
+            self._build_id = GLib.idle_add(self._start_build)
+
+    def _start_build(self):
+        self._build_id = 0
         if not self._ready:
-            ctx = self.get_context()
-            if (err := self.get_error()) or not ctx:
-                raise RuntimeError(
-                    f"couldn't initialize the drawing context, error: {err or 'context is None'}"
-                )
-
-            ctx.make_current()
-
-        if self._program:
-            GL.glDeleteProgram(self._program)
-            self._program = None
-        self._program = self.do_bake_program()
-
-        # NOTE: for this to work (alpha pixels) `self.set_has_alpha(True)` must be done
-        # this breaks some fragment shaders, for some reason, so i'm leaving it for anyone willing to use
-        GL.glEnable(GL.GL_BLEND)
-        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
-
-        self._quad_vbo = GL.glGenBuffers(1)
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._quad_vbo)
-
-        # this is not so good, unless the introduction of numpy, we must do
-        # a hack to generate an array GL would accept, i've tried using
-        # the "array" python library but it doesn't seem to be working
-
-        # cast python type into GL type (list[float] -> arraybuf[GLfloat])
-        quad_verts = (-1.0, -1.0, 1.0, -1.0, -1.0, 1.0, 1.0, 1.0)
-        array_type = GL.GLfloat * len(quad_verts)
-
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,
-            len(quad_verts) * 4,
-            array_type(*quad_verts),
-            GL.GL_STATIC_DRAW,
-        )
+            return False
+        self.make_current()
+        if self._pending:
+            self._pending.cancel()
+        self._pending = self.renderer.start_build(ProgramBinaryCache.shared(f"{data.CACHE_DIR}/shaders"))
+        self._update_ticking()
+        self.queue_draw()
+        return False
 
-        self._vao = GL.glGenVertexArrays(1)
-        GL.glBindVertexArray(self._vao)
+    def _finish_build(self):
+        pending, self._pending = self._pending, None
+        try:
+            self.renderer.finish_build(pending)
+        except ShadertoyCompileError as e:
+            logger.error(f"[Shader] {e}")
+            self._update_ticking()
+            return
+        self._update_ticking()
+        self.ready()
 
-        position = GL.glGetAttribLocation(self._program, "position")
-        GL.glEnableVertexAttribArray(position)
-        GL.glVertexAttribPointer(position, 2, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
+    def _on_destroy(self, *_):
+        if self._file_monitor:
+            self._file_monitor.cancel()
+        if self._power:
+            self._power.changed.disconnect(self._on_power_changed)
+        self._workspaces.changed.disconnect(self._on_workspaces_changed)
 
-        for uname, utype, uvalue in self._shader_uniforms:
-            self.set_uniform(uname, utype, uvalue)  # type: ignore
+    def do_realize(self, *_):
+        Gtk.GLArea.do_realize(self)
+        ctx = self.get_context()
+        if (err := self.get_error()) or not ctx:
+            raise RuntimeError(
+                f"couldn't initialize the drawing context, error: {err or 'context is None'}"
+            )
 
         self._ready = True
-        self.ready()
+        self._queue_build()
         return
 
-    def do_get_timing(self) -> tuple[float, float, float]:
-        current_time = GLib.get_monotonic_time() / 1e6
-        delta_time = current_time - self._frame_time
-        return current_time, delta_time, (1.0 / delta_time) if delta_time > 0 else 0.0
-
-    def do_post_render(self, time: float):
-        self._frame_time = time
-        self._frame_count += 1
-        return
+    def do_unrealize(self, *_):
+        if self._build_id:
+            GLib.source_remove(self._build_id)
+            self._build_id = 0
+        if self._ready:
+            self.make_current()
+            if self._pending:
+                self._pending.cancel()
+                self._pending = None
+            self.renderer.release()
+            self._ready = False
+            self._update_ticking()
+        Gtk.GLArea.do_unrealize(self)
 
     def do_render(self, ctx: Gdk.GLContext):
-        if not self._program:
-            if self._tick_id:
-                self.remove_tick_callback(self._tick_id)
-            self._tick_id = 0
-            return False
-
-        GL.glUseProgram(self._program)
-
-        # clear up for next frame
-        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
-
-        alloc = self.get_allocation()
-        width: int = alloc.width  # type: ignore
-        height: int = alloc.height  # type: ignore
-        mouse_pos = cast(tuple[int, int], self.get_pointer())
-
-        current_time, delta_time, frame_rate = self.do_get_timing()
+        if self._pending and self._pending.poll():
+            self._finish_build()
+        if not self.renderer.program:
+            self.renderer.clear(*self.placeholder)
+            return True
+
+        scale = self.get_scale_factor()
+        height = self.get_allocated_height()
+        mouse_x, mouse_y = self.get_pointer()
+        current_time = GLib.get_monotonic_time() / 1e6
 
-        self.set_uniform(
-            "iTime", ShadertoyUniformType.FLOAT, current_time - self._start_time
-        )
-        self.set_uniform("iFrame", ShadertoyUniformType.INTEGER, self._frame_count)
-        self.set_uniform("iTimeDelta", ShadertoyUniformType.FLOAT, delta_time)
-        self.set_uniform("iFrameRate", ShadertoyUniformType.FLOAT, frame_rate)
-        self.set_uniform(
-            "iResolution", ShadertoyUniformType.VECTOR, (width, height, 1.0)
+        self.renderer.render(
+            self.get_allocated_width() * scale,
+            height * scale,
+            current_time - self._start_time,
+            current_time - self._frame_time,
+            self._frame_count,
+            mouse_x * scale,
+            (height - mouse_y) * scale,
         )
-        self.set_uniform(
-            "iMouse",
-            ShadertoyUniformType.VECTOR,
-            (mouse_pos[0], height - mouse_pos[1], 0, 0),
-        )
-
-        # paint the quad
-        GL.glBindVertexArray(self._vao)
-        GL.glDrawArrays(GL.GL_TRIANGLE_STRIP, 0, 4)
-        self.do_post_render(current_time)
+        self._frame_time = current_time
+        self._frame_count += 1
         return True
 
-    def do_resize(self, width: int, height: int):
-        Gtk.GLArea.do_resize(self, width, height)
-        GL.glViewport(0, 0, width, height)
-        return
-
     @overload
     def set_uniform(
         self, name: str, type: Literal[ShadertoyUniformType.FLOAT], value: float
@@ -307,61 +340,6 @@ class Shadertoy(Gtk.GLArea, Widget):
         type: ShadertoyUniformType,
         value: bool | float | int | tuple[float, ...] | GdkPixbuf.Pixbuf,
     ):
-        if not self._program:
-            raise RuntimeError("the shader program is not initialized")
-        GL.glUseProgram(self._program)
-        location = GL.glGetUniformLocation(self._program, name)
-        match type:
-            case ShadertoyUniformType.VECTOR:
-                value = cast(tuple[float, ...], value)
-                (
-                    GL.glUniform2f
-                    if (vlen := len(value)) == 2
-                    else GL.glUniform3f
-                    if vlen == 3
-                    else GL.glUniform4f
-                )(location, *value)
-            case ShadertoyUniformType.FLOAT:
-                GL.glUniform1f(location, value)
-            case ShadertoyUniformType.INTEGER:
-                GL.glUniform1i(location, value)
-            case ShadertoyUniformType.TEXTURE:
-                # who dislikes boilerplate?
-                value = cast(GdkPixbuf.Pixbuf, value).flip(False)
-                format = GL.GL_RGBA if value.get_has_alpha() else GL.GL_RGB
-
-                if name not in self._texture_units:
-                    texture = GL.glGenTextures(1)
-                    self._texture_units[name] = (len(self._texture_units), texture)
-                else:
-                    texture_unit, texture = self._texture_units[name]
-
-                texture_unit = self._texture_units[name][0]
-                GL.glActiveTexture(GL.GL_TEXTURE0 + texture_unit)
-                GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
-
-                GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_REPEAT)
-                GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_REPEAT)
-                GL.glTexParameteri(
-                    GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR
-                )
-                GL.glTexParameteri(
-                    GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR
-                )
-
-                # "upload" the texture
-                GL.glTexImage2D(
-                    GL.GL_TEXTURE_2D,
-                    0,  # detail level (woah?)
-                    format,  # result format
-                    value.get_width(),
-                    value.get_height(),
-                    0,  # "border"
-                    format,  # input format
-                    GL.GL_UNSIGNED_BYTE,
-                    value.get_pixels(),
-                )
-                GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
-
-                # all aboard...
-                GL.glUniform1i(location, texture_unit)
+        if self.get_realized():
+            self.make_current()
+        self.renderer.set_uniform(name, type, value)